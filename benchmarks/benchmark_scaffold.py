@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scaffold generation benchmarks for BIOX G-Code Generator
+
+Run from anywhere with: python benchmarks/benchmark_scaffold.py
+
+@author: Maria Teresa Alameda Felgueiras
+"""
+import os
+import sys
+import time
+import importlib
+import tracemalloc
+
+import numpy as np
+
+# The repository folder is the package, import it by its folder name
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(ROOT))
+sys.path.insert(0, ROOT)
+PACKAGE = os.path.basename(ROOT)
+
+GCODE = importlib.import_module(f"{PACKAGE}.core.gcode").GCODE
+toolpaths = importlib.import_module(f"{PACKAGE}.core.toolpaths")
+mesh = importlib.import_module(f"{PACKAGE}.core.mesh")
+plate = importlib.import_module(f"{PACKAGE}.core.plate")
+parallel = importlib.import_module(f"{PACKAGE}.core.parallel")
+scheduling = importlib.import_module(f"{PACKAGE}.core.scheduling")
+estimator = importlib.import_module(f"{PACKAGE}.core.estimator")
+printheads = importlib.import_module(f"{PACKAGE}.core.printheads")
+templates = importlib.import_module(f"{PACKAGE}.core.templates")
+calibration = importlib.import_module(f"{PACKAGE}.core.calibration")
+runs = importlib.import_module(f"{PACKAGE}.core.runs")
+validation = importlib.import_module(f"{PACKAGE}.core.validation")
+workspace = importlib.import_module(f"{PACKAGE}.core.workspace")
+
+
+def timed(function, *args, repeat=5, **kwargs):
+    """Best wall time (s) of several runs and the last result"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def benchmark_honeycomb(size=50., cell_size=1., layers=10, height=0.3):
+    """Honeycomb lattice and G-code for a size x size mm part"""
+    dimensions = (size, size)
+    origin = (size / 2, size / 2)
+
+    lattice_time, segments = timed(toolpaths.honeycomb_segments,
+                                   dimensions, cell_size)
+
+    def generate():
+        gcode = ""
+        for layer in range(layers):
+            gcode = GCODE.generate_honeycomb_scaffold(
+                gcode, dimensions, origin, cell_size,
+                (layer + 1) * height, layer=layer)
+        return gcode
+
+    gcode_time, gcode = timed(generate, repeat=3)
+
+    print(f"Honeycomb {size:g}x{size:g} mm, {cell_size:g} mm cells:")
+    print(f"  lattice: {len(segments)} segments in {lattice_time * 1e3:.1f} ms")
+    print(f"  G-code:  {layers} layers, {gcode.count(chr(10))} lines "
+          f"in {gcode_time * 1e3:.1f} ms")
+
+def benchmark_gradient(size=200., delta=0.05, infill=50., infill_end=10.):
+    """Uniform against radially graded grid infill for a size x size mm part"""
+    dimensions = (size, size)
+    graded = toolpaths.infill_gradient(delta, infill, infill_end, 'radial')
+
+    uniform_time, uniform = timed(toolpaths.grid_segments, dimensions, delta)
+    graded_time, gradient = timed(toolpaths.grid_segments, dimensions, graded)
+
+    print(f"Grid {size:g}x{size:g} mm, {delta:g} mm spacing:")
+    print(f"  uniform: {len(uniform)} segments in {uniform_time * 1e3:.1f} ms")
+    print(f"  radial {infill:g}->{infill_end:g} %: {len(gradient)} segments "
+          f"in {graded_time * 1e3:.1f} ms")
+
+def benchmark_dish(diameter=35., delta=0.05, tolerance=0.01):
+    """Circular outline and scanline grid infill of a culture dish"""
+    outline_time, outline = timed(toolpaths.circle_outline, (0., 0.),
+                                  diameter / 2, tolerance)
+    infill_time, segments = timed(toolpaths.grid_segments, None, delta,
+                                  boundary=outline)
+
+    print(f"Dish {diameter:g} mm, {tolerance:g} mm chord tolerance:")
+    print(f"  outline: {len(outline)} points in {outline_time * 1e3:.2f} ms")
+    print(f"  grid:    {len(segments)} segments ({delta:g} mm) "
+          f"in {infill_time * 1e3:.1f} ms")
+
+def benchmark_gyroid(size=20., cell_size=2., height=10., layer_height=0.2):
+    """Gyroid slices and G-code of a size x size x height mm scaffold"""
+    dimensions = (size, size)
+    origin = (size / 2, size / 2)
+    heights = (1 + np.arange(int(round(height / layer_height)))) * layer_height
+
+    def generate():
+        gcode = ""
+        for z in heights:
+            gcode = GCODE.generate_tpms_scaffold(gcode, dimensions, origin,
+                                                 cell_size, z)
+        return gcode
+
+    slice_time, segments = timed(toolpaths.tpms_segments, dimensions,
+                                 cell_size, heights[0])
+    gcode_time, gcode = timed(generate, repeat=1)
+
+    print(f"Gyroid {size:g}x{size:g}x{height:g} mm, {cell_size:g} mm cells:")
+    print(f"  slice:  {len(segments)} segments in {slice_time * 1e3:.1f} ms")
+    print(f"  G-code: {len(heights)} layers, {gcode.count(chr(10))} lines "
+          f"in {gcode_time:.2f} s")
+
+def torus_mesh(sections=300, segments=170, radius=20., tube=6.):
+    """Closed torus triangle mesh, 2 * sections * segments triangles"""
+    u = 2 * np.pi * np.arange(sections) / sections
+    v = 2 * np.pi * np.arange(segments) / segments
+    u, v = np.meshgrid(u, v, indexing='ij')
+    points = np.stack([(radius + tube * np.cos(v)) * np.cos(u),
+                       (radius + tube * np.cos(v)) * np.sin(u),
+                       tube * np.sin(v)], axis=-1)
+
+    a = points
+    b = np.roll(points, -1, axis=0)
+    c = np.roll(points, -1, axis=1)
+    d = np.roll(b, -1, axis=1)
+    return np.concatenate([np.stack([a, b, d], axis=-2).reshape(-1, 3, 3),
+                           np.stack([a, d, c], axis=-2).reshape(-1, 3, 3)])
+
+def benchmark_slicing(layers=200):
+    """Slice a 100k-triangle torus (outer ring and hole) into layer outlines"""
+    triangles = mesh.place_mesh(torus_mesh())
+    height = triangles[..., 2].max()
+    heights = (np.arange(layers) + 0.5) * height / layers
+
+    slice_time, outlines = timed(mesh.slice_mesh, triangles, heights, repeat=3)
+
+    rings = sum(len(outline) for outline in outlines)
+    points = sum(len(ring) for outline in outlines for ring in outline)
+    print(f"Mesh slicing, {len(triangles)} triangles:")
+    print(f"  {layers} layers, {rings} rings, {points} points "
+          f"in {slice_time:.2f} s")
+
+def benchmark_plate(size=6., cell_size=1.5, layers=10, height=0.3,
+                    plates=("24-well plate", "96-well plate")):
+    """One gyroid scaffold built once and stamped into every well"""
+    dimensions = (size, size)
+    origin = (size / 2, size / 2)
+
+    def build():
+        gcode = ""
+        for layer in range(layers):
+            gcode = GCODE.generate_tpms_scaffold(gcode, dimensions, origin,
+                                                 cell_size, (layer + 1) * height)
+        return gcode
+
+    build_time, body = timed(build, repeat=3)
+    print(f"Plate replication of a {size:g} mm gyroid, {layers} layers:")
+    print(f"  single scaffold: {body.count(chr(10))} lines in {build_time * 1e3:.1f} ms")
+
+    for name in plates:
+        def stamp():
+            relative, end = plate.relative_program(body, (0., 0., 20.))
+            centers, index = plate.well_centers(templates.TEMPLATES.properties(name))
+            order = plate.plate_order(centers, index, shift=end[:2])
+            return plate.replicate_in_wells(relative, centers, index, order, 20.)
+
+        stamp_time, gcode = timed(stamp, repeat=3)
+        print(f"  {name}: {gcode.count(chr(10))} lines, stamped "
+              f"in {stamp_time * 1e3:.1f} ms")
+
+def benchmark_parallel(size=40., delta=0.1, layers=32, height=0.2,
+                       workers=(1, 2, 4, 8)):
+    """Layer-parallel radially graded grid scaffold, scaling with workers"""
+    dimensions = (size, size)
+    origin = (size / 2, size / 2)
+    graded = toolpaths.infill_gradient(delta, 50., 10., 'radial')
+    settings = {'pattern': 'grid', 'height': height, 'speed': 1200,
+                'dimensions': dimensions, 'origin': origin, 'extrusion': 1,
+                'lines': 0, 'shells': 3,
+                'outline': toolpaths.rectangle_outline(dimensions, origin),
+                'boundary': None, 'spacings': [graded] * layers,
+                'angles': toolpaths.layer_angles([0, 45], layers),
+                'arc_tolerance': None, 'simplify_tolerance': None}
+
+    print(f"Parallel grid {size:g}x{size:g} mm, {layers} layers, "
+          f"{os.cpu_count()} CPUs:")
+    serial_time, serial = None, None
+    for count in workers:
+        elapsed, gcode = timed(parallel.generate_layers, "", settings, layers,
+                               workers=count, repeat=2)
+        if serial_time is None:
+            serial_time, serial = elapsed, gcode
+        speedup = serial_time / elapsed
+        print(f"  {count} workers: {elapsed:.2f} s, speedup {speedup:.2f}, "
+              f"efficiency {100 * speedup / count:.0f} %, "
+              f"{'identical' if gcode == serial else 'DIFFERENT'} output")
+
+def benchmark_tools(size=20., delta=1., layers=20, height=0.3,
+                    perimeter_tools=(0,), infill_tools=(1, 2)):
+    """Multi-material grid, scheduled per printhead vs perimeter-then-infill"""
+    dimensions = (size, size)
+    origin = (size / 2, size / 2)
+    jobs = scheduling.layer_jobs(list(perimeter_tools), list(infill_tools), layers)
+
+    # Fixed order: every job whose printhead differs from the previous one changes
+    fixed, tool = [], jobs[0][0][1]
+    for layer in jobs:
+        fixed.append([(region, printhead, printhead != tool) for region, printhead in layer])
+        tool = layer[-1][1]
+
+    settings = {'pattern': 'grid', 'height': height, 'speed': 1200,
+                'dimensions': dimensions, 'origin': origin, 'extrusion': 1,
+                'lines': 0, 'shells': 2,
+                'outline': toolpaths.rectangle_outline(dimensions, origin),
+                'boundary': None, 'spacings': [delta] * layers,
+                'angles': toolpaths.layer_angles([0, 90], layers),
+                'arc_tolerance': None, 'simplify_tolerance': None,
+                'cleaning': {'speed': 3000, 'bed_position': 10.}}
+
+    print(f"Multi-material grid, perimeter T{perimeter_tools}, infill T{infill_tools}, "
+          f"{layers} layers:")
+    schedule_time, (scheduled, _) = timed(scheduling.schedule_tools, jobs, repeat=5)
+    for name, schedule in (("fixed order", fixed), ("per printhead", scheduled)):
+        gcode = parallel.generate_layers(GCODE.set_printhead("", jobs[0][0][1]),
+                                         dict(settings, schedule=schedule), layers,
+                                         workers=1)
+        estimate_time, estimate = timed(estimator.estimate_print_time, gcode, repeat=3)
+        print(f"  {name}: {estimate['tool_changes']} tool changes, "
+              f"{estimate['total'] / 60:.1f} min of which "
+              f"{estimate['overhead'] / 60:.1f} min overhead "
+              f"(estimated in {estimate_time * 1e3:.1f} ms)")
+    print(f"  scheduled in {schedule_time * 1e3:.2f} ms")
+
+def benchmark_well_tools(template="96-well plate", tools=(0, 1, 2)):
+    """Printheads cycled per well, row by row vs grouped per printhead"""
+    properties = templates.TEMPLATES.properties(template)
+    rows, cols = properties['rows'], properties['cols']
+    centers, index = plate.well_centers(properties)
+    assigned = scheduling.well_tools(list(tools), rows, cols, 'well')
+
+    raster = np.arange(rows * cols)
+    schedule_time, groups = timed(scheduling.schedule_wells, centers, index, assigned,
+                                  tool=tools[0])
+    grouped = np.concatenate([wells for _, wells in groups])
+
+    print(f"{template}, printheads {tools} cycled per well:")
+    for name, order in (("row by row", raster), ("per printhead", grouped)):
+        changes = int(np.count_nonzero(np.diff(assigned[order])))
+        print(f"  {name}: {changes} tool changes, "
+              f"{plate.travel_cost(centers, order):.0f} mm travel")
+    print(f"  scheduled in {schedule_time * 1e3:.2f} ms")
+
+def benchmark_temperature_sweep(template="96-well plate", low=25., high=40.):
+    """Column temperature sweep, row by row vs setpoints visited in order"""
+    properties = templates.TEMPLATES.properties(template)
+    rows, cols = properties['rows'], properties['cols']
+    centers, index = plate.well_centers(properties)
+    temperatures = np.tile(np.linspace(low, high, cols), rows)
+
+    raster = np.arange(rows * cols)
+    schedule_time, ordered = timed(scheduling.schedule_setpoints, centers, index, raster,
+                                   temperatures)
+
+    print(f"{template}, column temperature sweep {low:g}-{high:g} °C:")
+    for name, order in (("row by row", raster), ("monotonic", ordered)):
+        print(f"  {name}: {estimator.settling_time(temperatures[order]) / 60:.1f} min "
+              f"settling, {plate.travel_cost(centers, order):.0f} mm travel")
+    print(f"  scheduled in {schedule_time * 1e3:.2f} ms")
+
+def benchmark_extrusion(wells=1536, printhead_type="EMD"):
+    """Extrusion blocks of a pressure sweep, well by well vs in bulk"""
+    pressures = np.linspace(50., 150., wells)
+    times = np.linspace(0.5, 2., wells)
+
+    def well_by_well():
+        gcode = ""
+        for pressure, time in zip(pressures.tolist(), times.tolist()):
+            gcode = GCODE.move_bed(gcode, z=0, speed=1200)
+            gcode = GCODE.emd_extrusion(gcode, 0, pressure, time)
+            gcode = GCODE.move_bed(gcode, z=10., speed=1200)
+        return gcode
+
+    def bulk():
+        return "".join(GCODE.extrusion_blocks(printhead_type, 0, pressures, times,
+                                              0.5, 10., 1200))
+
+    single_time, single = timed(well_by_well, repeat=3)
+    bulk_time, blocks = timed(bulk, repeat=3)
+    print(f"{printhead_type} extrusion of {wells} wells:")
+    print(f"  well by well: {single_time * 1e3:.1f} ms")
+    print(f"  bulk: {bulk_time * 1e3:.1f} ms, "
+          f"{'identical' if blocks == single else 'DIFFERENT'} output")
+
+def benchmark_well_cache(wells=1536, printhead_type="EMD"):
+    """Extrusion blocks of a plate without sweep, formatted vs cached"""
+    pressures = np.full(wells, 100.)
+    times = np.full(wells, 1.5)
+    cache = printheads.BlockCache()
+
+    def blocks(cache=None):
+        return GCODE.extrusion_blocks(printhead_type, 0, pressures, times, 0.5, 10., 1200,
+                                      cache=cache)
+
+    plain_time, plain = timed(blocks, repeat=3)
+    cached_time, cached = timed(blocks, cache, repeat=3)
+    print(f"{printhead_type} extrusion of {wells} identical wells:")
+    print(f"  formatted: {plain_time * 1e3:.2f} ms")
+    print(f"  cached: {cached_time * 1e3:.2f} ms, {cache.hits} hits, {cache.misses} misses, "
+          f"{'identical' if cached == plain else 'DIFFERENT'} output")
+
+def benchmark_high_density(template="1536-well plate", selection="A1:P24, AF48"):
+    """Well arrays and moves of a high-density plate, well by well vs compiled"""
+    properties = templates.TEMPLATES.properties(template)
+
+    def well_by_well():
+        gcode = ""
+        for well in range(properties['rows'] * properties['cols']):
+            row, col = divmod(well, properties['cols'])
+            gcode = GCODE.move_to_position(gcode, col * properties['well_spacing_x'],
+                                           row * properties['well_spacing_y'],
+                                           speed=1200, row=row, col=col)
+        return gcode
+
+    def compiled():
+        arrays = templates.compile_template(template)
+        return "".join(GCODE.well_moves(arrays['centers'], arrays['index'], 1200))
+
+    templates.TEMPLATES.entries.clear()
+    compile_time, arrays = timed(templates.compile_template, template, repeat=1)
+    single_time, single = timed(well_by_well, repeat=3)
+    bulk_time, moves = timed(compiled, repeat=3)
+    mask_time, mask = timed(templates.well_mask, arrays, selection, repeat=3)
+    print(f"{template}, moves to {len(arrays['labels'])} wells:")
+    print(f"  template compiled in {compile_time * 1e3:.2f} ms")
+    print(f"  well by well: {single_time * 1e3:.1f} ms")
+    print(f"  compiled arrays: {bulk_time * 1e3:.1f} ms, "
+          f"{'identical' if moves == single else 'DIFFERENT'} output")
+    print(f"  selection \"{selection}\": {np.count_nonzero(mask)} wells in {mask_time * 1e3:.2f} ms")
+
+def benchmark_template_registry(template="1536-well plate"):
+    """Template names and arrays, first use of a definition file vs cached"""
+    registry = templates.TemplateRegistry()
+
+    names_time, names = timed(registry.names, repeat=3)
+    parsed = len(registry.entries)
+    first_time, _ = timed(registry.compile, template, repeat=1)
+    cached_time, _ = timed(registry.compile, template, repeat=3)
+    print(f"Template registry, {len(names)} templates:")
+    print(f"  names listed in {names_time * 1e3:.2f} ms, "
+          f"{parsed} definitions parsed")
+    print(f"  {template} loaded, validated and compiled in {first_time * 1e3:.2f} ms")
+    print(f"  cached lookup: {cached_time * 1e3:.3f} ms")
+
+def benchmark_calibration(template="1536-well plate", offset=(1.2, -0.8), rotation=0.4):
+    """Calibrated well centres of a plate, well by well vs one matrix product"""
+    arrays = templates.compile_template(template)
+    properties = arrays['properties']
+    angle = np.radians(rotation)
+    wells = calibration.calibration_wells(properties['rows'], properties['cols'])
+    probed = (arrays['centers'][wells] @ np.array([[np.cos(angle), np.sin(angle)],
+                                                   [-np.sin(angle), np.cos(angle)]])
+              + np.array(offset))
+
+    fit_time, transform = timed(calibration.fit_affine, arrays['centers'][wells], probed)
+
+    def well_by_well():
+        return np.array([transform[:, :2] @ center + transform[:, 2]
+                         for center in arrays['centers']])
+
+    single_time, single = timed(well_by_well, repeat=3)
+    bulk_time, centers = timed(calibration.apply_affine, transform, arrays['centers'])
+    parameters = calibration.affine_parameters(transform)
+    print(f"{template} calibration, rotation {parameters['rotation']:.3f} deg:")
+    print(f"  fitted in {fit_time * 1e3:.3f} ms")
+    print(f"  well by well: {single_time * 1e3:.2f} ms")
+    print(f"  one matrix product: {bulk_time * 1e3:.3f} ms, "
+          f"{'identical' if np.allclose(centers, single) else 'DIFFERENT'} centres")
+
+def benchmark_plate_run(plates=8, template="1536-well plate"):
+    """Run of several droplet plates streamed to a file, time and peak memory"""
+    arrays = templates.compile_template(template)
+    wells = len(arrays['centers'])
+
+    def plate(pressure):
+        moves = GCODE.well_moves(arrays['centers'], arrays['index'], 1200)
+        blocks = GCODE.extrusion_blocks("EMD", 0, np.full(wells, pressure), np.full(wells, 1.),
+                                        0.5, 10., 1200)
+        return "".join(move + block for move, block in zip(moves, blocks))
+
+    def stream():
+        with open(os.devnull, "w") as file:
+            return runs.stream_run(file, run, plate, "M0")
+
+    run = [(f"pressure={pressure:g}", pressure) for pressure in np.linspace(50., 150., plates)]
+    elapsed, (summary, total) = timed(stream, repeat=1)
+    tracemalloc.start()
+    stream()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    lines = sum(entry['lines'] for entry in summary)
+    print(f"Run of {plates} x {template}, {lines} lines:")
+    print(f"  streamed and timed in {elapsed * 1e3:.0f} ms, peak memory {peak / 2**20:.1f} MiB")
+    print(f"  estimated {total / 3600:.1f} h, {summary[0]['time']['total'] / 60:.1f} min per plate")
+
+def benchmark_validation(template="1536-well plate", low=20., high=80.):
+    """Validation of a temperature sweep job, well by well vs vectorized"""
+    arrays = templates.compile_template(template)
+    wells = len(arrays['labels'])
+    job = {'printhead_type': "EMD", 'printhead': 0, 'speed': 1200., 'layer_height': 0.1,
+           'bed_position': 10., 'pressure': np.full(wells, 100.),
+           'extrusion_time': np.full(wells, 1.), 'temperature': np.linspace(low, high, wells)}
+
+    def well_by_well():
+        return [validation.validate_job({key: value[well] if np.ndim(value) else value
+                                         for key, value in job.items()})
+                for well in range(wells)]
+
+    single_time, _ = timed(well_by_well, repeat=1)
+    bulk_time, violations = timed(validation.validate_job, job, arrays['labels'])
+    print(f"Validation of {wells} wells, temperature sweep {low:g}-{high:g} °C:")
+    print(f"  well by well: {single_time * 1e3:.1f} ms")
+    print(f"  vectorized: {bulk_time * 1e3:.3f} ms, {len(violations)} violations")
+    for violation in violations:
+        print(f"    {violation['message']}")
+
+def benchmark_workspace(moves=2_000_000, template="96-well plate", stray=10):
+    """Workspace check of a multi-million-move program, from its move arrays"""
+    properties = templates.compile_template(template)['properties']
+    rng = np.random.default_rng(0)
+    end = rng.uniform([0., 0., 0.], [99., 63., 10.], (moves, 3))
+    wrong = rng.choice(moves, stray, replace=False)
+    end[wrong[:stray // 2], 0] = 140.   # beyond the plate and the travel
+    end[wrong[stray // 2:], 1] = -20.   # beside the plate
+    arrays = {'end': end, 'line': np.arange(moves)}
+    angle = np.radians(0.5)
+    transform = np.array([[np.cos(angle), -np.sin(angle), 0.3], [np.sin(angle), np.cos(angle), -0.2]])
+
+    print(f"Workspace check of {moves} moves over a {template}:")
+    for name, outline in (("plate", workspace.plate_outline(properties)),
+                          ("calibrated plate", workspace.plate_outline(properties, transform))):
+        elapsed, violations = timed(workspace.check_workspace, arrays, outline=outline, repeat=3)
+        print(f"  {name}: {elapsed * 1e3:.0f} ms, {workspace.workspace_message(violations)}")
+
+def main():
+    benchmark_honeycomb()
+    benchmark_gradient()
+    benchmark_dish()
+    benchmark_gyroid()
+    benchmark_slicing()
+    benchmark_plate()
+    benchmark_tools()
+    benchmark_well_tools()
+    benchmark_temperature_sweep()
+    benchmark_extrusion()
+    benchmark_well_cache()
+    benchmark_high_density()
+    benchmark_template_registry()
+    benchmark_calibration()
+    benchmark_plate_run()
+    benchmark_validation()
+    benchmark_workspace()
+    benchmark_parallel()
+
+if __name__ == "__main__":
+    main()
@@ -5,15 +5,134 @@ Core functionality for BIOX G-Code Generator
 
 Contains main business logic modules:
 - gcode.py: G-code generation utilities
-- templates.py: Plate template management
+- templates.py: Plate template registry (built-in and labware files) and
+  compiled well arrays
+- density.py: Deposited-material density maps
+- geometry.py: Vectorized toolpath geometry (clipping, containment,
+  offsetting, contouring)
+- toolpaths.py: Infill pattern toolpath arrays (lines, honeycomb, TPMS)
+- arcs.py: G2/G3 arc fitting of curved toolpaths
+- simplify.py: Polyline simplification of toolpaths and programs
+- gcode_parser.py: G-code programs back to move arrays
+- parallel.py: Layer-parallel scaffold generation
+- mesh.py: STL import and slicing into layer outlines
+- plate.py: Scaffold replication into plate wells
+- scheduling.py: Printhead scheduling of multi-material scaffolds and plates
+- estimator.py: Print time estimation of programs
+- printheads.py: Bulk extrusion emitters of the printhead types
+- calibration.py: Affine plate calibration from probed wells
+- runs.py: Multi-plate runs streamed plate by plate
+- validation.py: Vectorized job validation against the printer limits
+- workspace.py: Printer travel and plate bounds checking of programs
 """
 
 from .gcode import GCODE, clean_printhead
-from .templates import set_template, get_available_templates
+from .templates import (TEMPLATE_NAMES, TemplateRegistry, set_template,
+                        get_available_templates, validate_template, row_labels,
+                        compile_template, well_mask)
+from .density import rasterize_segments, deposition_hotspots
+from .geometry import (clip_segments, clip_segments_to_rectangle,
+                       clip_segments_to_polygon, points_in_polygon,
+                       rotation_matrix, offset_polygon, scanline_intervals,
+                       contour_segments, chain_order)
+from .toolpaths import (line_family_segments, striped_segments, grid_segments,
+                        honeycomb_segments, layer_angles, rectangle_outline,
+                        perimeter_shells, shell_segments, arc_points,
+                        circle_outline, polygon_outline, tpms_segments,
+                        infill_boundary, extrusion_rate)
+from .arcs import fit_arcs, arc_extrusion
+from .simplify import (simplify_mask, simplify_segments, simplify_ring,
+                       simplify_gcode)
+from .gcode_parser import parse_moves
+from .parallel import generate_layers
+from .mesh import read_stl, place_mesh, slice_mesh
+from .plate import (well_centers, plate_order, relative_program,
+                    replicate_in_wells)
+from .scheduling import (layer_jobs, schedule_tools, well_tools, schedule_wells,
+                         schedule_setpoints)
+from .estimator import move_times, settling_time, in_cleaning, estimate_print_time
+from .printheads import BlockCache, split_dwell, extrusion_emitter, bed_position
+from .calibration import (calibration_wells, fit_affine, apply_affine, affine_parameters,
+                          load_calibration, save_calibration)
+from .runs import plate_pause, stream_run
+from .validation import check_values, validate_job
+from .workspace import plate_outline, check_workspace, check_program
 
 __all__ = [
     'GCODE',
     'clean_printhead',
+    'TEMPLATE_NAMES',
+    'TemplateRegistry',
     'set_template',
-    'get_available_templates'
+    'get_available_templates',
+    'validate_template',
+    'row_labels',
+    'compile_template',
+    'well_mask',
+    'rasterize_segments',
+    'deposition_hotspots',
+    'clip_segments',
+    'clip_segments_to_rectangle',
+    'clip_segments_to_polygon',
+    'points_in_polygon',
+    'rotation_matrix',
+    'offset_polygon',
+    'scanline_intervals',
+    'contour_segments',
+    'chain_order',
+    'line_family_segments',
+    'striped_segments',
+    'grid_segments',
+    'honeycomb_segments',
+    'layer_angles',
+    'rectangle_outline',
+    'perimeter_shells',
+    'shell_segments',
+    'arc_points',
+    'circle_outline',
+    'polygon_outline',
+    'tpms_segments',
+    'infill_boundary',
+    'extrusion_rate',
+    'fit_arcs',
+    'arc_extrusion',
+    'simplify_mask',
+    'simplify_segments',
+    'simplify_ring',
+    'simplify_gcode',
+    'parse_moves',
+    'generate_layers',
+    'read_stl',
+    'place_mesh',
+    'slice_mesh',
+    'well_centers',
+    'plate_order',
+    'relative_program',
+    'replicate_in_wells',
+    'layer_jobs',
+    'schedule_tools',
+    'well_tools',
+    'schedule_wells',
+    'schedule_setpoints',
+    'move_times',
+    'settling_time',
+    'in_cleaning',
+    'estimate_print_time',
+    'BlockCache',
+    'split_dwell',
+    'extrusion_emitter',
+    'bed_position',
+    'calibration_wells',
+    'fit_affine',
+    'apply_affine',
+    'affine_parameters',
+    'load_calibration',
+    'save_calibration',
+    'plate_pause',
+    'stream_run',
+    'check_values',
+    'validate_job',
+    'plate_outline',
+    'check_workspace',
+    'check_program'
 ]
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Arc fitting for BIOX G-Code Generator toolpaths
+
+Runs of polyline points lying on a common circle are replaced by G2/G3
+arcs, which keeps curved outlines small and smooth on the controller.
+
+@author: Maria Teresa Alameda Felgueiras
+"""
+import numpy as np
+
+# Fewest polyline points (chords + 1) worth replacing with one arc
+ARC_MIN_POINTS = 4
+
+# Largest sweep of one emitted arc in radians, keeps I/J unambiguous
+ARC_MAX_SWEEP = np.pi / 2
+
+# Circles larger than this (mm) are treated as straight lines
+ARC_MAX_RADIUS = 1000.
+
+
+def circumcircles(points):
+    """
+    Circles through every three consecutive polyline points
+
+    Args:
+        points (ndarray): (n, 2) polyline points
+
+    Returns:
+        ndarray: (n - 2, 2) circle centers, NaN for collinear points
+        ndarray: (n - 2,) radii
+        ndarray: (n - 2,) turn direction, 1 counterclockwise, -1 clockwise
+    """
+    a, b, c = points[:-2], points[1:-1], points[2:]
+
+    d = 2 * (a[:, 0] * (b[:, 1] - c[:, 1]) + b[:, 0] * (c[:, 1] - a[:, 1])
+             + c[:, 0] * (a[:, 1] - b[:, 1]))
+    sa, sb, sc = (a ** 2).sum(axis=1), (b ** 2).sum(axis=1), (c ** 2).sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        centers = np.column_stack([
+            (sa * (b[:, 1] - c[:, 1]) + sb * (c[:, 1] - a[:, 1]) + sc * (a[:, 1] - b[:, 1])) / d,
+            (sa * (c[:, 0] - b[:, 0]) + sb * (a[:, 0] - c[:, 0]) + sc * (b[:, 0] - a[:, 0])) / d
+        ])
+    centers[np.abs(d) < 1e-12] = np.nan
+
+    radii = np.hypot(*(b - centers).T)
+
+    return centers, radii, np.sign(d)
+
+def fit_arcs(points, tolerance=0.02, max_sweep=ARC_MAX_SWEEP):
+    """
+    Find arcs in a polyline within a tolerance
+
+    Candidate runs are found for all points at once: consecutive point
+    triples whose circumcircles agree (center and radius within
+    'tolerance', same turn) and whose chords stay within 'tolerance' of the
+    circle. Every run is then split into arcs of at most 'max_sweep' and
+    each arc is checked against all of its points.
+
+    Args:
+        points (ndarray): (n, 2) polyline points
+        tolerance (float): Largest deviation in mm of the arcs from the
+                           polyline (points and chord sagitta)
+        max_sweep (float): Largest sweep of one arc in radians
+
+    Returns:
+        list: (first point, last point, (center x, center y), turn) of each
+              arc in polyline order, turn 1 for G3 and -1 for G2
+    """
+    points = np.asarray(points, dtype=float)
+    if len(points) < ARC_MIN_POINTS:
+        return []
+
+    centers, radii, turns = circumcircles(points)
+
+    # Chord sagitta: how far the arc bulges away from each chord
+    chords = np.hypot(*(points[1:] - points[:-1]).T)
+    with np.errstate(invalid='ignore'):
+        sagitta = radii - np.sqrt(np.maximum(radii ** 2 - np.maximum(chords[:-1], chords[1:]) ** 2 / 4, 0))
+        valid = (radii < ARC_MAX_RADIUS) & (sagitta <= tolerance)
+
+    with np.errstate(invalid='ignore'):
+        linked = (valid[:-1] & valid[1:] & (turns[:-1] == turns[1:])
+                  & (np.hypot(*(centers[1:] - centers[:-1]).T) <= tolerance)
+                  & (np.abs(radii[1:] - radii[:-1]) <= tolerance))
+
+    # Runs of linked triples: links s .. e - 1 join triples s .. e, which
+    # span the points s .. e + 2
+    edges = np.diff(np.concatenate([[0], linked.astype(int), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1)
+
+    arcs = []
+    last = 0
+    for start, stop in zip(starts.tolist(), stops.tolist()):
+        first = max(start, last)
+        end = stop + 2
+        if end - first + 1 < ARC_MIN_POINTS:
+            continue
+
+        # Split the run so no arc sweeps more than 'max_sweep'
+        center = centers[start]
+        angles = np.unwrap(np.arctan2(*(points[first:end + 1] - center).T[::-1]))
+        pieces = int(np.ceil(abs(angles[-1] - angles[0]) / max_sweep - 1e-9))
+        bounds = np.linspace(first, end, max(pieces, 1) + 1).round().astype(int)
+
+        for low, high in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            if high - low + 1 < ARC_MIN_POINTS:
+                continue
+            arc = _checked_arc(points[low:high + 1], tolerance)
+            if arc is not None:
+                arcs.append((low, high, arc, int(turns[start])))
+                last = high
+
+    return arcs
+
+def _checked_arc(points, tolerance):
+    """Circle through the first, middle and last points if all points fit"""
+    middle = len(points) // 2
+    centers, radii, _ = circumcircles(points[[0, middle, -1]])
+    center, radius = centers[0], radii[0]
+    if not np.isfinite(radius):
+        return None
+
+    if np.abs(np.hypot(*(points - center).T) - radius).max() > tolerance:
+        return None
+
+    # Chords bulge inwards by their sagitta at most
+    chords = np.hypot(*(points[1:] - points[:-1]).T)
+    if (radius - np.sqrt(np.maximum(radius ** 2 - chords ** 2 / 4, 0))).max() > tolerance:
+        return None
+
+    return tuple(center.tolist())
+
+def arc_extrusion(points, center, turn, amounts):
+    """
+    Extrusion of an arc replacing a run of chords
+
+    The arc extrudes at the rate per mm of the chords it replaces, along
+    its own length, so its amount does not depend on how finely the curve
+    was discretized.
+
+    Args:
+        points (ndarray): (k + 1, 2) points of the run, the arc ends first
+                          and last
+        center (tuple): (x, y) arc center
+        turn (int): 1 counterclockwise (G3), -1 clockwise (G2)
+        amounts (array-like): (k,) extrusion of the replaced chords
+
+    Returns:
+        float: Extrusion of the arc
+    """
+    points = np.asarray(points, dtype=float)
+    amount = float(np.sum(amounts))
+    chords = np.hypot(*(points[1:] - points[:-1]).T).sum()
+    if chords <= 0:
+        return amount
+
+    start, end = points[0] - center, points[-1] - center
+    sweep = (turn * (np.arctan2(end[1], end[0]) - np.arctan2(start[1], start[0]))) % (2 * np.pi)
+    return amount * np.hypot(*start) * sweep / chords
+
+def arc_statistics(stats, replaced, arcs):
+    """Add fitted arcs to a running {'replaced': n, 'arcs': n} count"""
+    if stats is not None:
+        stats['replaced'] = stats.get('replaced', 0) + replaced
+        stats['arcs'] = stats.get('arcs', 0) + arcs
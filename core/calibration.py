@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Plate calibration for BIOX G-Code Generator
+
+Plates sit slightly offset, rotated and skewed on the bed. Probing the
+centres of three corner wells gives the affine transform from the template
+grid to the bed, applied to all well centres (and the stamped scaffolds)
+with one matrix product. Transforms are stored per printer and plate type.
+
+@author: Maria Teresa Alameda Felgueiras
+"""
+import os
+import json
+import numpy as np
+
+# Stored transforms, by printer and plate type
+CALIBRATION_FILE = os.path.join(os.path.expanduser("~"), ".bio_x_gcode_generator",
+                                "calibration.json")
+
+
+def calibration_wells(rows, cols):
+    """
+    Row-major indices of the probed wells: A1, the last well of row A and
+    the first well of the last row
+    """
+    return np.array([0, cols - 1, (rows - 1) * cols])
+
+def fit_affine(nominal, measured):
+    """
+    Affine transform mapping the nominal well centres on the measured ones
+
+    Three wells are matched exactly, more in the least squares sense.
+
+    Args:
+        nominal (ndarray): (n, 2) template well centres in mm
+        measured (ndarray): (n, 2) probed centres in mm
+
+    Returns:
+        ndarray: (2, 3) transform, [linear | offset]
+
+    Raises:
+        ValueError: When the wells are fewer than three or on one line
+    """
+    nominal = np.asarray(nominal, dtype=float)
+    measured = np.asarray(measured, dtype=float)
+    if len(nominal) < 3 or len(measured) != len(nominal):
+        raise ValueError("Calibration needs the positions of three wells")
+
+    points = np.hstack([nominal, np.ones((len(nominal), 1))])
+    if np.linalg.matrix_rank(points) < 3:
+        raise ValueError("The calibration wells must not be on one line")
+
+    return np.linalg.lstsq(points, measured, rcond=None)[0].T
+
+def apply_affine(transform, points):
+    """
+    Transform (n, 2) points with a (2, 3) affine transform
+
+    Returns:
+        ndarray: (n, 2) transformed points
+    """
+    points = np.asarray(points, dtype=float)
+    return points @ transform[:, :2].T + transform[:, 2]
+
+def affine_parameters(transform):
+    """
+    Offset, rotation, scale and skew of an affine transform
+
+    Returns:
+        dict: 'offset' (x, y) in mm, 'rotation' and 'skew' in degrees
+              and 'scale' (x, y)
+    """
+    linear = transform[:, :2]
+    scale_x = np.hypot(*linear[:, 0])
+    rotation = np.arctan2(linear[1, 0], linear[0, 0])
+    determinant = np.linalg.det(linear)
+    shear = (linear[:, 0] @ linear[:, 1]) / determinant
+    return {
+        'offset': tuple(transform[:, 2].tolist()),
+        'rotation': float(np.degrees(rotation)),
+        'scale': (float(scale_x), float(determinant / scale_x)),
+        'skew': float(np.degrees(np.arctan(shear)))
+    }
+
+def load_calibration(printer, plate, path = CALIBRATION_FILE):
+    """
+    Stored transform of a printer and plate type
+
+    Returns:
+        ndarray: (2, 3) transform, None when the plate is not calibrated
+    """
+    if not os.path.isfile(path):
+        return None
+
+    with open(path, encoding='utf-8') as file:
+        transform = json.load(file).get(printer, {}).get(plate)
+    return None if transform is None else np.array(transform, dtype=float)
+
+def save_calibration(printer, plate, transform, path = CALIBRATION_FILE):
+    """Store the transform of a printer and plate type, None removes it"""
+    calibrations = {}
+    if os.path.isfile(path):
+        with open(path, encoding='utf-8') as file:
+            calibrations = json.load(file)
+
+    plates = calibrations.setdefault(printer, {})
+    if transform is None:
+        plates.pop(plate, None)
+    else:
+        plates[plate] = np.asarray(transform, dtype=float).tolist()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(calibrations, file, indent=4)
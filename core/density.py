@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Deposited-material density maps for BIOX G-Code Generator
+
+@author: Maria Teresa Alameda Felgueiras
+"""
+import numpy as np
+
+# Upper bound of points sampled per batch, keeps memory flat on huge toolpaths
+DENSITY_CHUNK_SAMPLES = 4_000_000
+
+# Largest density image side (pixels), the pixel size grows beyond it
+DENSITY_MAX_PIXELS = 2048
+
+
+def rasterize_segments(segments, width, pixel_size=None, bounds=None):
+    """
+    Bin extrusion segments into a top-down deposited-material density image
+
+    Every segment is sampled once per pixel it crosses, each sample carrying
+    its share of the deposited volume (length * width). Samples are binned
+    with np.bincount, so no Python loop runs per segment.
+
+    Args:
+        segments (ndarray): (n, 2, 2) or (n, 2, 3) segment start/end points
+        width (float): Extruded line width in mm
+        pixel_size (float): Pixel side in mm (default: line width)
+        bounds (tuple): (x_min, x_max, y_min, y_max) in mm (default: segments)
+
+    Returns:
+        ndarray: (ny, nx) density in layer equivalents (1.0 = one full pass)
+        tuple: (x_min, x_max, y_min, y_max) extent of the image
+    """
+    segments = np.asarray(segments, dtype=float)
+    x0 = np.ascontiguousarray(segments[:, 0, 0])
+    y0 = np.ascontiguousarray(segments[:, 0, 1])
+    dx = segments[:, 1, 0] - x0
+    dy = segments[:, 1, 1] - y0
+
+    if bounds is None:
+        x_min = min(x0.min(), (x0 + dx).min()) - width
+        x_max = max(x0.max(), (x0 + dx).max()) + width
+        y_min = min(y0.min(), (y0 + dy).min()) - width
+        y_max = max(y0.max(), (y0 + dy).max()) + width
+    else:
+        x_min, x_max, y_min, y_max = bounds
+
+    if pixel_size is None:
+        pixel_size = width
+    pixel_size = max(pixel_size,
+                     max(x_max - x_min, y_max - y_min) / DENSITY_MAX_PIXELS)
+
+    nx = max(int(np.ceil((x_max - x_min) / pixel_size)), 1)
+    ny = max(int(np.ceil((y_max - y_min) / pixel_size)), 1)
+
+    lengths = np.hypot(dx, dy)
+    samples = np.maximum(np.ceil(lengths / pixel_size), 1).astype(np.int64)
+    volumes = lengths * width / samples
+
+    density = np.zeros(nx * ny)
+
+    def accumulate(x, y, weights):
+        ix = np.clip(((x - x_min) / pixel_size).astype(np.int64), 0, nx - 1)
+        iy = np.clip(((y - y_min) / pixel_size).astype(np.int64), 0, ny - 1)
+        density[:] += np.bincount(iy * nx + ix, weights=weights, minlength=nx * ny)
+
+    # Batches of whole segments holding about DENSITY_CHUNK_SAMPLES points
+    cumulative = np.cumsum(samples)
+    breaks = np.searchsorted(cumulative,
+                             np.arange(DENSITY_CHUNK_SAMPLES, cumulative[-1],
+                                       DENSITY_CHUNK_SAMPLES),
+                             side='right')
+    edges = np.unique(np.concatenate([[0], breaks, [len(samples)]]))
+
+    for begin, end in zip(edges[:-1], edges[1:]):
+        counts = samples[begin:end]
+        if counts.max() == 1:
+            # Segments shorter than a pixel deposit everything at their midpoint
+            accumulate(x0[begin:end] + dx[begin:end] / 2,
+                       y0[begin:end] + dy[begin:end] / 2, volumes[begin:end])
+            continue
+
+        first = np.repeat(np.cumsum(counts) - counts, counts)
+        t = (np.arange(first.size) - first + 0.5) / np.repeat(counts, counts)
+        accumulate(np.repeat(x0[begin:end], counts) + np.repeat(dx[begin:end], counts) * t,
+                   np.repeat(y0[begin:end], counts) + np.repeat(dy[begin:end], counts) * t,
+                   np.repeat(volumes[begin:end], counts))
+
+    density /= pixel_size ** 2
+
+    return density.reshape(ny, nx), (x_min, x_min + nx * pixel_size,
+                                     y_min, y_min + ny * pixel_size)
+
+def deposition_hotspots(density, layers, factor=1.5):
+    """
+    Flag over-deposited pixels, such as grid line crossings
+
+    Args:
+        density (ndarray): Density image from rasterize_segments
+        layers (int): Number of layers, the expected single-pass stack
+        factor (float): Tolerated excess over one pass per layer
+
+    Returns:
+        ndarray: Boolean mask of hotspot pixels
+    """
+    return density > factor * max(layers, 1)
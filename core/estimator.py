@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Print time estimation for BIOX G-Code Generator
+
+Programs are parsed into move arrays and timed from their lengths and
+feedrates, plus the dwells, the overhead of printhead changes and
+cleanings and the settling of printhead temperature changes. Accelerations
+are ignored, so the estimate is a lower bound.
+
+@author: Maria Teresa Alameda Felgueiras
+"""
+import re
+import numpy as np
+from .gcode_parser import WORD_PATTERN, parse_moves
+
+# Seconds per printhead change (printhead swap and pressure build-up)
+TOOL_CHANGE_TIME = 15.
+
+# Dwell lines, e.g. "G4 S1 P500" (1.5 s)
+DWELL_PATTERN = re.compile(r'^G0*4(?![0-9.])([^;\n]*)', re.MULTILINE)
+
+# Printhead selection lines, e.g. "T1 Z0.30"
+TOOL_PATTERN = re.compile(r'^T(\d+)', re.MULTILINE)
+
+# Printhead temperature settling: seconds per setpoint change and per degree
+THERMAL_SETTLING_TIME = 30.
+THERMAL_SETTLING_RATE = 20.
+
+# Printhead temperature lines, e.g. "M771 T0 P37.5"
+SETPOINT_PATTERN = re.compile(r'^M771\s*T(\d+)\s*P([-+]?[\d.]+)', re.MULTILINE)
+
+# Comments around the blocks written by clean_printhead
+CLEANING_PATTERN = re.compile(r'^; (finished )?cleaning printhead', re.MULTILINE)
+
+
+def move_times(moves):
+    """
+    Duration in seconds of every parsed move (see parse_moves)
+
+    Straight moves are timed along their XYZ length, G2/G3 arcs along the
+    helix swept around their center. Moves without a feedrate take no time.
+    """
+    start, end = moves['start'], moves['end']
+    lengths = np.linalg.norm(end - start, axis=1)
+
+    arc = moves['code'] >= 2
+    if np.any(arc):
+        center = moves['center'][arc]
+        begin, finish = start[arc, :2] - center, end[arc, :2] - center
+        sweep = np.arctan2(finish[:, 1], finish[:, 0]) - np.arctan2(begin[:, 1], begin[:, 0])
+        # G3 turns counterclockwise, G2 clockwise; equal ends are full circles
+        sweep = np.where(moves['code'][arc] == 3, sweep, -sweep) % (2 * np.pi)
+        sweep[sweep < 1e-9] = 2 * np.pi
+        lengths[arc] = np.hypot(np.hypot(*begin.T) * sweep, end[arc, 2] - start[arc, 2])
+
+    feed = np.nan_to_num(moves['feed'])
+    return np.divide(lengths * 60, feed, out = np.zeros_like(lengths), where = feed > 0)
+
+def settling_time(setpoints):
+    """
+    Seconds waited for the printhead temperature to settle
+
+    Every change of setpoint costs THERMAL_SETTLING_TIME plus
+    THERMAL_SETTLING_RATE per degree; the first setpoint is not counted
+    (the starting temperature is unknown).
+
+    Args:
+        setpoints (array-like): Setpoints of one printhead in printing order
+
+    Returns:
+        float: Settling time in seconds
+    """
+    steps = np.abs(np.diff(np.asarray(setpoints, dtype=float)))
+    steps = steps[steps > 1e-9]
+    return float(len(steps) * THERMAL_SETTLING_TIME + steps.sum() * THERMAL_SETTLING_RATE)
+
+def line_finder(gcode):
+    """Zero-based line number of character offsets of a program, as a function"""
+    breaks = np.flatnonzero(np.frombuffer(gcode.encode('latin-1', 'replace'), dtype=np.uint8) == 10)
+    def line_of(offsets):
+        return np.searchsorted(breaks, np.asarray(offsets, dtype=int), side='right')
+    return line_of
+
+def in_cleaning(gcode, lines, line_of = None):
+    """
+    True for the (zero-based) lines inside the cleaning blocks of a program,
+    with more block starts than ends above them
+
+    Args:
+        gcode (str): Program text
+        lines (ndarray): Line numbers to look up
+        line_of (callable): line_finder of the program, when already built
+
+    Returns:
+        ndarray: Boolean mask of the lines
+    """
+    markers = list(CLEANING_PATTERN.finditer(gcode))
+    if not markers:
+        return np.zeros(len(lines), dtype=bool)
+
+    line_of = line_of or line_finder(gcode)
+    opened = line_of([marker.start() for marker in markers if not marker.group(1)])
+    closed = line_of([marker.start() for marker in markers if marker.group(1)])
+    return (np.searchsorted(opened, lines, side='right')
+            > np.searchsorted(closed, lines, side='right'))
+
+def estimate_print_time(gcode, tool_change_time = TOOL_CHANGE_TIME, moves = None):
+    """
+    Estimated duration of a program
+
+    A printhead change is a selection (T line) of another printhead than
+    the previous one. Its overhead is 'tool_change_time' plus the moves and
+    dwells of the cleaning blocks. Printhead temperature changes (M771 with
+    another setpoint for the same printhead) add their settling_time.
+
+    Args:
+        gcode (str): Program text
+        tool_change_time (float): Seconds per printhead change
+        moves (dict): parse_moves arrays of the program, when already parsed
+
+    Returns:
+        dict: Seconds of 'moves', 'dwells' and 'cleaning', number of
+              'tool_changes', their 'overhead' in seconds (changes and
+              cleaning), number of 'temperature_changes', their
+              'settling' in seconds and the 'total' in seconds
+    """
+    # Line number of every character offset, for the regular expression matches
+    line_of = line_finder(gcode)
+
+    if moves is None:
+        moves = parse_moves(gcode)
+    times = move_times(moves)
+
+    dwell_lines, dwells = [], []
+    for match in DWELL_PATTERN.finditer(gcode):
+        words = dict(WORD_PATTERN.findall(match.group(1).upper()))
+        dwell_lines.append(match.start())
+        dwells.append(float(words.get('S', 0)) + float(words.get('P', 0)) / 1000)
+    dwell_lines, dwells = line_of(dwell_lines), np.array(dwells, dtype=float)
+
+    cleaning_time = (times[in_cleaning(gcode, moves['line'], line_of)].sum()
+                     + dwells[in_cleaning(gcode, dwell_lines, line_of)].sum())
+
+    tools = np.array(TOOL_PATTERN.findall(gcode), dtype=int)
+    changes = int(np.count_nonzero(tools[1:] != tools[:-1]))
+    overhead = changes * tool_change_time + cleaning_time
+
+    setpoints = np.array(SETPOINT_PATTERN.findall(gcode), dtype=float).reshape(-1, 2)
+    settling, temperature_changes = 0., 0
+    for printhead in np.unique(setpoints[:, 0]):
+        values = setpoints[setpoints[:, 0] == printhead, 1]
+        settling += settling_time(values)
+        temperature_changes += int(np.count_nonzero(np.abs(np.diff(values)) > 1e-9))
+
+    return {
+        'moves': float(times.sum()),
+        'dwells': float(dwells.sum()),
+        'cleaning': float(cleaning_time),
+        'tool_changes': changes,
+        'overhead': float(overhead),
+        'temperature_changes': temperature_changes,
+        'settling': settling,
+        'total': float(times.sum() + dwells.sum() + changes * tool_change_time + settling)
+    }
@@ -5,6 +5,13 @@ Created on Tue Mar  4 22:17:15 2025
 @author: Maite
 """
 import numpy as np
+from .toolpaths import (perimeter_center, striped_segments, grid_segments,
+                        honeycomb_segments, tpms_segments, rectangle_outline,
+                        perimeter_shells, extrusion_rate, TPMS_FIELDS)
+from .arcs import ARC_MIN_POINTS, fit_arcs, arc_extrusion, arc_statistics
+from .simplify import simplify_segments, simplify_ring
+from .scheduling import SCAFFOLD_REGIONS
+from .printheads import extrusion_emitter, bed_position
 
 class GCODE:
     
@@ -21,6 +28,8 @@ class GCODE:
         if pattern is not None:
             if pattern.lower() == 'striped': gcode += "; Striped scaffold pattern.\n"
             elif pattern.lower() == 'grid': gcode += "; Grid scaffold pattern.\n"
+            elif pattern.lower() == 'honeycomb': gcode += "; Honeycomb scaffold pattern.\n"
+            elif pattern.lower() in TPMS_FIELDS: gcode += f"; {pattern} (TPMS) scaffold pattern.\n"
             
         if printhead_type_value is not None:
             gcode += f"; {printhead_type_value} printhead selected \n\n"
@@ -120,6 +129,27 @@ class GCODE:
         
         return gcode + "\n\n"
     
+    @staticmethod
+    def well_moves(centers, index, speed):
+        """
+        Moves to many wells at once, written as move_to_position writes them
+        
+        Args:
+            centers (ndarray): (n, 2) well centres in mm
+            index (ndarray): (n, 2) (row, col) of every well
+            speed (float): Travel speed in mm/min
+        
+        Returns:
+            list: (n,) move texts
+        """
+        speed = float(speed)
+        move = ("G0 X{0:.3f} Y{1:.3f} F{speed} ; Move to X{0:.3f} Y{1:.3f}"
+                " with speed {speed} mm/min well ({2}, {3})\n"
+                "M400 ; wait for queued moves to finish\n\n").format
+        return [move(x, y, row + 1, col + 1, speed = speed)
+                for (x, y), (row, col) in zip(np.asarray(centers).tolist(),
+                                              np.asarray(index).tolist())]
+    
     
     @staticmethod
     def move_bed(gcode, z, speed = None):
@@ -149,220 +179,586 @@ class GCODE:
     
     @staticmethod
     def emd_extrusion(gcode, printhead, pressure, dwell):
-        
-        seconds = int(np.trunc(dwell))
-        miliseconds = int((dwell - seconds) * 1000)
-        
-        gcode += f"M750 T{printhead} P{pressure}; Start EMD extrusion"
-        gcode += f" with pressure {pressure} kPa\n"
-        
-        if miliseconds != 0 and seconds != 0:
-            gcode += f"G4 S{seconds} P{miliseconds}" 
-            gcode += f"; Wait for {seconds} seconds and {miliseconds} miliseconds\n"
-        elif miliseconds == 0:
-            gcode += f"G4 S{seconds}" 
-            gcode += f"; Wait for {seconds} seconds\n"
-        elif seconds == 0:
-            gcode += f"G4 P{miliseconds}" 
-            gcode += f"; Wait for {miliseconds} miliseconds\n"
-            
-        gcode += f"M751 T{printhead} ; Stop EMD extrusion\n\n"
-        
-        return gcode
-    
+        return gcode + extrusion_emitter("EMD")(printhead, [pressure], [dwell])[0]
     
     @staticmethod
     def pneumatic_extrusion(gcode, printhead, pressure, dwell):
-        
-        seconds = int(np.trunc(dwell))
-        miliseconds = int((dwell - seconds) * 1000)
-        
-        gcode += f"M750 T{printhead} P{pressure}; Start pneumatic extrusion"
-        gcode += f" with pressure {pressure} kPa\n"
-        
-        if miliseconds != 0 and seconds != 0:
-            gcode += f"G4 S{seconds} P{miliseconds}" 
-            gcode += f"; Wait for {seconds} seconds and {miliseconds} miliseconds\n"
-        elif miliseconds == 0:
-            gcode += f"G4 S{seconds}" 
-            gcode += f"; Wait for {seconds} seconds\n"
-        elif seconds == 0:
-            gcode += f"G4 P{miliseconds}" 
-            gcode += f"; Wait for {miliseconds} miliseconds\n"
-            
-        gcode += f"M751 T{printhead} ; Stop pneumatic extrusion\n\n"
-        
-        return gcode
+        return gcode + extrusion_emitter("Pneumatic")(printhead, [pressure], [dwell])[0]
     
     @staticmethod
     def emd_extrusion_cycle(gcode, printhead, pressure, time):
-        
-        gcode += (f"M750 T{printhead} P{pressure} D{time};" 
-                  f" EMD extrusion for {time} seconds\n\n")
-        
-        return gcode
+        return gcode + extrusion_emitter("EMD", 'cycle')(printhead, [pressure], [time])[0]
     
     @staticmethod
     def thermo_extrusion(gcode, printhead, pressure, dwell):
-        
-        gcode += f"M750 T{printhead} P{pressure}; Start EMD extrusion\n"
-        gcode += f"G4 S{dwell} ; Pause for {dwell} seconds\n"
-        gcode += f"M751 T{printhead} ; Stop EMD extrusion\n\n"
-        
-        return gcode
+        return gcode + extrusion_emitter("Thermo-controlled")(printhead, [pressure], [dwell])[0]
     
     @staticmethod
     def thermo_extrusion_cycle(gcode, printhead, pressure, time):
+        return gcode + extrusion_emitter("Thermo-controlled", 'cycle')(printhead, [pressure],
+                                                                       [time])[0]
+    
+    @classmethod
+    def extrusion_blocks(cls, printhead_type, printhead, pressures, times, z,
+                         bed_movement_position, speed, cache = None):
+        """
+        Extrusion blocks of many wells with one printhead.
         
-        gcode += (f"M750 T{printhead} P{pressure} D{time};" 
-                  f" EMD extrusion for {time} seconds\n\n")
+        The commands come from PRINTHEAD_COMMANDS: the bed moves to the
+        extrusion position of the printhead type, extrudes and moves back
+        to 'bed_movement_position'. The bed moves are the same for every
+        well and formatted once. With a BlockCache, blocks are looked up by
+        (printhead type, printhead, pressure, time, z, bed position, speed)
+        and only the missing parameter sets are formatted, in one batch.
         
-        return gcode
+        Parameters:
+        - printhead_type: str, key of PRINTHEAD_COMMANDS.
+        - printhead: int, printhead number.
+        - pressures, times: arrays, pressure (kPa) and extrusion time (s)
+                            of every well.
+        - z: float, layer height for printheads extruding at that height.
+        - bed_movement_position: float, bed Z for moving between wells.
+        - speed: bed speed.
+        - cache: BlockCache counting its hits and misses, or None.
+        
+        Returns:
+        - List with the G-code block of every well.
+        """
+        
+        if cache is not None:
+            prefix = (printhead_type, printhead)
+            suffix = (z, bed_movement_position, speed)
+            keys = [prefix + pair + suffix
+                    for pair in zip(np.asarray(pressures).tolist(), np.asarray(times).tolist())]
+            
+            blocks = {}
+            for key in dict.fromkeys(keys):
+                block = cache.get(key)
+                if block is not None:
+                    blocks[key] = block
+            
+            missing = [key for key in dict.fromkeys(keys) if key not in blocks]
+            if missing:
+                formatted = cls.extrusion_blocks(printhead_type, printhead,
+                                                 [key[2] for key in missing],
+                                                 [key[3] for key in missing],
+                                                 z, bed_movement_position, speed)
+                for key, block in zip(missing, formatted):
+                    cache.put(key, block)
+                    blocks[key] = block
+            
+            cache.hits += len(keys) - len(missing)
+            cache.misses += len(missing)
+            return [blocks[key] for key in keys]
+        
+        blocks = extrusion_emitter(printhead_type)(printhead, pressures, times)
+        
+        extruding = bed_position(printhead_type, z)
+        if extruding is None:
+            return blocks
+        
+        lower = cls.move_bed("", z = extruding, speed = speed)
+        lift = cls.move_bed("", z = bed_movement_position, speed = speed)
+        
+        return [lower + block + lift for block in blocks]
     
     @staticmethod
     def generate_scafold_perimeter(gcode, dimensions, origin, extrusion, 
-                                   layers = 1, speed = 1200):
+                                   layers = 1, speed = 1200, shells = 1,
+                                   spacing = None, outline = None,
+                                   arc_tolerance = None, simplify_tolerance = None,
+                                   stats = None, height = None, travel_speed = 3000):
         
         """
-        Appends G-code to draw a rectangular perimeter starting from 'origin'.
+        Appends G-code to draw the scaffold perimeter starting from 'origin'.
+        
+        The perimeter is printed as 'shells' concentric loops, from the
+        outline inwards, all offset from the outline in one batch. Outlines
+        of several rings (islands, holes) are printed ring by ring. The
+        printhead is expected at the first outline vertex ('origin' for the
+        default rectangle) and moves to every inner shell of a ring at
+        print height; with a layer 'height' it is raised 1 mm to travel to
+        the next ring.
+        Every edge extrudes in proportion to its length (see extrusion_rate),
+        so curved outlines deposit the same however finely they are
+        discretized.
         
         Parameters:
         - gcode: str, initial G-code string to append to.
         - dimensions: tuple (width, height), the rectangle's size in mm.
         - origin: tuple (x, y), starting point of the perimeter.
-        - extrusion: float, amount of extrusion per side (assumed fixed).
+        - extrusion: float, amount of extrusion per side of the rectangle.
         - speed: int, movement speed in mm/min (default: 1200).
+        - shells: int, number of concentric perimeter loops (default: 1).
+        - spacing: float, distance between shells in mm (default: extrusion).
+        - outline: (m, 2) array or list of arrays, perimeter outline(s)
+                   replacing the rectangle, holes included.
+        - arc_tolerance: float, fit G2/G3 arcs within this distance in mm
+                         (default: None, straight moves only).
+        - simplify_tolerance: float, drop shell points within this distance
+                              in mm of the simplified outline (default: None).
+        - stats: dict, running arc fitting and simplification counts.
+        - height: float, print height in mm (default: None, rings are
+                  joined at print height as well).
+        - travel_speed: int, speed in mm/min of the travel between rings
+                        (default: 3000).
         
         Returns:
         - Updated gcode string with perimeter moves.
         """
         
+        if outline is None:
+            outline = rectangle_outline(dimensions, origin)
+        if spacing is None:
+            spacing = extrusion
+        rate = extrusion_rate(dimensions, extrusion)
+        
         gcode += f"; printing external perimeter at speed {speed} mm/min\n"
         
         # Set the feedrate (movement speed for extrusion moves)
         gcode += f"G1 F{speed}; set extrusion speed movement to {speed} mm/min\n"
-            
         
-        for i in range(4):
+        shell_rings = [(ring, index, shell) for ring, group
+                       in enumerate(perimeter_shells(outline, shells, spacing, grouped = True))
+                       for index, shell in enumerate(group)]
+        
+        lines = []
+        for ring, index, shell in shell_rings:
             
-            # Current position
-            x0, y0 = origin
+            # Extrusion of the edge from every vertex to the next
+            amounts = rate * np.hypot(*(np.roll(shell, -1, axis=0) - shell).T)
             
-            # Compute quadrant
-            angle = np.arctan2(y0, x0)
-            quadrant = int((angle/(np.pi/2)) % 4 + 1)
+            if simplify_tolerance:
+                simplified, amounts = simplify_ring(shell, simplify_tolerance, amounts)
+                if stats is not None:
+                    stats['simplified'] = stats.get('simplified', 0) + len(shell) - len(simplified)
+                shell = simplified
             
-            # Choose direction of movement depending on quadrant
-            if quadrant == 1: deltax , deltay = - dimensions[0] , 0
-            elif quadrant == 2: deltax , deltay = 0 , - dimensions[1]
-            elif quadrant == 3: deltax , deltay = dimensions[0] , 0
-            elif quadrant == 4: deltax , deltay = 0, dimensions[0]
+            # Closed loop: every vertex after the first, then back to the first
+            points = np.roll(shell, -1, axis=0).tolist()
+            amounts = amounts.tolist()
             
-            # Append G-code move and extrusion
-            gcode += (f"G1 X{x0 + deltax} Y{y0 + deltay} E{extrusion}; " +
-                      f"move to point ({x0 + deltax} , {y0 + deltay}) mm\n")
+            x, y = shell[0].tolist()
+            if index > 0:
+                lines.append(f"G1 X{x:.3f} Y{y:.3f}; move to shell {index + 1}"
+                             f" start ({x:.3f} , {y:.3f}) mm\n")
+            elif ring > 0 and height is not None:
+                # Another island or hole: travel raised, not through the print
+                lines.append(f"G1 Z{height + 1:.2f} F{travel_speed} ; raise to travel to"
+                             f" ring {ring + 1}\n")
+                lines.append(f"G1 X{x:.3f} Y{y:.3f}; move to ring {ring + 1}"
+                             f" start ({x:.3f} , {y:.3f}) mm\n")
+                lines.append(f"G1 Z{height:.2f} F{speed} ; lower to print ring {ring + 1}\n")
+            elif ring > 0:
+                lines.append(f"G1 X{x:.3f} Y{y:.3f}; move to ring {ring + 1}"
+                             f" start ({x:.3f} , {y:.3f}) mm\n")
             
-            # Update origin value for next perimeter side
-            origin = x0 + deltax , y0 + deltay
+            arcs = {}
+            loop = np.vstack([shell, shell[:1]])
+            if arc_tolerance:
+                arcs = {low: (high, center, turn) for low, high, center, turn
+                        in fit_arcs(loop, arc_tolerance)}
+                arc_statistics(stats, sum(high - low for low, (high, _, _) in arcs.items()),
+                               len(arcs))
             
-        return gcode
+            point = 0
+            while point < len(points):
+                x, y = points[point]
+                if point in arcs:
+                    high, (cx, cy), turn = arcs[point]
+                    x, y = points[high - 1]
+                    x0, y0 = shell[point].tolist()
+                    amount = arc_extrusion(loop[point:high + 1], (cx, cy), turn,
+                                           amounts[point:high])
+                    lines.append(f"G{3 if turn > 0 else 2} X{x:.3f} Y{y:.3f}"
+                                 f" I{cx - x0:.3f} J{cy - y0:.3f}"
+                                 f" E{round(amount, 6)}; "
+                                 f"arc to point ({x:.3f} , {y:.3f}) mm\n")
+                    point = high
+                    continue
+                lines.append(f"G1 X{x:.3f} Y{y:.3f} E{round(amounts[point], 6)}; "
+                             f"move to point ({x:.3f} , {y:.3f}) mm\n")
+                point += 1
+            
+        return gcode + "".join(lines)
                 
     @classmethod
     def generate_striped_scaffold(cls, gcode, dimensions, origin,
                                   delta, lines, height, speed = 1200, 
-                                  extrusion = 0.94):
-        
-        xi , yi = origin
-        
-        for index in range(lines - 1):
-            
-            xi -= delta
-            
-            # Move to next infill point without extruding
-            gcode = cls.move_to_position(gcode, x = xi, y = yi, wait = False,
-                                         precise = 1, speed = 3000)
-            
-            # Move to extrusion height lowering printhead
-            gcode = cls.move_to_position(gcode, z = height, speed = 3000, 
-                                         precise = 1, wait = False)
-            
-            # Extrude line
-            gcode = cls.move_to_position(gcode, x=xi, y=-yi, wait = False,
-                                         precise = 1, extrusion = extrusion,
-                                         speed = speed)
-            
-            # Raise the printhead
-            gcode = cls.move_to_position(gcode, z = height + 1, speed = 3000,
-                                         precise = 1, wait = False)
-            
-        return gcode         
+                                  extrusion = 0.94, boundary = None,
+                                  angle = 90, arc_tolerance = None,
+                                  simplify_tolerance = None, stats = None):
+        
+        # Lines at 'angle' (90: parallel to Y), printed back and forth and
+        # clipped in one batch. Their number follows from 'delta' and the
+        # boundary, 'lines' is kept for compatibility. Clipped lines extrude
+        # in proportion to their length, 'extrusion' being the amount of a
+        # line across the perimeter rectangle (see extrusion_rate).
+        segments = striped_segments(dimensions, delta,
+                                    center = perimeter_center(dimensions, origin),
+                                    angle = angle, boundary = boundary)
+        lengths = np.hypot(*(segments[:, 1] - segments[:, 0]).T)
+        
+        return cls.extrude_segments(gcode, segments, height, speed = speed,
+                                    extrusion = extrusion_rate(dimensions, extrusion) * lengths,
+                                    arc_tolerance = arc_tolerance,
+                                    simplify_tolerance = simplify_tolerance,
+                                    stats = stats)
     
     @classmethod
     def generate_grid_scaffold(cls, gcode, dimensions, origin,
                                   delta, lines, height, speed = 1200, 
-                                  extrusion = 0.94):
+                                  extrusion = 0.94, boundary = None,
+                                  angle = 90, arc_tolerance = None,
+                                  simplify_tolerance = None, stats = None):
+        
+        # Lines at 'angle', then at 'angle' + 90 degrees, clipped in one
+        # batch and extruding in proportion to their length
+        segments = grid_segments(dimensions, delta,
+                                 center = perimeter_center(dimensions, origin),
+                                 angle = angle, boundary = boundary)
+        lengths = np.hypot(*(segments[:, 1] - segments[:, 0]).T)
+        
+        return cls.extrude_segments(gcode, segments, height, speed = speed,
+                                    extrusion = extrusion_rate(dimensions, extrusion) * lengths,
+                                    arc_tolerance = arc_tolerance,
+                                    simplify_tolerance = simplify_tolerance,
+                                    stats = stats)
         
-        xi , yi = origin
+    @classmethod
+    def generate_honeycomb_scaffold(cls, gcode, dimensions, origin,
+                                    delta, height, speed = 1200,
+                                    extrusion = 0.94, layer = 0,
+                                    boundary = None, arc_tolerance = None,
+                                    simplify_tolerance = None, stats = None):
+        """
+        Appends one honeycomb infill layer inside the scaffold perimeter.
         
-        for index in range(lines - 1):
-            
-            xi -= delta
-            
-            gcode = cls.move_to_position(gcode, x = xi, y = yi, wait = False,
-                                         precise = 1, speed = 3000)
-            
-            gcode = cls.move_to_position(gcode, z = height, speed = 3000, 
-                                         precise = 1, wait = False)
-            
-            gcode = cls.move_to_position(gcode, x=xi, y=-yi, wait = False,
-                                         precise = 1, extrusion = extrusion,
-                                         speed = speed)
-            
-            gcode = cls.move_to_position(gcode, z = height + 1, speed = 3000,
-                                         precise = 1, wait = False)
+        Parameters:
+        - gcode: str, initial G-code string to append to.
+        - dimensions: tuple (width, height), the perimeter size in mm.
+        - origin: tuple (x, y), perimeter corner as used by the perimeter.
+        - delta: float, distance between hexagon centers in mm.
+        - height: float, layer height in mm.
+        - speed: int, extrusion speed in mm/min (default: 1200).
+        - extrusion: float, amount of extrusion per side of the perimeter
+                     rectangle (see extrusion_rate).
+        - layer: int, layer index, odd layers are printed backwards.
+        - boundary: clipping rectangle or outline (default: the perimeter).
+        - arc_tolerance, simplify_tolerance, stats: see extrude_segments.
         
-        xi , yi = origin
-        for index in range(lines - 1):
-            
-            yi -= delta
-            
-            gcode = cls.move_to_position(gcode, x = xi, y = yi, wait = False,
-                                         precise = 1, speed = 3000)
-            
-            gcode = cls.move_to_position(gcode, z = height, speed = 3000, 
-                                         precise = 1, wait = False)
-            
-            gcode = cls.move_to_position(gcode, x=-xi, y=yi, wait = False,
-                                         precise = 1, extrusion = extrusion,
-                                         speed = speed)
-            
-            gcode = cls.move_to_position(gcode, z = height + 1, speed = 3000,
-                                         precise = 1, wait = False)
-            
-        return gcode         
+        Returns:
+        - Updated gcode string with the honeycomb moves.
+        """
         
+        segments = honeycomb_segments(dimensions, delta,
+                                      center = perimeter_center(dimensions, origin),
+                                      reverse = layer % 2 == 1,
+                                      boundary = boundary)
+        lengths = np.hypot(*(segments[:, 1] - segments[:, 0]).T)
+        
+        # Hexagon sides between printed diagonals are crossed at print height
+        hop_distance = 1.01 * delta / np.sqrt(3)
+        
+        return cls.extrude_segments(gcode, segments, height, speed = speed,
+                                    extrusion = extrusion_rate(dimensions, extrusion) * lengths,
+                                    hop_distance = hop_distance,
+                                    arc_tolerance = arc_tolerance,
+                                    simplify_tolerance = simplify_tolerance,
+                                    stats = stats)
+    
+    @classmethod
+    def generate_tpms_scaffold(cls, gcode, dimensions, origin, cell_size,
+                               height, speed = 1200, extrusion = 0.94,
+                               surface = 'gyroid', boundary = None,
+                               arc_tolerance = None, simplify_tolerance = None,
+                               stats = None):
+        """
+        Appends one triply periodic minimal surface (TPMS) infill layer.
         
-    @staticmethod
-    def generate_honeycomb_scaffold(gcode = None, 
-                                    size_x=20, size_y=20, size_z=10, 
-                                    wall_thickness=0.43, cell_size=5, 
-                                    layer_height=0.3, print_speed=10, 
-                                    printhead=0, pressure=50):
+        The surface is sliced at the layer height, so the contours change
+        from layer to layer and build up the 3D lattice. The contours are
+        made of short marching-squares segments, each extruding in
+        proportion to its length (see extrusion_rate).
+        
+        Parameters:
+        - gcode: str, initial G-code string to append to.
+        - dimensions: tuple (width, height), the perimeter size in mm.
+        - origin: tuple (x, y), perimeter corner as used by the perimeter.
+        - cell_size: float, unit cell size of the surface in mm.
+        - height: float, layer height in mm.
+        - speed: int, extrusion speed in mm/min (default: 1200).
+        - extrusion: float, amount of extrusion per side of the perimeter
+                     rectangle (see extrusion_rate).
+        - surface: str, 'gyroid' or 'schwarz p'.
+        - boundary: clipping rectangle or outline (default: the perimeter).
+        - arc_tolerance, simplify_tolerance, stats: see extrude_segments.
+        
+        Returns:
+        - Updated gcode string with the TPMS moves.
+        """
+        
+        segments = tpms_segments(dimensions, cell_size, height, surface = surface,
+                                 center = perimeter_center(dimensions, origin),
+                                 boundary = boundary)
+        lengths = np.hypot(*(segments[:, 1] - segments[:, 0]).T)
+        
+        return cls.extrude_segments(gcode, segments, height, speed = speed,
+                                    extrusion = extrusion_rate(dimensions, extrusion) * lengths,
+                                    arc_tolerance = arc_tolerance,
+                                    simplify_tolerance = simplify_tolerance,
+                                    stats = stats)
+    
+    @classmethod
+    def generate_scaffold_layer(cls, gcode, layer, settings, stats = None):
         """
-        Generate honeycomb scaffold G-code for a 3D cube.
+        Appends one complete scaffold layer: perimeter, then infill.
+        
+        Every layer only depends on its index and the scaffold settings, so
+        layers can be generated independently and joined in order.
         
         Parameters:
-        - size_x, size_y, size_z: Dimensions in mm (default 20×20×10mm)
-        - wall_thickness: Extrusion width (default 0.43mm)
-        - cell_size: Distance between hexagon centers (default 5mm)
-        - layer_height: Z-step per layer (default 0.3mm)
-        - print_speed: Movement speed (default 10mm/s)
-        - printhead: Printhead number (default 0)
-        - pressure: Extrusion pressure (default 50kPa)
+        - gcode: str, initial G-code string to append to.
+        - layer: int, layer index, printed at (layer + 1) * 'height'.
+        - settings: dict with 'pattern', 'height', 'speed', 'dimensions',
+                    'origin', 'extrusion', 'lines', 'shells', 'outline',
+                    'boundary', 'arc_tolerance', 'simplify_tolerance' and
+                    the per-layer lists 'spacings' and 'angles'. Optional
+                    per-layer lists 'outlines' and 'boundaries' (e.g.
+                    sliced from a mesh) replace 'outline' and 'boundary';
+                    layers with an empty outline are skipped. Multi-material
+                    scaffolds give the per-layer 'schedule' of
+                    (region, printhead, change) jobs (see schedule_tools)
+                    and optionally the 'cleaning' dict ('speed',
+                    'bed_position') to clean every printhead loaded.
+        - stats: dict, running arc fitting and simplification counts.
+        
+        Returns:
+        - Updated gcode string with the layer.
+        """
+        
+        outline, boundary = cls.layer_outline(layer, settings)
+        layer_height = (layer + 1) * settings['height']
+        
+        gcode = cls.introduce_comment(gcode, f"Printing layer at height {layer_height} mm")
+        
+        if len(outline) == 0:
+            return cls.introduce_comment(gcode, "Empty layer, nothing to print")
+        
+        jobs = settings.get('schedule')
+        jobs = jobs[layer] if jobs is not None else [(region, None, False)
+                                                     for region in SCAFFOLD_REGIONS]
+        
+        for region, printhead, change in jobs:
+            if change:
+                # Clear the layers printed so far before the printhead is swapped
+                gcode = cls.move_to_position(gcode, z = layer_height + 1, speed = 3000, precise = 1)
+                gcode = cls.change_printhead(gcode, printhead,
+                                             cleaning = settings.get('cleaning'))
+            if region == 'perimeter':
+                gcode = cls.generate_layer_perimeter(gcode, layer, settings, stats = stats)
+            else:
+                gcode = cls.generate_layer_infill(gcode, layer, settings, stats = stats)
+        
+        return gcode
+    
+    @staticmethod
+    def layer_outline(layer, settings):
+        """Perimeter outline and infill boundary of one layer (see generate_scaffold_layer)"""
+        if 'outlines' in settings:
+            return settings['outlines'][layer], settings['boundaries'][layer]
+        return settings['outline'], settings['boundary']
+    
+    @classmethod
+    def generate_layer_perimeter(cls, gcode, layer, settings, stats = None):
+        """
+        Appends the perimeter shells of one scaffold layer, entered from
+        above and left with the printhead raised.
+        """
+        
+        outline = cls.layer_outline(layer, settings)[0]
+        layer_height = (layer + 1) * settings['height']
+        
+        # First vertex of the outline, or of its first ring
+        start = outline[0] if np.ndim(outline[0]) == 1 else outline[0][0]
+        
+        gcode = cls.move_to_position(gcode, z = layer_height + 1, speed = 3000, precise = 1)
+        gcode = cls.move_to_position(gcode, x = start[0], y = start[1], speed = 3000, precise = 1)
+        gcode = cls.move_to_position(gcode, z = layer_height, speed = 3000, precise = 1)
+        
+        gcode = cls.generate_scafold_perimeter(gcode, settings['dimensions'], settings['origin'],
+                                               settings['extrusion'], height = layer_height,
+                                               speed = settings['speed'],
+                                               shells = settings['shells'], outline = outline,
+                                               arc_tolerance = settings['arc_tolerance'],
+                                               simplify_tolerance = settings['simplify_tolerance'],
+                                               stats = stats)
+        
+        return cls.move_to_position(gcode, z = layer_height + 1, speed = 3000, precise = 1)
+    
+    @classmethod
+    def generate_layer_infill(cls, gcode, layer, settings, stats = None):
+        """
+        Appends the infill of one scaffold layer, printed with the pattern of the settings.
+        
+        Every pattern extrudes at the rate of the perimeter (see extrusion_rate),
+        so infill clipped to circles, polygons or sliced outlines deposits the
+        same material per mm as the perimeter edges around it.
         """
+        
+        pattern = settings['pattern'].lower()
+        boundary = cls.layer_outline(layer, settings)[1]
+        layer_height = (layer + 1) * settings['height']
+        speed = settings['speed']
+        extrusion = settings['extrusion']
+        fitting = dict(arc_tolerance = settings['arc_tolerance'],
+                       simplify_tolerance = settings['simplify_tolerance'],
+                       stats = stats)
+        
+        if pattern == 'striped':
+            gcode = cls.generate_striped_scaffold(gcode, settings['dimensions'], settings['origin'],
+                                                  settings['spacings'][layer], settings['lines'],
+                                                  layer_height, speed = speed, extrusion = extrusion,
+                                                  angle = settings['angles'][layer],
+                                                  boundary = boundary, **fitting)
+        elif pattern == 'grid':
+            gcode = cls.generate_grid_scaffold(gcode, settings['dimensions'], settings['origin'],
+                                               settings['spacings'][layer], settings['lines'],
+                                               layer_height, speed = speed, extrusion = extrusion,
+                                               angle = settings['angles'][layer],
+                                               boundary = boundary, **fitting)
+        elif pattern == 'honeycomb':
+            gcode = cls.generate_honeycomb_scaffold(gcode, settings['dimensions'], settings['origin'],
+                                                    settings['spacings'][layer], layer_height,
+                                                    speed = speed, extrusion = extrusion,
+                                                    layer = layer, boundary = boundary, **fitting)
+        elif pattern in TPMS_FIELDS:
+            gcode = cls.generate_tpms_scaffold(gcode, settings['dimensions'], settings['origin'],
+                                               settings['spacings'][layer], layer_height,
+                                               speed = speed, extrusion = extrusion,
+                                               surface = pattern,
+                                               boundary = boundary, **fitting)
+        
+        return gcode
     
+    @classmethod
+    def change_printhead(cls, gcode, printhead, z = None, cleaning = None):
+        """
+        Appends a printhead change, with the printhead raised.
+        
+        The default pressures of all printheads are set once at the start,
+        so a change only selects the printhead and, with a 'cleaning' dict
+        ('speed', 'bed_position'), cleans it before it prints. The selection
+        moves to 'z' when given; changes in the middle of a print raise the
+        printhead above the printed layers first and give no 'z'.
+        """
+        
+        gcode = cls.introduce_comment(gcode, f"Changing to printhead {printhead}")
+        gcode = cls.set_printhead(gcode, printhead, z = z)
+        
+        if cleaning is not None:
+            gcode = clean_printhead(gcode, printhead, cleaning['speed'], cleaning['bed_position'])
+        
         return gcode
     
+    @staticmethod
+    def extrude_segments(gcode, segments, height, speed = 1200,
+                         extrusion = 0.94, travel_speed = 3000,
+                         hop_distance = 0., arc_tolerance = None,
+                         simplify_tolerance = None, stats = None):
+        """
+        Appends G-code extruding an ordered (n, 2, 2) array of segments.
+        
+        Segments that start where the previous one ended are printed as one
+        continuous path. Other gaps are travelled without extrusion, raising
+        the printhead 1 mm unless the gap is shorter than 'hop_distance'.
+        The printhead is expected raised on entry and is left raised.
+        
+        'extrusion' is the amount of every segment, or an (n,) array of
+        per-segment amounts. With an 'arc_tolerance' (mm), runs of a
+        continuous path lying on a circle are printed as one G2/G3 arc
+        extruding along its length at the rate of the moves it replaces
+        (see arc_extrusion). With a
+        'simplify_tolerance' (mm), points of continuous paths closer than
+        that to the simplified path are dropped first, the kept moves
+        extruding the amounts of the dropped ones. 'stats' collects the arc
+        fitting and simplification counts.
+        
+        Returns:
+        - Updated gcode string with the segment moves.
+        """
+        
+        segments = np.asarray(segments, dtype=float)
+        if len(segments) == 0:
+            return gcode
+        
+        amounts = np.broadcast_to(np.asarray(extrusion, dtype=float), len(segments))
+        if simplify_tolerance:
+            segments, amounts, removed = simplify_segments(segments, simplify_tolerance, amounts)
+            if stats is not None:
+                stats['simplified'] = stats.get('simplified', 0) + removed
+        
+        speed = float(speed)
+        travel_speed = float(travel_speed)
+        
+        gaps = np.hypot(*(segments[1:, 0, :2] - segments[:-1, 1, :2]).T)
+        travel = np.concatenate([[True], gaps > 1e-6]).tolist()
+        hop = np.concatenate([[True], gaps > hop_distance]).tolist()
+        
+        raise_head = (f"G1 Z{height + 1:.2f} F{travel_speed} ; Move to"
+                      f" Z{height + 1:.2f} with speed {travel_speed} mm/min\n\n")
+        lower_head = (f"G1 Z{height:.2f} F{travel_speed} ; Move to"
+                      f" Z{height:.2f} with speed {travel_speed} mm/min\n\n")
+        
+        # Arcs keyed by their first segment: (segment after the arc, center, turn)
+        arcs = {}
+        if arc_tolerance:
+            starts = np.flatnonzero(travel)
+            stops = np.append(starts[1:], len(segments))
+            for begin, end in zip(starts.tolist(), stops.tolist()):
+                if end - begin + 1 < ARC_MIN_POINTS:
+                    continue
+                points = np.vstack([segments[begin, :1, :2], segments[begin:end, 1, :2]])
+                for low, high, center, turn in fit_arcs(points, arc_tolerance):
+                    arcs[begin + low] = (begin + high, center, turn)
+            arc_statistics(stats, sum(high - low for low, (high, _, _) in arcs.items()),
+                           len(arcs))
+        
+        starts = segments[:, 0, :2].tolist()
+        ends = segments[:, 1, :2].tolist()
+        amounts = amounts.tolist()
+        
+        lines = []
+        index = 0
+        while index < len(segments):
+            (x0, y0), (x1, y1) = starts[index], ends[index]
+            
+            if travel[index]:
+                if hop[index] and lines: lines.append(raise_head)
+                lines.append(f"G1 X{x0:.3f} Y{y0:.3f} F{travel_speed} ; Move to"
+                             f" X{x0:.3f} Y{y0:.3f} with speed {travel_speed} mm/min\n\n")
+                if hop[index]: lines.append(lower_head)
+            
+            if index in arcs:
+                stop, (cx, cy), turn = arcs[index]
+                x1, y1 = ends[stop - 1]
+                run = np.vstack([segments[index, :1, :2], segments[index:stop, 1, :2]])
+                amount = arc_extrusion(run, (cx, cy), turn, amounts[index:stop])
+                lines.append(f"G{3 if turn > 0 else 2} X{x1:.3f} Y{y1:.3f}"
+                             f" I{cx - x0:.3f} J{cy - y0:.3f}"
+                             f" E{round(amount, 6)} F{speed} ; Arc to"
+                             f" X{x1:.3f} Y{y1:.3f} with speed {speed} mm/min\n\n")
+                index = stop
+                continue
+                
+            lines.append(f"G1 X{x1:.3f} Y{y1:.3f} E{round(amounts[index], 6)} F{speed} ; Extruding to"
+                         f" X{x1:.3f} Y{y1:.3f} with speed {speed} mm/min\n\n")
+            index += 1
+        
+        lines.append(raise_head)
+        
+        return gcode + "".join(lines)
+    
     @staticmethod
     def introduce_comment(gcode, comment: str):
         
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+G-code program parsing for BIOX G-Code Generator
+
+Turns generated or imported programs back into NumPy move arrays, so they
+can be simplified, checked and previewed like generated toolpaths.
+
+@author: Maria Teresa Alameda Felgueiras
+"""
+import re
+import numpy as np
+
+# Address letter followed by a number, e.g. "X-12.5" or "E.94"
+WORD_PATTERN = re.compile(r'([A-Z])\s*([-+]?(?:\d+\.?\d*|\.\d+))')
+
+# Words tracked for every move, modal ones keep their last value
+MOVE_WORDS = 'XYZEFIJ'
+
+
+def split_comment(line):
+    """Code and comment parts of one G-code line"""
+    code, _, comment = line.partition(';')
+    return code, comment
+
+def parse_moves(gcode):
+    """
+    Parse the G0/G1/G2/G3 moves of a program into arrays
+
+    Positions are modal: missing X/Y/Z keep the last value, missing F keeps
+    the last feedrate. X/Y/Z are absolute (G90) or, after G91 until the
+    next G90, relative to the previous position; the arrays always hold
+    absolute positions. Programs start at the origin.
+
+    Args:
+        gcode (str): Program text
+
+    Returns:
+        dict: One entry per move:
+              'line' (k,) zero-based line index in the program,
+              'code' (k,) G code (0-3),
+              'start', 'end' (k, 3) XYZ positions in mm,
+              'e' (k,) E word (0 when missing),
+              'f' (k,) F word on the line (NaN when missing),
+              'feed' (k,) modal feedrate in mm/min (NaN until set),
+              'center' (k, 2) arc centers (NaN for straight moves),
+              'xy' (k,) True when the line has an X or Y word,
+              'chained' (k,) True when only blank or comment lines separate
+              the move from the previous one,
+              'relative' (k,) True for moves in relative (G91) mode
+    """
+    lines, codes, chained, relative, rows = [], [], [], [], []
+    previous = -1
+    other = False
+    incremental = False
+
+    for index, line in enumerate(gcode.splitlines()):
+        code = split_comment(line)[0].upper()
+        words = WORD_PATTERN.findall(code)
+        if not words:
+            continue
+
+        letter, number = words[0]
+        if letter == 'G' and number in ('90', '91'):
+            incremental = number == '91'
+        if letter != 'G' or number not in ('0', '1', '2', '3', '00', '01', '02', '03'):
+            other = True
+            continue
+
+        values = dict(words[1:])
+        lines.append(index)
+        codes.append(int(number))
+        chained.append(previous >= 0 and not other)
+        relative.append(incremental)
+        rows.append([float(values[word]) if word in values else np.nan
+                     for word in MOVE_WORDS])
+        previous = index
+        other = False
+
+    rows = np.array(rows, dtype=float).reshape(-1, len(MOVE_WORDS))
+    x, y, z, e, f, i, j = rows.T
+
+    # Modal values: carry the last absolute word forward and add the
+    # relative steps taken since then
+    relative = np.array(relative, dtype=bool)
+    position = np.vstack([np.zeros((1, 3)), np.column_stack([x, y, z])])
+    steps = np.vstack([np.zeros((1, 3)), relative[:, None] * np.nan_to_num(position[1:])])
+    given = ~np.isnan(position)
+    given[1:] &= ~relative[:, None]
+
+    total = np.cumsum(steps, axis=0)
+    base = np.maximum.accumulate(np.where(given, np.arange(len(position))[:, None], 0), axis=0)
+    axes = np.arange(3)
+    end = (position[base, axes] + total - total[base, axes])[1:]
+    start = np.vstack([np.zeros((1, 3)), end[:-1]])
+
+    codes = np.array(codes, dtype=int)
+    arc = codes >= 2
+    center = np.full((len(codes), 2), np.nan)
+    center[arc] = start[arc, :2] + np.column_stack([np.nan_to_num(i[arc]),
+                                                    np.nan_to_num(j[arc])])
+
+    return {
+        'line': np.array(lines, dtype=int),
+        'code': codes,
+        'start': start,
+        'end': end,
+        'e': np.nan_to_num(e),
+        'f': f,
+        'feed': _forward_fill(f[:, None])[:, 0],
+        'center': center,
+        'xy': ~np.isnan(x) | ~np.isnan(y),
+        'chained': np.array(chained, dtype=bool),
+        'relative': relative
+    }
+
+def _forward_fill(values):
+    """Replace NaN by the last valid value above it, column by column"""
+    rows = np.where(np.isnan(values), 0, np.arange(len(values))[:, None])
+    rows = np.maximum.accumulate(rows, axis=0)
+    return values[rows, np.arange(values.shape[1])]
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+Vectorized 2D geometry helpers for BIOX G-Code Generator toolpaths
+
+Toolpaths are handled as (n, 2, 2) arrays of segment start/end points.
+
+@author: Maria Teresa Alameda Felgueiras
+"""
+import numpy as np
+
+# Upper bound of segment-edge pairs evaluated at once when clipping polygons
+CLIP_CHUNK_PAIRS = 2_000_000
+
+# Marching squares: (start edge, end edge) contour pieces of every cell case.
+# Corners 0-3 are (i, j), (i + 1, j), (i + 1, j + 1), (i, j + 1); edge k joins
+# corner k and corner k + 1. Pieces keep the inside (field > level) on their
+# left. Saddles (5, 10) have a second entry for an inside cell center.
+MARCHING_PIECES = {
+    1: [(0, 3)], 2: [(1, 0)], 3: [(1, 3)], 4: [(2, 1)], 5: [(0, 3), (2, 1)],
+    6: [(2, 0)], 7: [(2, 3)], 8: [(3, 2)], 9: [(0, 2)], 10: [(1, 0), (3, 2)],
+    11: [(1, 2)], 12: [(3, 1)], 13: [(0, 1)], 14: [(3, 0)]
+}
+MARCHING_SADDLES = {5: [(0, 1), (2, 3)], 10: [(3, 0), (1, 2)]}
+
+
+def clip_segments_to_rectangle(segments, bounds):
+    """
+    Clip all segments against an axis-aligned rectangle (Liang-Barsky)
+
+    Args:
+        segments (ndarray): (n, 2, 2) segment start/end points
+        bounds (tuple): (x_min, x_max, y_min, y_max) in mm
+
+    Returns:
+        ndarray: (k, 2, 2) clipped segments, fully outside ones removed,
+                 in their original order
+    """
+    segments = np.asarray(segments, dtype=float).reshape(-1, 2, 2)
+    x_min, x_max, y_min, y_max = bounds
+
+    start = segments[:, 0]
+    delta = segments[:, 1] - start
+
+    # Liang-Barsky edge terms, one column per rectangle side
+    p = np.column_stack([-delta[:, 0], delta[:, 0], -delta[:, 1], delta[:, 1]])
+    q = np.column_stack([start[:, 0] - x_min, x_max - start[:, 0],
+                         start[:, 1] - y_min, y_max - start[:, 1]])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = q / p
+
+    t0 = np.maximum(np.where(p < 0, r, -np.inf).max(axis=1), 0.)
+    t1 = np.minimum(np.where(p > 0, r, np.inf).min(axis=1), 1.)
+
+    outside = ((p == 0) & (q < 0)).any(axis=1)
+    keep = ~outside & (t0 < t1)
+
+    start = start[keep]
+    delta = delta[keep]
+
+    return np.stack([start + t0[keep, None] * delta,
+                     start + t1[keep, None] * delta], axis=1)
+
+def polygon_edges(polygon):
+    """
+    Edge start points and vectors of one outline or a list of outlines
+
+    Outlines are closed implicitly. Several outlines (e.g. a part with
+    holes) are combined with the even-odd rule.
+
+    Returns:
+        ndarray: (m, 2) edge start points
+        ndarray: (m, 2) edge vectors
+    """
+    if isinstance(polygon, np.ndarray) and polygon.ndim == 2:
+        polygon = [polygon]
+
+    starts = np.concatenate([np.asarray(ring, dtype=float) for ring in polygon])
+    ends = np.concatenate([np.roll(np.asarray(ring, dtype=float), -1, axis=0)
+                           for ring in polygon])
+
+    return starts, ends - starts
+
+def points_in_polygon(points, polygon):
+    """
+    Even-odd point containment test for many points at once
+
+    Args:
+        points (ndarray): (k, 2) points
+        polygon: (m, 2) outline or list of outlines
+
+    Returns:
+        ndarray: (k,) boolean mask of points inside
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    starts, vectors = polygon_edges(polygon)
+    inside = np.zeros(len(points), dtype=bool)
+
+    chunk = max(CLIP_CHUNK_PAIRS // max(len(starts), 1), 1)
+    for begin in range(0, len(points), chunk):
+        x = points[begin:begin + chunk, 0, None]
+        y = points[begin:begin + chunk, 1, None]
+
+        straddles = (starts[:, 1] > y) != (starts[:, 1] + vectors[:, 1] > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = starts[:, 0] + (y - starts[:, 1]) * vectors[:, 0] / vectors[:, 1]
+
+        inside[begin:begin + chunk] = (straddles & (x < x_cross)).sum(axis=1) % 2 == 1
+
+    return inside
+
+def clip_segments_to_polygon(segments, polygon):
+    """
+    Clip all segments against an arbitrary outline (even-odd rule)
+
+    Every segment is intersected with every outline edge in one batch, the
+    crossing parameters are sorted along the segment and each resulting
+    piece is kept when its midpoint lies inside. Concave outlines and holes
+    may split one segment into several pieces.
+
+    Args:
+        segments (ndarray): (n, 2, 2) segment start/end points
+        polygon: (m, 2) outline or list of outlines
+
+    Returns:
+        ndarray: (k, 2, 2) pieces inside the outline, in print order
+    """
+    segments = np.asarray(segments, dtype=float).reshape(-1, 2, 2)
+    starts, vectors = polygon_edges(polygon)
+    pieces = []
+
+    chunk = max(CLIP_CHUNK_PAIRS // max(len(starts), 1), 1)
+    for begin in range(0, len(segments), chunk):
+        start = segments[begin:begin + chunk, 0]
+        delta = segments[begin:begin + chunk, 1] - start
+
+        # Solve start + t * delta = edge_start + u * edge_vector for all pairs
+        offset = starts[None, :, :] - start[:, None, :]
+        denominator = (delta[:, None, 0] * vectors[None, :, 1]
+                       - delta[:, None, 1] * vectors[None, :, 0])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = (offset[..., 0] * vectors[None, :, 1]
+                 - offset[..., 1] * vectors[None, :, 0]) / denominator
+            u = (offset[..., 0] * delta[:, None, 1]
+                 - offset[..., 1] * delta[:, None, 0]) / denominator
+
+        crossing = (denominator != 0) & (u >= 0) & (u < 1) & (t > 0) & (t < 1)
+        t = np.where(crossing, t, np.nan)
+
+        # Sorted split parameters per segment, NaN (no crossing) sorts last
+        t = np.sort(np.concatenate([np.zeros((len(t), 1)), t,
+                                    np.ones((len(t), 1))], axis=1), axis=1)
+        t = np.where(np.isnan(t), 1., t)
+
+        t_start = t[:, :-1]
+        t_end = t[:, 1:]
+        rows, columns = np.nonzero(t_end - t_start > 1e-9)
+        t_start = t_start[rows, columns]
+        t_end = t_end[rows, columns]
+
+        middle = start[rows] + (t_start + t_end)[:, None] / 2 * delta[rows]
+        inside = points_in_polygon(middle, polygon)
+
+        rows = rows[inside]
+        pieces.append(np.stack([start[rows] + t_start[inside, None] * delta[rows],
+                                start[rows] + t_end[inside, None] * delta[rows]],
+                               axis=1))
+
+    return np.concatenate(pieces) if pieces else np.empty((0, 2, 2))
+
+def scanline_intervals(offsets, polygon):
+    """
+    Inside intervals of the lines x = offset, for many lines at once
+
+    Every line is crossed with every outline edge in one batch (half-open
+    rule, so vertices are counted once); the sorted crossings of a line
+    pair up into inside intervals (even-odd rule). Cheaper than general
+    segment clipping for the parallel lines of an infill.
+
+    Args:
+        offsets (ndarray): (k,) line positions along X
+        polygon: (m, 2) outline or list of outlines
+
+    Returns:
+        ndarray: (n,) index of the line of every interval, in line order
+        ndarray: (n, 2) interval (y_start, y_end), increasing along a line
+    """
+    offsets = np.asarray(offsets, dtype=float)
+    starts, vectors = polygon_edges(polygon)
+    lines, intervals = [], []
+
+    chunk = max(CLIP_CHUNK_PAIRS // max(len(starts), 1), 1)
+    for begin in range(0, len(offsets), chunk):
+        x = offsets[begin:begin + chunk, None]
+
+        straddles = (starts[:, 0] > x) != (starts[:, 0] + vectors[:, 0] > x)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            y = starts[:, 1] + (x - starts[:, 0]) * vectors[:, 1] / vectors[:, 0]
+        y = np.sort(np.where(straddles, y, np.nan), axis=1)
+
+        # Crossings 0-1, 2-3, ... of every line bound the inside intervals
+        counts = straddles.sum(axis=1)
+        pairs = np.arange(y.shape[1] // 2)
+        rows, pairs = np.nonzero(2 * pairs[None, :] + 1 < counts[:, None])
+        columns = 2 * pairs
+        bounds = np.column_stack([y[rows, columns], y[rows, columns + 1]])
+
+        keep = bounds[:, 1] - bounds[:, 0] > 1e-9
+        lines.append(rows[keep] + begin)
+        intervals.append(bounds[keep])
+
+    if not lines:
+        return np.empty(0, dtype=int), np.empty((0, 2))
+
+    return np.concatenate(lines), np.concatenate(intervals)
+
+def contour_segments(field, x, y, level=0.):
+    """
+    Contour lines of a sampled 2D field (vectorized marching squares)
+
+    All cells are classified at once and every contour crossing is
+    interpolated once per grid edge, so neighbouring cells share their
+    points exactly. The pieces are joined into polylines (see chain_order).
+
+    Args:
+        field (ndarray): (k, m) values at the grid points (x[i], y[j])
+        x (ndarray): (k,) increasing grid coordinates along X
+        y (ndarray): (m,) increasing grid coordinates along Y
+        level (float): Contour level
+
+    Returns:
+        ndarray: (n, 2, 2) contour segments, each polyline contiguous and
+                 walked with the inside (field > level) on its left
+    """
+    field = np.asarray(field, dtype=float)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    k, m = field.shape
+    inside = field > level
+
+    # Crossing point of every horizontal (along X) and vertical grid edge
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (level - field[:-1]) / (field[1:] - field[:-1])
+        horizontal = np.stack([x[:-1, None] + t * np.diff(x)[:, None],
+                               np.broadcast_to(y, t.shape)], axis=-1)
+        t = (level - field[:, :-1]) / (field[:, 1:] - field[:, :-1])
+        vertical = np.stack([np.broadcast_to(x[:, None], t.shape),
+                             y[None, :-1] + t * np.diff(y)[None, :]], axis=-1)
+    points = np.concatenate([horizontal.reshape(-1, 2), vertical.reshape(-1, 2)])
+
+    # Edge ids of every cell: bottom, right, top, left
+    i, j = np.meshgrid(np.arange(k - 1), np.arange(m - 1), indexing='ij')
+    offset = (k - 1) * m
+    edges = np.stack([i * m + j, offset + (i + 1) * (m - 1) + j,
+                      i * m + j + 1, offset + i * (m - 1) + j], axis=-1).reshape(-1, 4)
+
+    cases = (inside[:-1, :-1] * 1 + inside[1:, :-1] * 2
+             + inside[1:, 1:] * 4 + inside[:-1, 1:] * 8).ravel()
+    center = (field[:-1, :-1] + field[1:, :-1] + field[1:, 1:] + field[:-1, 1:]).ravel() / 4 > level
+
+    starts, ends, cells = [], [], []
+    for case, pieces in MARCHING_PIECES.items():
+        selected = cases == case
+        if case in MARCHING_SADDLES:
+            for flag, variant in ((False, pieces), (True, MARCHING_SADDLES[case])):
+                found = np.flatnonzero(selected & (center == flag))
+                for start, end in variant:
+                    starts.append(edges[found, start])
+                    ends.append(edges[found, end])
+                    cells.append(found)
+            continue
+        found = np.flatnonzero(selected)
+        for start, end in pieces:
+            starts.append(edges[found, start])
+            ends.append(edges[found, end])
+            cells.append(found)
+
+    if not starts:
+        return np.empty((0, 2, 2))
+
+    # Cell order first, so polylines are found (and printed) row by row
+    cells = np.concatenate(cells)
+    order = np.argsort(cells, kind='stable')
+    starts = np.concatenate(starts)[order]
+    ends = np.concatenate(ends)[order]
+
+    order = chain_order(starts, ends)
+    return np.stack([points[starts[order]], points[ends[order]]], axis=1)
+
+def chain_order(starts, ends):
+    """
+    Order of pieces that joins them into chains (pointer jumping)
+
+    A piece is followed by the piece starting where it ends. Every key may
+    start and end at most one piece each. Closed loops are opened at their
+    first piece; chains are returned in the order of their first piece.
+
+    Args:
+        starts (ndarray): (n,) integer key of the start of every piece
+        ends (ndarray): (n,) integer key of the end of every piece
+
+    Returns:
+        ndarray: (n,) piece indices, every chain contiguous and in order
+    """
+    starts = np.asarray(starts)
+    ends = np.asarray(ends)
+    count = len(starts)
+    index = np.arange(count)
+    if count == 0:
+        return index
+
+    # Successor of every piece, -1 at the end of a chain
+    by_start = np.argsort(starts, kind='stable')
+    slot = np.minimum(np.searchsorted(starts[by_start], ends), count - 1)
+    following = np.where(starts[by_start[slot]] == ends, by_start[slot], -1)
+    following[following == index] = -1
+
+    passes = int(np.ceil(np.log2(count))) + 1
+
+    # Smallest piece reachable from every piece, loops reach themselves
+    jump = np.where(following >= 0, following, index)
+    lowest = index.copy()
+    for _ in range(passes):
+        lowest = np.minimum(lowest, lowest[jump])
+        jump = jump[jump]
+
+    # Open every loop before its smallest piece
+    loop_heads = np.flatnonzero((following[jump] >= 0) & (lowest == index))
+    previous = np.full(count, -1)
+    linked = following >= 0
+    previous[following[linked]] = index[linked]
+    following[previous[loop_heads]] = -1
+
+    # Distance of every piece to the end of its chain (list ranking)
+    jump = np.where(following >= 0, following, index)
+    distance = (following >= 0).astype(int)
+    for _ in range(passes):
+        distance = distance + distance[jump]
+        jump = jump[jump]
+
+    # Chains are keyed by their first piece, found through their last one
+    first = np.zeros(count, dtype=int)
+    heads = np.ones(count, dtype=bool)
+    heads[following[following >= 0]] = False
+    first[jump[heads]] = index[heads]
+
+    return np.lexsort((-distance, first[jump]))
+
+def clip_segments(segments, boundary):
+    """
+    Clip segments against a rectangle or an arbitrary outline
+
+    Args:
+        segments (ndarray): (n, 2, 2) segment start/end points
+        boundary: (x_min, x_max, y_min, y_max) rectangle, clipped with
+                  Liang-Barsky, or (m, 2) outline / list of outlines
+
+    Returns:
+        ndarray: (k, 2, 2) clipped segments in print order
+    """
+    if not isinstance(boundary, list) and np.ndim(boundary) == 1:
+        return clip_segments_to_rectangle(segments, boundary)
+
+    return clip_segments_to_polygon(segments, boundary)
+
+def rotation_matrix(angle):
+    """2D rotation matrix for an angle in degrees"""
+    angle = np.radians(angle)
+    return np.array([[np.cos(angle), -np.sin(angle)],
+                     [np.sin(angle), np.cos(angle)]])
+
+def boundary_vertices(boundary):
+    """Vertices of a (x_min, x_max, y_min, y_max) rectangle or of outlines"""
+    if not isinstance(boundary, list) and np.ndim(boundary) == 1:
+        x_min, x_max, y_min, y_max = boundary
+        return np.array([[x_min, y_min], [x_max, y_min],
+                         [x_max, y_max], [x_min, y_max]], dtype=float)
+
+    return polygon_edges(boundary)[0]
+
+def signed_area(ring):
+    """Shoelace signed area of an outline, positive when counterclockwise"""
+    ring = np.asarray(ring, dtype=float)
+    x, y = ring[:, 0], ring[:, 1]
+    return 0.5 * (np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+
+def offset_polygon(ring, distances, miter_limit=4.):
+    """
+    Offset one closed outline by several distances at once (mitered corners)
+
+    Every vertex moves along the bisector of its two edge normals, scaled so
+    both edges end up exactly 'distance' away. Corners sharper than
+    'miter_limit' times the distance are limited to that length.
+
+    Args:
+        ring (ndarray): (m, 2) outline vertices
+        distances (array-like): (k,) offsets in mm, positive to the left of
+                                the walking direction (inwards when the
+                                outline is counterclockwise)
+
+    Returns:
+        ndarray: (k, m, 2) offset outlines
+    """
+    ring = np.asarray(ring, dtype=float)
+    distances = np.atleast_1d(np.asarray(distances, dtype=float))
+
+    # Drop repeated vertices, their edges have no normal
+    ring = ring[np.hypot(*(np.roll(ring, -1, axis=0) - ring).T) > 1e-12]
+
+    edges = np.roll(ring, -1, axis=0) - ring
+    normals = np.column_stack([-edges[:, 1], edges[:, 0]])
+    normals /= np.hypot(normals[:, 0], normals[:, 1])[:, None]
+
+    # Vertex i joins edge i - 1 and edge i
+    previous = np.roll(normals, 1, axis=0)
+    cosine = np.einsum('ij,ij->i', previous, normals)
+    miter = (previous + normals) / np.maximum(1 + cosine, 2 / miter_limit ** 2)[:, None]
+
+    return ring[None] + distances[:, None, None] * miter[None]
+
+def reverse_segments(segments):
+    """Reverse the print order and direction of a segment sequence"""
+    return np.asarray(segments)[::-1, ::-1]
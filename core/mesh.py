@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+STL meshes for BIOX G-Code Generator scaffolds
+
+Meshes are read into (n, 3, 3) triangle arrays and sliced into layer
+outlines, which replace the rectangular scaffold perimeter. All
+plane-triangle intersections are computed in vectorized batches.
+
+@author: Maria Teresa Alameda Felgueiras
+"""
+import os
+import re
+import numpy as np
+from .geometry import chain_order
+
+# Binary STL: 80-byte header, uint32 triangle count, then 50-byte records
+STL_RECORD = np.dtype([('normal', '<f4', (3,)),
+                       ('vertices', '<f4', (3, 3)),
+                       ('attribute', '<u2')])
+
+# ASCII STL vertex line, e.g. "vertex 1.0 -2.5e-1 3"
+STL_VERTEX_PATTERN = re.compile(rb'vertex\s+(\S+)\s+(\S+)\s+(\S+)')
+
+# Upper bound of triangle-layer pairs intersected at once
+SLICE_CHUNK_PAIRS = 1_000_000
+
+
+def read_stl(path):
+    """
+    Triangles of a binary (or ASCII) STL file
+
+    Returns:
+        ndarray: (n, 3, 3) vertex coordinates of every triangle in mm
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as file:
+        header = file.read(84)
+
+    if len(header) == 84:
+        count = int(np.frombuffer(header[80:], dtype='<u4')[0])
+        if size == 84 + STL_RECORD.itemsize * count:
+            records = np.fromfile(path, dtype=STL_RECORD, count=count, offset=84)
+            return records['vertices'].astype(float)
+
+    if header.lstrip().startswith(b'solid'):
+        with open(path, 'rb') as file:
+            vertices = STL_VERTEX_PATTERN.findall(file.read())
+        if vertices and len(vertices) % 3 == 0:
+            return np.array(vertices, dtype=float).reshape(-1, 3, 3)
+
+    raise ValueError(f"{os.path.basename(path)} is not a valid STL file")
+
+def place_mesh(triangles, center=(0., 0.)):
+    """Move a mesh onto the bed (lowest point at Z = 0) centered at 'center'"""
+    triangles = np.asarray(triangles, dtype=float)
+    points = triangles.reshape(-1, 3)
+    low, high = points.min(axis=0), points.max(axis=0)
+
+    shift = np.array([center[0] - (low[0] + high[0]) / 2,
+                      center[1] - (low[1] + high[1]) / 2, -low[2]])
+    return triangles + shift
+
+def slice_mesh(triangles, heights):
+    """
+    Closed outlines of a mesh at several heights
+
+    Every triangle is paired with the heights it spans (half-open, so a
+    vertex on a plane counts below it) and all pairs are intersected in
+    batches. Crossing points are computed per shared mesh edge, so the
+    pieces of neighbouring triangles meet exactly and are joined into
+    rings with chain_order. Pieces keep the material on their left (from
+    the outward triangle normals): outer rings run counterclockwise, holes
+    clockwise.
+
+    Args:
+        triangles (ndarray): (n, 3, 3) triangles of a closed mesh
+        heights (array-like): (k,) increasing slice heights in mm
+
+    Returns:
+        list: One list of (m, 2) rings per height, empty above or below
+              the mesh
+    """
+    triangles = np.asarray(triangles, dtype=float)
+    heights = np.asarray(heights, dtype=float)
+    outlines = [[] for _ in heights]
+    if len(triangles) == 0 or len(heights) == 0:
+        return outlines
+
+    # Shared vertices and edges: neighbouring triangles cut them identically
+    vertices, corners = np.unique(triangles.reshape(-1, 3), axis=0, return_inverse=True)
+    corners = corners.reshape(-1, 3)
+    sides = np.sort(np.stack([corners, np.roll(corners, -1, axis=1)], axis=-1), axis=-1)
+    edge_pairs, edges = np.unique(sides.reshape(-1, 2), axis=0, return_inverse=True)
+    edges = edges.reshape(-1, 3)
+
+    # Direction of the cut of every triangle with material on the left
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    directions = np.column_stack([-normals[:, 1], normals[:, 0]])
+
+    # Heights spanned by every triangle: z_min <= height < z_max
+    z = vertices[corners, 2]
+    first = np.searchsorted(heights, z.min(axis=1), side='left')
+    counts = np.maximum(np.searchsorted(heights, z.max(axis=1), side='left') - first, 0)
+    totals = np.cumsum(counts)
+
+    starts, ends, pieces, layers = [], [], [], []
+    begin = 0
+    while begin < len(triangles):
+        # Whole triangles per batch, about SLICE_CHUNK_PAIRS pairs
+        done = totals[begin - 1] if begin else 0
+        stop = max(int(np.searchsorted(totals, done + SLICE_CHUNK_PAIRS, side='right')), begin + 1)
+        batch = np.arange(begin, stop)
+        begin = stop
+
+        spans = counts[batch]
+        owner = np.repeat(batch, spans)
+        if len(owner) == 0:
+            continue
+        layer = first[owner] + np.arange(len(owner)) - np.repeat(np.cumsum(spans) - spans, spans)
+        height = heights[layer]
+
+        # Exactly two triangle sides cross the plane
+        above = z[owner] > height[:, None]
+        rows, columns = np.nonzero(above != np.roll(above, -1, axis=1))
+        crossed = edges[owner][rows, columns].reshape(-1, 2)
+
+        low, high = edge_pairs[crossed, 0], edge_pairs[crossed, 1]
+        z_low, z_high = vertices[low, 2], vertices[high, 2]
+        t = (height[:, None] - z_low) / (z_high - z_low)
+        points = vertices[low, :2] + t[..., None] * (vertices[high, :2] - vertices[low, :2])
+
+        # Orient every piece along its triangle's cut direction
+        forward = np.einsum('ij,ij->i', points[:, 1] - points[:, 0], directions[owner]) >= 0
+        crossed = np.where(forward[:, None], crossed, crossed[:, ::-1])
+        keys = layer[:, None].astype(np.int64) * len(edge_pairs) + crossed
+
+        starts.append(keys[:, 0])
+        ends.append(keys[:, 1])
+        pieces.append(np.where(forward[:, None], points[:, 0], points[:, 1]))
+        layers.append(layer)
+
+    if not starts:
+        return outlines
+
+    keys, ends = np.concatenate(starts), np.concatenate(ends)
+    points, layers = np.concatenate(pieces), np.concatenate(layers)
+
+    # Rings: joined pieces, split where a piece does not follow the previous one
+    order = chain_order(keys, ends)
+    keys, ends, points, layers = keys[order], ends[order], points[order], layers[order]
+    breaks = np.flatnonzero(ends[:-1] != keys[1:]) + 1
+
+    for ring, layer in zip(np.split(points, breaks),
+                           layers[np.concatenate([[0], breaks])].tolist()):
+        # Planes through vertices leave repeated points
+        repeated = np.all(np.abs(ring - np.roll(ring, 1, axis=0)) < 1e-9, axis=1)
+        ring = ring[~repeated]
+        if len(ring) >= 3:
+            outlines[layer].append(ring)
+
+    return outlines
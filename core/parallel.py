@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Layer-parallel scaffold generation for BIOX G-Code Generator
+
+Scaffold layers do not depend on each other, so tall or finely filled
+parts are generated in a process pool. Every worker writes the text of a
+contiguous run of layers to a temporary file; the files are joined in
+layer order, so the program is identical to the serial one.
+
+@author: Maria Teresa Alameda Felgueiras
+"""
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from .gcode import GCODE
+
+# Fewer layers are generated in the calling process, starting workers costs more
+PARALLEL_MIN_LAYERS = 8
+
+# Layer runs per worker, several smooth out layers of uneven cost
+PARALLEL_CHUNKS_PER_WORKER = 2
+
+
+def generate_layers(gcode, settings, layers, workers=None, stats=None):
+    """
+    Append scaffold layers 0 .. layers - 1 to a program
+
+    Args:
+        gcode (str): Program so far
+        settings (dict): Scaffold settings, see GCODE.generate_scaffold_layer;
+                         sent to the workers, so they must pickle
+        layers (int): Number of layers
+        workers (int): Worker processes (default: one per CPU), 1 generates
+                       in the calling process
+        stats (dict): Running arc fitting and simplification counts, the
+                      counts of all workers are added to it
+
+    Returns:
+        str: Program with all layers appended
+    """
+    workers = min(workers or os.cpu_count() or 1, layers)
+    if workers <= 1 or layers < PARALLEL_MIN_LAYERS:
+        for layer in range(layers):
+            gcode = GCODE.generate_scaffold_layer(gcode, layer, settings, stats)
+        return gcode
+
+    chunks = min(workers * PARALLEL_CHUNKS_PER_WORKER, layers)
+    bounds = [layers * index // chunks for index in range(chunks + 1)]
+
+    folder = tempfile.mkdtemp(prefix='biox_layers_')
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_generate_chunk, settings, first, stop,
+                                   os.path.join(folder, f"layers_{first:06d}.gcode"))
+                       for first, stop in zip(bounds[:-1], bounds[1:])]
+            results = [future.result() for future in futures]
+
+        parts = [gcode]
+        for path, chunk_stats in results:
+            with open(path, encoding='utf-8') as file:
+                parts.append(file.read())
+            if stats is not None:
+                for key, value in chunk_stats.items():
+                    stats[key] = stats.get(key, 0) + value
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    return "".join(parts)
+
+def _generate_chunk(settings, first, stop, path):
+    """Worker: write layers first .. stop - 1 to 'path', return it and the counts"""
+    stats = {}
+    gcode = ""
+    for layer in range(first, stop):
+        gcode = GCODE.generate_scaffold_layer(gcode, layer, settings, stats)
+
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(gcode)
+
+    return path, stats
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Plate replication for BIOX G-Code Generator scaffolds
+
+A scaffold program is built once, converted to relative (G91) moves and
+stamped into every well of a plate template: per well only the absolute
+move to the well centre is written, so the cost hardly grows with the
+number of wells.
+
+@author: Maria Teresa Alameda Felgueiras
+"""
+import numpy as np
+from .gcode_parser import WORD_PATTERN, parse_moves, split_comment
+
+
+def well_centers(properties):
+    """
+    Centres of all wells of a plate template, row by row
+
+    The first well is at the origin, as for droplet printing.
+
+    Returns:
+        ndarray: (rows * cols, 2) well centres in mm
+        ndarray: (rows * cols, 2) (row, col) index of every well
+    """
+    rows, cols = properties['rows'], properties['cols']
+    index = np.stack(np.meshgrid(np.arange(rows), np.arange(cols), indexing='ij'),
+                     axis=-1).reshape(-1, 2)
+    centers = index[:, ::-1] * np.array([properties['well_spacing_x'],
+                                         properties['well_spacing_y']], dtype=float)
+    return centers, index
+
+def travel_cost(centers, order, shift=(0., 0.), start=(0., 0.)):
+    """
+    Travel length in mm of visiting the wells in 'order' from 'start'
+
+    Every well is entered at its centre and left at its centre + 'shift'
+    (where the stamped program ends).
+    """
+    points = np.asarray(centers, dtype=float)[order]
+    exits = np.vstack([np.reshape(np.asarray(start, dtype=float), (1, 2)),
+                       points[:-1] + np.asarray(shift, dtype=float)])
+    return float(np.hypot(*(points - exits).T).sum())
+
+def plate_order(centers, index, shift=(0., 0.), start=(0., 0.)):
+    """
+    Well visiting order with a short travel path
+
+    Candidates are the serpentine orders along rows and along columns (both
+    directions) and a nearest-neighbour tour from the well closest to 'start' (vectorized
+    distance per step); the shortest one by travel_cost is returned. Any
+    subset of the wells of a plate can be ordered.
+
+    Args:
+        centers (ndarray): (n, 2) well centres in mm
+        index (ndarray): (n, 2) (row, col) of every well
+        shift (tuple): Program end relative to the well centre
+        start (tuple): Position the tour starts from
+
+    Returns:
+        ndarray: (n,) well indices in visiting order
+    """
+    centers = np.asarray(centers, dtype=float)
+    shift = np.asarray(shift, dtype=float)
+    # Dense row and column ranks, so subsets of a plate alternate too
+    rows = np.unique(index[:, 0], return_inverse=True)[1].ravel()
+    cols = np.unique(index[:, 1], return_inverse=True)[1].ravel()
+
+    # Serpentine: every other row (column) is walked backwards
+    along_rows = np.lexsort((np.where(rows % 2 == 1, -cols, cols), rows))
+    along_cols = np.lexsort((np.where(cols % 2 == 1, -rows, rows), cols))
+
+    greedy = np.empty(len(centers), dtype=int)
+    visited = np.zeros(len(centers), dtype=bool)
+    current = int(np.argmin(np.hypot(*(centers - np.asarray(start, dtype=float)).T)))
+    for step in range(len(centers)):
+        greedy[step] = current
+        visited[current] = True
+        if step + 1 < len(centers):
+            distance = np.hypot(*(centers - centers[current] - shift).T)
+            current = int(np.argmin(np.where(visited, np.inf, distance)))
+
+    # Serpentines are also walked backwards when that starts closer to 'start'
+    candidates = [along_rows, along_cols, greedy, along_rows[::-1], along_cols[::-1]]
+    costs = [travel_cost(centers, order, shift, start) for order in candidates]
+    return candidates[int(np.argmin(costs))]
+
+def relative_program(gcode, start, linear=None):
+    """
+    Rewrite an absolute program as relative (G91) moves
+
+    X/Y/Z words become steps from the previous position, exact in
+    micrometres so the stamped copies do not drift. I/J arc offsets are
+    relative already; all other lines and the comments stay as they are.
+    A 'linear' transform (e.g. of a plate calibration) is applied to the
+    XY steps and the I/J offsets; moves along X or Y then get both words.
+
+    Args:
+        gcode (str): Program with absolute moves
+        start (tuple): (x, y, z) position the program starts from
+        linear (ndarray): (2, 2) transform of the XY plane, None for none
+
+    Returns:
+        str: Program text for relative positioning
+        ndarray: (3,) position where the program ends, relative to 'start'
+    """
+    head = "G1 X{:.3f} Y{:.3f} Z{:.3f}\n".format(*start)
+    moves = parse_moves(head + gcode)
+
+    ends = moves['end'].copy()
+    if linear is not None:
+        ends[:, :2] = ends[:, :2] @ np.asarray(linear, dtype=float).T
+
+    # Steps between the rounded positions of consecutive moves
+    microns = np.round(ends * 1000).astype(np.int64)
+    steps = np.diff(microns, axis=0) / 1000
+
+    lines = gcode.splitlines(keepends=True)
+    for move, line in enumerate(moves['line'][1:].tolist()):
+        code, comment = split_comment(lines[line - 1])
+        step = dict(zip('XYZ', steps[move].tolist()))
+        if linear is not None:
+            code = transform_words(code, step, linear)
+        code = WORD_PATTERN.sub(lambda word: (f"{word.group(1)}{step[word.group(1)]:.3f}"
+                                              if word.group(1) in step else word.group(0)),
+                                code)
+        lines[line - 1] = code + (';' + comment if comment else '')
+
+    return "".join(lines), (microns[-1] - microns[0]) / 1000
+
+def transform_words(code, step, linear):
+    """
+    Words of a line of a transformed program: I/J offsets transformed, and
+    the missing word of an X/Y (I/J) pair written next to the other one
+    """
+    words = dict(WORD_PATTERN.findall(code))
+    values = {'X': step['X'], 'Y': step['Y']}
+    if 'I' in words or 'J' in words:
+        values['I'], values['J'] = (np.asarray(linear, dtype=float)
+                                    @ [float(words.get('I', 0)), float(words.get('J', 0))]).tolist()
+
+    for pair in ('XY', 'IJ'):
+        present = [letter for letter in pair if letter in words]
+        if not present or present == ['X', 'Y']:
+            continue
+        code = WORD_PATTERN.sub(
+            lambda word: (word.group(0) if word.group(1) not in present
+                          else " ".join(f"{letter}{values[letter]:.3f}"
+                                        for letter in (pair if len(present) == 1
+                                                       else word.group(1)))),
+            code)
+    return code
+
+def replicate_in_wells(gcode, centers, index, order, travel_height, speed=3000):
+    """
+    Stamp one relative program at every well centre
+
+    Args:
+        gcode (str): Relative program (see relative_program) starting at
+                     the well centre at 'travel_height'
+        centers (ndarray): (n, 2) well centres in mm
+        index (ndarray): (n, 2) (row, col) of every well
+        order (ndarray): Well visiting order
+        travel_height (float): Z in mm for moves between wells
+        speed (float): Travel speed in mm/min
+
+    Returns:
+        str: Program printing all wells
+    """
+    speed = float(speed)
+    raise_head = (f"G1 Z{travel_height:.2f} F{speed} ; Move to Z{travel_height:.2f}"
+                  f" with speed {speed} mm/min\nM400 ; wait for queued moves to finish\n\n")
+
+    blocks = []
+    for number, well in enumerate(order.tolist()):
+        (x, y), (row, col) = centers[well].tolist(), index[well].tolist()
+        blocks.append(
+            f"; Well ({row + 1}, {col + 1}), {number + 1} of {len(order)}\n"
+            "G90 ; use absolute coordinates\n" + raise_head
+            + f"G1 X{x:.3f} Y{y:.3f} F{speed} ; Move to X{x:.3f} Y{y:.3f}"
+            f" with speed {speed} mm/min well ({row + 1}, {col + 1})\n"
+            "M400 ; wait for queued moves to finish\n\n"
+            "G91 ; use relative coordinates, positions in comments are"
+            " relative to the well centre\n")
+        blocks.append(gcode)
+
+    blocks.append("G90 ; use absolute coordinates\n" + raise_head)
+    return "".join(blocks)
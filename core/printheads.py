@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Printhead command emitters for BIOX G-Code Generator
+
+Every printhead type declares its extrusion commands once in
+PRINTHEAD_COMMANDS; they are compiled here into emitters writing the blocks
+of many wells at once from arrays of pressures and extrusion times, with
+no branching per well. Formatted well blocks are kept in a small LRU cache,
+so wells sharing their parameters are formatted once.
+
+@author: Maria Teresa Alameda Felgueiras
+"""
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
+from ..utils.constants import PRINTHEAD_COMMANDS, DWELL_COMMANDS
+
+# Formatted well blocks kept between programs
+WELL_BLOCK_CACHE_SIZE = 256
+
+
+class BlockCache:
+    """
+    Least recently used cache of formatted G-code blocks
+
+    'hits' and 'misses' count the blocks served from the cache and the
+    blocks that had to be formatted.
+    """
+
+    def __init__(self, maxsize=WELL_BLOCK_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.blocks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Cached block of 'key' (marked as recently used), None when missing"""
+        block = self.blocks.get(key)
+        if block is not None:
+            self.blocks.move_to_end(key)
+        return block
+
+    def put(self, key, block):
+        """Keep a block, dropping the least recently used beyond 'maxsize'"""
+        self.blocks[key] = block
+        self.blocks.move_to_end(key)
+        while len(self.blocks) > self.maxsize:
+            self.blocks.popitem(last=False)
+
+    def counts(self):
+        """(hits, misses) so far"""
+        return self.hits, self.misses
+
+
+# Well blocks of the droplet programs
+WELL_BLOCKS = BlockCache()
+
+
+def split_dwell(times):
+    """
+    Whole seconds and milliseconds of dwell times
+
+    Returns:
+        ndarray: Seconds, truncated
+        ndarray: Remaining milliseconds, truncated
+        ndarray: Index of the DWELL_COMMANDS line of every time
+    """
+    times = np.asarray(times)
+    seconds = np.trunc(times).astype(int)
+    milliseconds = ((times - seconds) * 1000).astype(int)
+    variant = np.where(milliseconds == 0, 1, np.where(seconds == 0, 2, 0))
+    return seconds, milliseconds, variant
+
+@lru_cache(maxsize=None)
+def extrusion_emitter(printhead_type, command='extrusion'):
+    """
+    Compiled emitter of one command of a printhead type
+
+    The template is bound once; the emitter fills it for every well.
+    Values are written as given (floats as floats), like the single-well
+    GCODE methods.
+
+    Args:
+        printhead_type (str): Key of PRINTHEAD_COMMANDS
+        command (str): 'extrusion' or 'cycle'
+
+    Returns:
+        function: emit(printhead, pressures, times) returning the command
+                  text of every well
+    """
+    if printhead_type not in PRINTHEAD_COMMANDS:
+        raise ValueError(f"Unknown printhead type: {printhead_type}")
+    if command not in PRINTHEAD_COMMANDS[printhead_type]:
+        raise ValueError(f"{printhead_type} printheads have no {command} command")
+
+    template = PRINTHEAD_COMMANDS[printhead_type][command]
+    fill = template.format
+    waits = [line.format for line in DWELL_COMMANDS] if '{wait}' in template else None
+
+    def emit(printhead, pressures, times):
+        times = np.asarray(times)
+        pressures = np.broadcast_to(np.asarray(pressures), times.shape).tolist()
+        volumes = (10 * times.astype(float)).tolist()
+
+        if waits is None:
+            lines = [""] * len(volumes)
+        else:
+            seconds, milliseconds, variant = split_dwell(times)
+            lines = [waits[index](seconds=second, milliseconds=millisecond)
+                     for index, second, millisecond in zip(variant.tolist(), seconds.tolist(),
+                                                           milliseconds.tolist())]
+
+        return [fill(printhead=printhead, pressure=pressure, time=time, volume=volume,
+                     wait=line)
+                for pressure, time, volume, line in zip(pressures, times.tolist(),
+                                                        volumes, lines)]
+
+    return emit
+
+def bed_position(printhead_type, z):
+    """
+    Bed Z for extruding with a printhead type
+
+    Returns:
+        Z0 for contact printheads, 'z' (the layer height) for layer
+        printheads, None when the bed does not move
+    """
+    bed = PRINTHEAD_COMMANDS[printhead_type]['bed']
+    return {'contact': 0, 'layer': z}.get(bed)
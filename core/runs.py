@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Multi-plate runs for BIOX G-Code Generator
+
+A run prints several plates in sequence, on the same bed position or in
+the slots of a holder, every plate with its own parameters. The plate
+programs are generated one at a time and streamed to one file between
+plate markers, with an optional pause between plates, so the run is never
+held in memory as a whole. Every plate gets its own time estimate.
+
+@author: Maria Teresa Alameda Felgueiras
+"""
+from .estimator import estimate_print_time
+
+
+def plate_pause(pause):
+    """
+    Lines written between two plates
+
+    Args:
+        pause (str): "M0" stops until the operator resumes, a number waits
+                     that many seconds (G4), empty goes straight on
+
+    Returns:
+        str: Pause lines
+        float: Waiting time in seconds (an M0 stop is not counted)
+    """
+    pause = pause.strip()
+    if not pause:
+        return "", 0.
+    if pause.upper() == "M0":
+        return "M0 ; pause for the plate change, resume to print the next plate\n\n", 0.
+
+    seconds = float(pause)
+    if seconds < 0:
+        raise ValueError(f"Invalid pause between plates: {pause}")
+    return f"G4 S{seconds:g} ; wait {seconds:g} s before the next plate\n\n", seconds
+
+def stream_run(file, plates, generate, pause = "M0"):
+    """
+    Write the programs of several plates to one file, plate by plate
+
+    Every plate program is generated when it is written and only timed
+    afterwards, so at most one plate is in memory. A run summary with the
+    time of every plate closes the file.
+
+    Args:
+        file: Text file open for writing
+        plates (list): (label, parameters) of every plate in printing order
+        generate (callable): Program text of a plate from its parameters
+        pause (str): What happens between plates (see plate_pause)
+
+    Returns:
+        list: Per plate dicts with the 'label', number of 'lines' and the
+              'time' estimate (see estimate_print_time)
+        float: Estimated time of the run in seconds, pauses included
+    """
+    between, wait = plate_pause(pause)
+
+    summary = []
+    for number, (label, parameters) in enumerate(plates, 1):
+        program = generate(parameters)
+        if number > 1:
+            file.write(between)
+        file.write(f"; ===== Plate {number} of {len(plates)}: {label} =====\n")
+        file.write(program)
+        file.write(f"; ===== End of plate {number} of {len(plates)} =====\n\n")
+
+        summary.append({'label': label, 'lines': program.count("\n"),
+                        'time': estimate_print_time(program)})
+
+    total = sum(plate['time']['total'] for plate in summary) + wait * (len(summary) - 1)
+
+    file.write("; Run summary\n")
+    for number, plate in enumerate(summary, 1):
+        file.write(f"; Plate {number} ({plate['label']}): {plate['lines']} lines,"
+                   f" {plate['time']['total'] / 60:.1f} min\n")
+    file.write(f"; Total: {total / 60:.1f} min\n")
+
+    return summary, total
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Printhead scheduling for BIOX G-Code Generator
+
+Multi-material scaffolds print the perimeter and the infill of every layer
+with their own printheads (T0-T2). The scheduler orders the work of every
+layer per printhead so the loaded one keeps printing, and marks the jobs
+that need a tool change. Droplet plates with several bioinks are printed
+printhead by printhead, each group of wells in a short travel order.
+Temperature sweeps visit their setpoints monotonically, so the printhead
+settles once per setpoint.
+
+@author: Maria Teresa Alameda Felgueiras
+"""
+import numpy as np
+from .plate import plate_order
+
+# Scaffold regions in their default printing order
+SCAFFOLD_REGIONS = ('perimeter', 'infill')
+
+# Printheads of the BIOX
+PRINTHEADS = (0, 1, 2)
+
+
+def layer_jobs(perimeter_tools, infill_tools, layers):
+    """
+    Region and printhead jobs of every layer
+
+    Args:
+        perimeter_tools (list): Printheads of the perimeter, cycled layer by layer
+        infill_tools (list): Printheads of the infill, cycled layer by layer
+        layers (int): Number of layers
+
+    Returns:
+        list: One list of (region, printhead) jobs per layer
+    """
+    return [[('perimeter', perimeter_tools[layer % len(perimeter_tools)]),
+             ('infill', infill_tools[layer % len(infill_tools)])]
+            for layer in range(layers)]
+
+def schedule_tools(jobs, tool = None):
+    """
+    Order the jobs of every layer to change printheads as little as possible
+
+    Layers are printed in order. Inside a layer the jobs are grouped per
+    printhead, keeping their order within a group: the loaded printhead
+    prints first and a printhead the next (non-empty) layer uses prints
+    last, so it is still loaded when that layer starts. With k printheads
+    in a layer this takes k - 1 changes, or k when none is loaded.
+
+    Args:
+        jobs (list): One list of (region, printhead) jobs per layer
+        tool (int): Printhead loaded at the start, None for the first one used
+
+    Returns:
+        list: One list of (region, printhead, change) jobs per layer, where
+              'change' is True when the printhead is loaded for the job
+        int: Number of printhead changes
+    """
+    if tool is None:
+        tool = next((job[1] for layer in jobs for job in layer), None)
+
+    schedule = []
+    changes = 0
+    for index, layer in enumerate(jobs):
+        groups = {}
+        for region, printhead in layer:
+            groups.setdefault(printhead, []).append(region)
+
+        following = next((set(job[1] for job in later) for later in jobs[index + 1:] if later),
+                         set())
+        order = sorted(groups, key = lambda printhead: (printhead != tool,
+                                                        printhead in following))
+
+        scheduled = []
+        for printhead in order:
+            change = printhead != tool
+            for region in groups[printhead]:
+                scheduled.append((region, printhead, change))
+                change = False
+            changes += printhead != tool
+            tool = printhead
+        schedule.append(scheduled)
+
+    return schedule, changes
+
+def well_tools(tools, rows, cols, direction = 'row'):
+    """
+    Printhead of every well, 'tools' cycled like the sweeps
+
+    Args:
+        tools (list): Printheads cycled over the rows, columns or wells
+        rows, cols (int): Plate size
+        direction (str): 'row' (one printhead per row), 'column' or 'well'
+
+    Returns:
+        ndarray: (rows * cols,) printhead per well, row by row
+    """
+    row, col = np.divmod(np.arange(rows * cols), cols)
+    step = {'row': row, 'column': col}.get(direction, row * cols + col)
+    return np.asarray(tools, dtype=int)[step % len(tools)]
+
+def schedule_wells(centers, index, tools, tool = None):
+    """
+    Wells grouped per printhead, each group in a short travel order
+
+    The loaded printhead prints first, the others follow by number, so
+    every printhead is loaded once. Every group is ordered with
+    plate_order, starting where the previous group ended.
+
+    Args:
+        centers (ndarray): (n, 2) well centres in mm
+        index (ndarray): (n, 2) (row, col) of every well
+        tools (ndarray): (n,) printhead of every well
+        tool (int): Printhead loaded at the start
+
+    Returns:
+        list: (printhead, wells) groups in printing order, 'wells' the
+              well indices in visiting order
+    """
+    centers = np.asarray(centers, dtype=float)
+    tools = np.asarray(tools, dtype=int)
+
+    groups = []
+    start = np.zeros(2)
+    for printhead in sorted(np.unique(tools).tolist(), key = lambda value: (value != tool, value)):
+        wells = np.flatnonzero(tools == printhead)
+        wells = wells[plate_order(centers[wells], index[wells], start = start)]
+        groups.append((printhead, wells))
+        start = centers[wells[-1]]
+
+    return groups
+
+def schedule_setpoints(centers, index, wells, setpoints, start = (0., 0.)):
+    """
+    Wells reordered to visit their setpoints monotonically
+
+    Wells are grouped per setpoint, the groups sorted by rising setpoint
+    (warming up) and every group ordered with plate_order, starting where
+    the previous group ended.
+
+    Args:
+        centers (ndarray): (n, 2) well centres in mm
+        index (ndarray): (n, 2) (row, col) of every well
+        wells (ndarray): Indices of the wells to print
+        setpoints (ndarray): (n,) setpoint (e.g. temperature) of every well
+        start (tuple): Position the tour starts from
+
+    Returns:
+        ndarray: 'wells' in printing order
+    """
+    centers = np.asarray(centers, dtype=float)
+    wells = np.asarray(wells, dtype=int)
+    values = np.asarray(setpoints, dtype=float)[wells]
+
+    ordered = []
+    for value in np.unique(values):
+        group = wells[values == value]
+        group = group[plate_order(centers[group], index[group], start = start)]
+        ordered.append(group)
+        start = centers[group[-1]]
+
+    return np.concatenate(ordered) if ordered else wells
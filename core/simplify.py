@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Polyline simplification for BIOX G-Code Generator toolpaths
+
+Ramer-Douglas-Peucker without recursion: every pending range of every
+polyline is refined in the same vectorized pass, so the cost grows with
+the pending points per pass, not with Python calls per point.
+
+@author: Maria Teresa Alameda Felgueiras
+"""
+import re
+import numpy as np
+from .gcode_parser import parse_moves, split_comment
+
+# Points between the initial split points of long paths
+RDP_CHUNK_POINTS = 512
+
+# Number in an E word, rewritten when removed moves hand over their extrusion
+E_WORD_PATTERN = re.compile(r'(E\s*)([-+]?(?:\d+\.?\d*|\.\d+))', re.IGNORECASE)
+
+
+def simplify_mask(points, tolerance, keep=None, chunk=RDP_CHUNK_POINTS):
+    """
+    Points kept by Ramer-Douglas-Peucker simplification
+
+    Long paths are first split every 'chunk' points so the refinement depth
+    stays bounded (a spiral otherwise peels off one point per pass); split
+    points the tolerance does not need are removed again afterwards.
+
+    Args:
+        points (ndarray): (n, 2) or (n, 3) points
+        tolerance (float): Largest distance in mm of a removed point from
+                           the simplified polyline
+        keep (ndarray): (n,) points that must stay, e.g. the ends of several
+                        polylines stored back to back (first and last point
+                        are always kept)
+        chunk (int): Points between the initial split points
+
+    Returns:
+        ndarray: (n,) boolean mask of the kept points
+    """
+    points = np.asarray(points, dtype=float)
+    count = len(points)
+    keep = np.zeros(count, dtype=bool) if keep is None else np.array(keep, dtype=bool)
+    if count == 0:
+        return keep
+    keep[[0, -1]] = True
+
+    seeds = np.zeros(count, dtype=bool)
+    seeds[::chunk] = True
+    seeds &= ~keep
+    keep |= seeds
+
+    keep = _refine(points, tolerance, keep)
+
+    # Drop unneeded split points, every other one per pass so that the
+    # neighbours of the points tested stay fixed
+    seeds = np.flatnonzero(seeds)
+    for parity in (0, 1):
+        tested = seeds[(seeds // chunk) % 2 == parity]
+        if len(tested) == 0:
+            continue
+        anchors = np.flatnonzero(keep)
+        slot = np.searchsorted(anchors, tested)
+        left, right = anchors[slot - 1], anchors[slot + 1]
+
+        # Every point between the neighbours against their chord
+        sizes = right - left + 1
+        owner = np.repeat(np.arange(len(tested)), sizes)
+        index = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes) + left[owner]
+        distance = _chord_distance(points[index], points[left[owner]], points[right[owner]])
+        largest = np.maximum.reduceat(distance, np.cumsum(sizes) - sizes)
+
+        keep[tested[largest <= tolerance]] = False
+
+    return keep
+
+def _chord_distance(points, start, end):
+    """Distance of every point to its chord (clamped to the chord ends)"""
+    chord = end - start
+    offset = points - start
+    length = (chord ** 2).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.clip(np.where(length > 0, (offset * chord).sum(axis=1) / length, 0.), 0., 1.)
+    return np.sqrt(((offset - t[:, None] * chord) ** 2).sum(axis=1))
+
+def _refine(points, tolerance, keep):
+    """Split every range at its farthest point until all are within tolerance"""
+    anchors = np.flatnonzero(keep)
+    pending = np.flatnonzero(~keep)
+    slot = np.searchsorted(anchors, pending)
+    left, right = anchors[slot - 1], anchors[slot]
+
+    # Split point of every range, indexed by the range's left anchor
+    splits = np.full(len(points), -1)
+
+    while len(pending):
+        distance = _chord_distance(points[pending], points[left], points[right])
+
+        order = np.lexsort((-distance, left))
+        ranges, first = np.unique(left[order], return_index=True)
+        farthest = order[first]
+        split = distance[farthest] > tolerance
+
+        keep[pending[farthest[split]]] = True
+        splits[ranges[split]] = pending[farthest[split]]
+
+        # Ranges within tolerance are done, split ones continue as two
+        at = splits[left]
+        active = (at >= 0) & (pending != at)
+        left = np.where(pending > at, at, left)[active]
+        right = np.where(pending < at, at, right)[active]
+        pending = pending[active]
+
+        splits[ranges[split]] = -1
+
+    return keep
+
+def simplify_segments(segments, tolerance, amounts=None):
+    """
+    Simplify the continuous paths of an ordered (n, 2, 2) segment array
+
+    Segments starting where the previous one ended form one path; path ends
+    and travel gaps are kept as they are. Every kept segment carries the
+    amounts (extrusion) of the segments it replaces, so the deposited
+    material is unchanged.
+
+    Args:
+        segments (ndarray): (n, 2, 2) ordered segments
+        tolerance (float): Largest deviation in mm from the original paths
+        amounts (ndarray): (n,) extrusion of every segment (default 1,
+                           counting the replaced segments)
+
+    Returns:
+        ndarray: (k, 2, 2) segments in the same order
+        ndarray: (k,) amounts of the kept segments
+        int: Number of removed points
+    """
+    segments = np.asarray(segments, dtype=float)
+    amounts = np.ones(len(segments)) if amounts is None else np.asarray(amounts, dtype=float)
+    if len(segments) < 2:
+        return segments, amounts, 0
+
+    gaps = np.hypot(*(segments[1:, 0, :2] - segments[:-1, 1, :2]).T)
+    travel = np.concatenate([[True], gaps > 1e-6])
+
+    # Every path contributes its start point and all segment ends
+    path = np.cumsum(travel) - 1
+    points = np.concatenate([segments[travel, 0], segments[:, 1]])
+    owner = np.concatenate([path[travel], path])
+    order = np.argsort(np.concatenate([np.flatnonzero(travel) * 2,
+                                       np.arange(len(segments)) * 2 + 1]), kind='stable')
+    points, owner = points[order], owner[order]
+
+    # Amount deposited up to every point, path starts add nothing
+    total = np.cumsum(np.concatenate([np.zeros(np.count_nonzero(travel)), amounts])[order])
+
+    ends = np.concatenate([[True], owner[1:] != owner[:-1]])
+    ends |= np.concatenate([owner[1:] != owner[:-1], [True]])
+
+    keep = simplify_mask(points, tolerance, ends)
+    points, owner, total = points[keep], owner[keep], total[keep]
+
+    joined = owner[1:] == owner[:-1]
+    simplified = np.stack([points[:-1][joined], points[1:][joined]], axis=1)
+
+    return simplified, np.diff(total)[joined], int((~keep).sum())
+
+def simplify_ring(ring, tolerance, amounts=None):
+    """
+    Simplify a closed outline, its first vertex is kept
+
+    Args:
+        ring (ndarray): (m, 2) outline vertices
+        tolerance (float): Largest deviation in mm from the original outline
+        amounts (ndarray): (m,) extrusion of the edge from every vertex to
+                           the next (default 1)
+
+    Returns:
+        ndarray: (k, 2) kept vertices
+        ndarray: (k,) amounts of the kept edges, each carrying the edges
+                 it replaces
+    """
+    ring = np.asarray(ring, dtype=float)
+    amounts = np.ones(len(ring)) if amounts is None else np.asarray(amounts, dtype=float)
+    keep = simplify_mask(np.vstack([ring, ring[:1]]), tolerance)
+    total = np.concatenate([[0.], np.cumsum(amounts)])[keep]
+    return ring[keep[:-1]], np.diff(total)
+
+def simplify_gcode(gcode, tolerance):
+    """
+    Remove redundant straight extrusion moves from a G-code program
+
+    Chains of absolute G1 extrusion moves (same Z and feedrate, only blank
+    or comment lines between them) are simplified as polylines; relative
+    (G91) moves are kept, removing one would shift all later ones. The E amount of every
+    removed move is added to the next kept move, so the deposited material
+    is unchanged (relative extrusion). All other lines stay untouched.
+
+    Args:
+        gcode (str): Program text, generated or imported
+        tolerance (float): Largest deviation in mm from the original path
+
+    Returns:
+        str: Simplified program
+        int: Number of removed moves
+    """
+    moves = parse_moves(gcode)
+    if len(moves['line']) < 3:
+        return gcode, 0
+
+    previous_feed = np.concatenate([[np.nan], moves['feed'][:-1]])
+    candidate = ((moves['code'] == 1) & (moves['e'] > 0) & moves['xy'] & ~moves['relative']
+                 & (moves['start'][:, 2] == moves['end'][:, 2])
+                 & (np.isnan(moves['f']) | (moves['f'] == previous_feed)))
+
+    # Chains: consecutive candidate moves, the first one keeps its line
+    linked = candidate & np.concatenate([[False], candidate[:-1]]) & moves['chained']
+    chain = np.cumsum(~linked) - 1
+
+    # Polyline points: start of every chain and all move ends
+    heads = np.flatnonzero(~linked)
+    points = np.concatenate([moves['start'][heads], moves['end']])
+    owner = np.concatenate([chain[heads], chain])
+    order = np.argsort(np.concatenate([heads * 2, np.arange(len(chain)) * 2 + 1]),
+                       kind='stable')
+    points, owner = points[order], owner[order]
+
+    # Chain ends and the ends of moves that are not simplified stay
+    fixed = np.concatenate([np.ones(len(heads), dtype=bool), ~candidate])[order]
+    fixed[1:] |= owner[1:] != owner[:-1]
+    fixed[:-1] |= owner[1:] != owner[:-1]
+
+    keep = simplify_mask(points, tolerance, fixed)
+    kept_moves = _move_flags(order, keep, len(heads))
+
+    removed = ~kept_moves
+    if not removed.any():
+        return gcode, 0
+
+    # Hand the extrusion of removed moves to the next kept move of the chain
+    receiver = np.flatnonzero(kept_moves)
+    targets = receiver[np.searchsorted(receiver, np.flatnonzero(removed))]
+    extra = np.zeros(len(chain))
+    np.add.at(extra, targets, moves['e'][removed])
+
+    lines = gcode.splitlines(keepends=True)
+    for move in np.flatnonzero(extra).tolist():
+        code, comment = split_comment(lines[moves['line'][move]])
+        amount = round(moves['e'][move] + extra[move], 6)
+        code = E_WORD_PATTERN.sub(lambda word: f"{word.group(1)}{amount}", code, count=1)
+        lines[moves['line'][move]] = code + (';' + comment if comment else '')
+
+    for line in moves['line'][removed].tolist():
+        lines[line] = ''
+
+    return "".join(lines), int(removed.sum())
+
+def _move_flags(order, keep, heads):
+    """Keep flags of the moves from the keep flags of the sorted points"""
+    flags = np.empty(len(keep), dtype=bool)
+    flags[order] = keep
+    return flags[heads:]
@@ -2,26 +2,259 @@
 """
 Template management for BIOX G-Code Generator
 
+Templates are the built-in TEMPLATE_PROPERTIES and labware definition
+files (NAME.json or NAME.toml in the labware folder), which add plates
+without editing the code. A definition file is only read when its template
+is used, validated once and compiled into read-only arrays of well
+centres, indices and labels ("A1" ... "AF48"); both stay cached until the
+file changes. Sparse subsets of a plate are selected with boolean well
+masks.
+
 @author: Maria Teresa Alameda Felgueiras
 """
+import os
+import re
+import json
+import numpy as np
+from .plate import well_centers
 from ..utils.constants import TEMPLATE_PROPERTIES
 
+try:
+    import tomllib
+except ImportError:  # Python < 3.11, TOML definitions are not available
+    tomllib = None
+
+# Well selections, e.g. "A1:H12, P24" (single wells or rectangles)
+WELL_RANGE_PATTERN = re.compile(r'^([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?$')
+
+# Folder of the labware definition files
+LABWARE_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 'labware')
+
+# Template properties and their defaults, None when required. Sizes in mm:
+# well_spacing_* is the pitch, a1_offset_* the centre of well A1 from the
+# plate corner; a well_depth of 0 is unknown
+TEMPLATE_FIELDS = {
+    'rows': None,
+    'cols': None,
+    'well_spacing_x': None,
+    'well_spacing_y': None,
+    'plate_length': None,
+    'plate_width': None,
+    'a1_offset_x': 0.,
+    'a1_offset_y': 0.,
+    'well_depth': 0.,
+    'description': ""
+}
+
+def validate_template(definition, source):
+    """
+    Template properties of a definition, with the defaults filled in
+
+    Raises:
+        ValueError: Listing every problem of the definition
+    """
+    errors = [f"unknown property '{key}'" for key in definition if key not in TEMPLATE_FIELDS]
+    errors += [f"missing property '{key}'" for key, default in TEMPLATE_FIELDS.items()
+               if default is None and key not in definition]
+    properties = {**{key: default for key, default in TEMPLATE_FIELDS.items()
+                     if default is not None}, **definition}
+
+    for key, value in properties.items():
+        if key == 'description':
+            if not isinstance(value, str):
+                errors.append("'description' must be a text")
+        elif key in ('rows', 'cols'):
+            if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+                errors.append(f"'{key}' must be a positive integer")
+        elif key in TEMPLATE_FIELDS and (not isinstance(value, (int, float))
+                                         or isinstance(value, bool) or value < 0):
+            errors.append(f"'{key}' must be a number >= 0")
+
+    if not errors:
+        for axis, size, count in (('x', 'plate_length', 'cols'), ('y', 'plate_width', 'rows')):
+            end = (properties[f'a1_offset_{axis}']
+                   + (properties[count] - 1) * properties[f'well_spacing_{axis}'])
+            if properties[size] and end > properties[size]:
+                errors.append(f"the wells do not fit in the {size} ({end:g} > "
+                              f"{properties[size]:g} mm)")
+
+    if errors:
+        raise ValueError(f"Invalid template {source}: " + "; ".join(errors))
+    return properties
+
+def load_definition(path):
+    """Definition of a labware file, JSON or TOML"""
+    if path.endswith('.toml'):
+        if tomllib is None:
+            raise ValueError(f"TOML templates need Python 3.11 or later: {path}")
+        with open(path, 'rb') as file:
+            return tomllib.load(file)
+
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+class TemplateRegistry:
+    """
+    Plate templates by name, built-in and from labware definition files
+
+    The file NAME.json (or NAME.toml) defines the template NAME and takes
+    the place of a built-in template with that name. Names are listed from
+    the file names; a file is parsed, validated and compiled when its
+    template is first used, and again only after its modification time
+    changes.
+    """
+    def __init__(self, directory = LABWARE_DIRECTORY, builtin = TEMPLATE_PROPERTIES):
+        self.directory = directory
+        self.builtin = builtin
+        self.entries = {}
+
+    def files(self):
+        """Definition file of every template in the folder, by name"""
+        if not os.path.isdir(self.directory):
+            return {}
+        return {os.path.splitext(name)[0]: os.path.join(self.directory, name)
+                for name in sorted(os.listdir(self.directory))
+                if name.endswith(('.json', '.toml'))}
+
+    def names(self):
+        """
+        Built-in template names, then the names of the new definition files
+        in natural order ("96-well plate" before "384-well plate")
+        """
+        files = [name for name in self.files() if name not in self.builtin]
+        return list(self.builtin) + sorted(files, key=lambda name: [
+            int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)])
+
+    def entry(self, name):
+        """Cached properties and arrays of a template, reloaded when its file changed"""
+        path = next((path for path in (os.path.join(self.directory, name + extension)
+                                       for extension in ('.json', '.toml'))
+                     if os.path.isfile(path)), None)
+        if path is None and name not in self.builtin:
+            raise ValueError(f"Unknown template: {name}")
+
+        key = (path, os.stat(path).st_mtime_ns) if path else None
+        entry = self.entries.get(name)
+        if entry is None or entry['key'] != key:
+            properties = (validate_template(load_definition(path), path) if path
+                          else validate_template(self.builtin[name], name))
+            entry = self.entries[name] = {'key': key, 'properties': properties,
+                                          'compiled': None}
+        return entry
+
+    def properties(self, name):
+        """Validated properties of a template"""
+        return self.entry(name)['properties']
+
+    def compile(self, name):
+        """Well arrays of a template (see compile_template)"""
+        entry = self.entry(name)
+        if entry['compiled'] is None:
+            entry['compiled'] = compile_properties(entry['properties'])
+        return entry['compiled']
+
 def set_template(template_name, gcode):
     """
     Get properties for the selected template and update G-code
     
     Returns:
-        tuple: (rows, cols, well_spacing_x, well_spacing_y, plate_length, plate_width)
+        dict: Template properties (see TEMPLATE_FIELDS)
         str: Updated G-code
     """
     gcode += f"\n; {template_name} template selected\n\n"
     
-    if template_name not in TEMPLATE_PROPERTIES:
-        raise ValueError(f"Unknown template: {template_name}")
-    
-    properties = TEMPLATE_PROPERTIES[template_name]
+    properties = TEMPLATES.properties(template_name)
     return properties, gcode
 
 def get_available_templates():
     """Return list of available template names"""
-    return list(TEMPLATE_PROPERTIES.keys())
+    return TEMPLATES.names()
+
+
+def row_labels(rows):
+    """
+    Row letters of a plate: A-Z, then AA, AB, ...
+
+    Returns:
+        ndarray: (rows,) row labels
+    """
+    labels = []
+    for row in range(rows):
+        label, number = "", row + 1
+        while number:
+            number, letter = divmod(number - 1, 26)
+            label = chr(ord('A') + letter) + label
+        labels.append(label)
+    return np.array(labels)
+
+def row_number(label):
+    """Row index (from 0) of a row label, the inverse of row_labels"""
+    number = 0
+    for letter in label:
+        number = number * 26 + ord(letter) - ord('A') + 1
+    return number - 1
+
+def compile_template(template_name):
+    """
+    Well arrays of a template, computed once and cached
+
+    Returns:
+        dict: 'properties' of the template, 'centers' (n, 2) well centres
+              in mm (well A1 at the origin), 'index' (n, 2) (row, col) of
+              every well and 'labels' (n,) well labels, all row by row;
+              the arrays are read-only
+    """
+    return TEMPLATES.compile(template_name)
+
+def compile_properties(properties):
+    """Well arrays of template properties (see compile_template)"""
+    centers, index = well_centers(properties)
+    labels = np.char.add(row_labels(properties['rows'])[index[:, 0]],
+                         (index[:, 1] + 1).astype(str))
+
+    compiled = {'properties': properties, 'centers': centers,
+                'index': index, 'labels': labels}
+    for array in (centers, index, labels):
+        array.setflags(write=False)
+    return compiled
+
+def well_mask(compiled, selection):
+    """
+    Boolean mask of the wells in a selection
+
+    Args:
+        compiled (dict): Template arrays (see compile_template)
+        selection (str): Comma separated wells and rectangles, e.g.
+                         "A1:H12, P24"; empty selects every well
+
+    Returns:
+        ndarray: (n,) True for the selected wells, row by row
+    """
+    rows, cols = compiled['properties']['rows'], compiled['properties']['cols']
+    row, col = compiled['index'].T
+
+    if not selection.strip():
+        return np.ones(len(row), dtype=bool)
+
+    mask = np.zeros(len(row), dtype=bool)
+    for part in selection.upper().split(','):
+        match = WELL_RANGE_PATTERN.match(part.replace(" ", ""))
+        if not match:
+            raise ValueError(f"Invalid well selection: {part.strip()}")
+
+        first_row, first_col, last_row, last_col = match.groups()
+        first = (row_number(first_row), int(first_col) - 1)
+        last = (row_number(last_row), int(last_col) - 1) if last_row else first
+        for well_row, well_col in (first, last):
+            if not (0 <= well_row < rows and 0 <= well_col < cols):
+                raise ValueError(f"Well outside the template: {part.strip()}")
+
+        (top, bottom), (left, right) = sorted((first[0], last[0])), sorted((first[1], last[1]))
+        mask |= (row >= top) & (row <= bottom) & (col >= left) & (col <= right)
+
+    return mask
+
+# Templates of the application
+TEMPLATES = TemplateRegistry()
+TEMPLATE_NAMES = sorted(TEMPLATES.names())
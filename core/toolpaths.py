@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Infill pattern toolpaths for BIOX G-Code Generator scaffolds
+
+Every generator returns an ordered (n, 2, 2) array of extrusion segments
+in mm. The same arrays are emitted as G-code and drawn in the preview.
+
+@author: Maria Teresa Alameda Felgueiras
+"""
+from functools import partial
+
+import numpy as np
+from .geometry import (clip_segments, reverse_segments, rotation_matrix,
+                       boundary_vertices, offset_polygon, points_in_polygon,
+                       scanline_intervals, contour_segments)
+
+# Largest distance in mm between an arc and the chords approximating it
+CHORD_TOLERANCE = 0.01
+
+# Grid samples per TPMS unit cell (bounds of the adaptive resolution) and
+# grid points per layer at most
+TPMS_SAMPLES_PER_CELL = (8, 64)
+TPMS_MAX_GRID_POINTS = 4_000_000
+
+
+def perimeter_center(dimensions, origin):
+    """Center of the perimeter rectangle drawn from its 'origin' corner"""
+    return (origin[0] - dimensions[0] / 2, origin[1] - dimensions[1] / 2)
+
+def rectangle_bounds(dimensions, center=(0., 0.)):
+    """(x_min, x_max, y_min, y_max) of a rectangle"""
+    return (center[0] - dimensions[0] / 2, center[0] + dimensions[0] / 2,
+            center[1] - dimensions[1] / 2, center[1] + dimensions[1] / 2)
+
+def extrusion_rate(dimensions, extrusion):
+    """
+    Extrusion per mm of toolpath
+
+    'extrusion' is the amount of one side of the perimeter rectangle (and
+    of an infill line across it); spread over the mean side length, paths
+    of any shape and discretization deposit the same material per mm.
+    """
+    return extrusion / np.mean(dimensions)
+
+def rectangle_outline(dimensions, origin):
+    """
+    Rectangular perimeter outline starting at its 'origin' corner
+
+    The outline is walked counterclockwise, first along -X, the order the
+    perimeter has always been printed in.
+    """
+    x0, y0 = origin
+    width, height = dimensions
+    return np.array([[x0, y0], [x0 - width, y0],
+                     [x0 - width, y0 - height], [x0, y0 - height]], dtype=float)
+
+def arc_points(center, radius, start, end, tolerance=CHORD_TOLERANCE):
+    """
+    Points along a circular arc, as few as the chord tolerance allows
+
+    A chord spanning an angle a deviates radius * (1 - cos(a / 2)) from the
+    arc, so the step is the largest angle keeping that below 'tolerance'.
+
+    Args:
+        center (tuple): (x, y) arc center in mm
+        radius (float): Arc radius in mm
+        start, end (float): Arc angles in radians (end > start: counterclockwise)
+        tolerance (float): Maximum chord error in mm
+
+    Returns:
+        ndarray: (n + 1, 2) points including both arc ends
+    """
+    step = 2 * np.arccos(1 - tolerance / radius) if tolerance < radius else np.pi
+    count = max(int(np.ceil(abs(end - start) / step)), 1)
+    theta = start + (end - start) * np.arange(count + 1) / count
+
+    return np.asarray(center, dtype=float) + radius * np.column_stack([np.cos(theta),
+                                                                       np.sin(theta)])
+
+def circle_outline(center, radius, tolerance=CHORD_TOLERANCE, start=0.):
+    """Counterclockwise circular outline from angle 'start' (radians)"""
+    points = arc_points(center, radius, start, start + 2 * np.pi, tolerance)[:-1]
+    return points if len(points) >= 3 else polygon_outline(center, radius, 3, start)
+
+def polygon_outline(center, radius, sides, rotation=0.):
+    """Counterclockwise regular polygon with circumradius 'radius'"""
+    theta = rotation + 2 * np.pi * np.arange(sides) / sides
+    return np.asarray(center, dtype=float) + radius * np.column_stack([np.cos(theta),
+                                                                       np.sin(theta)])
+
+def perimeter_shells(outline, shells=1, spacing=0.41, inset=0., grouped=False):
+    """
+    Concentric perimeter shells, from the outline towards the material
+
+    All shells of an outline come from one vectorized offset. Outlines may
+    be a single (m, 2) ring or a list of rings (holes included, even-odd
+    rule); each ring is offset towards the inside of the material. Shells
+    that collapse (an edge turns around) are dropped.
+
+    Args:
+        outline: (m, 2) outline or list of outlines
+        shells (int): Number of shells per ring, the outline itself first
+        spacing (float): Distance between shells in mm (line width)
+        inset (float): Offset of the first shell from the outline in mm
+        grouped (bool): Return the shells of every ring as one list
+
+    Returns:
+        list: (m, 2) shell rings, outer shells first; grouped, a list of
+              shells per ring, in outline order
+    """
+    rings = [outline] if isinstance(outline, np.ndarray) and outline.ndim == 2 else outline
+    rings = [np.asarray(ring, dtype=float) for ring in rings]
+    distances = inset + spacing * np.arange(shells)
+
+    # Side of every ring holding material: probe just left of its first edge
+    first_edges = np.array([ring[1] - ring[0] for ring in rings])
+    left = np.column_stack([-first_edges[:, 1], first_edges[:, 0]])
+    left /= np.hypot(left[:, 0], left[:, 1])[:, None]
+    probes = np.array([(ring[0] + ring[1]) / 2 for ring in rings]) + 1e-6 * left
+    sides = np.where(points_in_polygon(probes, rings), 1., -1.)
+
+    groups = []
+    for ring, side in zip(rings, sides):
+        offsets = offset_polygon(ring, side * distances)
+
+        # A shell has collapsed once any of its edges turns around
+        edges = np.roll(offsets, -1, axis=1) - offsets
+        kept = (np.einsum('kij,ij->ki', edges, edges[0]) > 0).all(axis=1)
+        count = len(kept) if kept.all() else int(np.argmin(kept))
+
+        groups.append(list(offsets[:count]))
+
+    if grouped:
+        return groups
+    return [group[index] for index in range(shells) for group in groups if index < len(group)]
+
+def infill_boundary(outline, shells, spacing):
+    """
+    Outline left for the infill inside 'shells' perimeter shells
+
+    The infill reaches the path of the innermost shell, as it reaches the
+    outline when a single shell is printed.
+
+    Returns:
+        The outline itself for a single shell, otherwise the path of the
+        innermost shell (the innermost printed shell when the inner ones
+        collapse)
+    """
+    if shells == 1:
+        return outline
+
+    inner = perimeter_shells(outline, 1, spacing, inset = (shells - 1) * spacing)
+    return inner if inner else perimeter_shells(outline, shells, spacing)[-1:]
+
+def shell_segments(shells):
+    """Closed shell rings as one ordered (n, 2, 2) segment array"""
+    return np.concatenate([np.stack([shell, np.roll(shell, -1, axis=0)], axis=1)
+                           for shell in shells])
+
+def line_offsets(low, high, spacing, resolution=16, max_samples=1_000_000):
+    """
+    Positions of parallel lines from 'high' down to 'low' (both excluded)
+
+    With a constant spacing the lines are 'spacing' mm apart. A spacing
+    function gives graded spacing: it maps the normalized position t
+    (-1 at 'low', 1 at 'high') to the local spacing in mm. The line count
+    up to every position is the integral of 1 / spacing, sampled on a fine
+    grid and inverted with one interpolation, so graded layouts cost about
+    as much as uniform ones.
+
+    Args:
+        low, high (float): Extent across the lines in mm
+        spacing: Spacing in mm or function of t (array in, array out)
+        resolution (int): Integration samples per smallest spacing
+
+    Returns:
+        ndarray: Line positions in print order (decreasing)
+    """
+    if not callable(spacing):
+        offsets = high - spacing * np.arange(1, int(np.ceil((high - low) / spacing)))
+        return offsets[offsets > low + 1e-9]
+
+    # Coarse pass to size the integration grid after the smallest spacing
+    t = np.linspace(1., -1., 1025)
+    smallest = np.min(spacing(t))
+    samples = int(min(max(resolution * (high - low) / smallest, 1025), max_samples))
+
+    t = np.linspace(1., -1., samples)
+    positions = low + (t + 1) / 2 * (high - low)
+    density = 1 / np.broadcast_to(spacing(t), t.shape)
+    step = (high - low) / (samples - 1)
+    lines = np.concatenate([[0.], np.cumsum((density[1:] + density[:-1]) / 2) * step])
+
+    # Invert the cumulative line count at every whole line
+    count = np.arange(1, int(np.ceil(lines[-1] - 1e-9)))
+    return np.interp(count, lines, positions)
+
+def infill_gradient(delta, infill, infill_end, profile='linear'):
+    """
+    Spacing function for an infill gradient across the lines
+
+    The spacing scales with infill / local infill, so 'delta' (the uniform
+    spacing for 'infill' percent) grows where the local infill drops.
+
+    Args:
+        delta (float): Line spacing in mm at 'infill'
+        infill (float): Infill in % where the gradient starts
+        infill_end (float): Infill in % where the gradient ends
+        profile (str): 'linear' from one side to the other, or 'radial'
+                       from the center line to both sides
+
+    Returns:
+        callable: Spacing function of the normalized position t
+    """
+    # A partial of a module function pickles, so layers can be generated in
+    # worker processes
+    return partial(_gradient_spacing, delta=delta, infill=infill,
+                   infill_end=infill_end, radial=profile == 'radial')
+
+def _gradient_spacing(t, delta, infill, infill_end, radial):
+    """Spacing at the normalized positions t, see infill_gradient"""
+    fraction = np.abs(t) if radial else (np.asarray(t) + 1) / 2
+    return delta * infill / (infill + (infill_end - infill) * fraction)
+
+def layer_gradient(value, start, end, layers):
+    """
+    Per-layer value scaled by start / local infill, grading start -> end %
+
+    Used for line spacings and honeycomb cell sizes, both inversely
+    proportional to the infill.
+    """
+    local = np.linspace(start, end, layers) if layers > 1 else np.array([start])
+    return value * start / local
+
+def line_family_segments(boundary, delta, angle=90.):
+    """
+    Parallel infill lines at any angle, clipped to the boundary in one batch
+
+    Lines are laid out in a frame rotated by 'angle' (offsets along the line
+    normal, extent along the line direction) and mapped back with a single
+    rotation matrix product, so the cost only depends on the line count.
+    Rectangles are clipped with Liang-Barsky, outlines by scanline
+    intersection. Lines are printed in alternating directions.
+
+    Args:
+        boundary: (x_min, x_max, y_min, y_max) rectangle or outline(s)
+        delta: Line spacing in mm, measured across the lines, or a
+               spacing function (see line_offsets)
+        angle (float): Line direction in degrees from the X axis
+                       (90 gives lines parallel to Y)
+
+    Returns:
+        ndarray: (n, 2, 2) ordered extrusion segments
+    """
+    # Columns of the rotation matrix: line direction and (clockwise) normal
+    rotation = rotation_matrix(angle - 90.)
+    frame = boundary_vertices(boundary) @ rotation
+
+    normal_min, along_min = frame.min(axis=0)
+    normal_max, along_max = frame.max(axis=0)
+
+    offsets = line_offsets(normal_min, normal_max, delta)
+    alternate = np.arange(len(offsets)) % 2 == 1
+
+    if not isinstance(boundary, list) and np.ndim(boundary) == 1:
+        segments = np.empty((len(offsets), 2, 2))
+        segments[:, :, 0] = offsets[:, None]
+        segments[:, 0, 1] = np.where(alternate, along_min, along_max)
+        segments[:, 1, 1] = np.where(alternate, along_max, along_min)
+
+        return clip_segments(segments @ rotation.T, boundary)
+
+    # Outlines: scanline intervals in the rotated frame
+    rings = [boundary] if isinstance(boundary, np.ndarray) and boundary.ndim == 2 else boundary
+    lines, intervals = scanline_intervals(
+        offsets, [np.asarray(ring, dtype=float) @ rotation for ring in rings])
+
+    # Lines printed towards -along walk their intervals backwards
+    forward = alternate[lines]
+    order = np.lexsort((np.where(forward, intervals[:, 0], -intervals[:, 0]), lines))
+    lines, intervals, forward = lines[order], intervals[order], forward[order]
+
+    segments = np.empty((len(lines), 2, 2))
+    segments[:, :, 0] = offsets[lines, None]
+    segments[:, 0, 1] = np.where(forward, intervals[:, 0], intervals[:, 1])
+    segments[:, 1, 1] = np.where(forward, intervals[:, 1], intervals[:, 0])
+
+    return segments @ rotation.T
+
+def striped_segments(dimensions, delta, center=(0., 0.), angle=90.,
+                     boundary=None):
+    """
+    Striped infill: lines every 'delta' mm, parallel to Y by default
+
+    Args:
+        dimensions (tuple): (width, height) of the perimeter in mm
+        delta: Line spacing in mm or spacing function (see line_offsets)
+        center (tuple): (x, y) center of the perimeter in mm
+        angle (float): Line direction in degrees from the X axis
+        boundary: Clipping rectangle or outline (default: the perimeter)
+
+    Returns:
+        ndarray: (n, 2, 2) ordered extrusion segments
+    """
+    if boundary is None:
+        boundary = rectangle_bounds(dimensions, center)
+
+    return line_family_segments(boundary, delta, angle)
+
+def grid_segments(dimensions, delta, center=(0., 0.), angle=90.,
+                  boundary=None):
+    """
+    Grid infill: lines at 'angle', then lines at 'angle' + 90 degrees
+
+    Same arguments as striped_segments.
+    """
+    if boundary is None:
+        boundary = rectangle_bounds(dimensions, center)
+
+    return np.concatenate([line_family_segments(boundary, delta, angle),
+                           line_family_segments(boundary, delta, angle + 90.)])
+
+def layer_angles(angles, layers):
+    """Infill angle of every layer, cycling through 'angles'"""
+    return np.resize(np.asarray(angles, dtype=float), layers)
+
+def honeycomb_segments(dimensions, cell_size, center=(0., 0.), reverse=False,
+                       boundary=None):
+    """
+    Honeycomb lattice clipped to a rectangle, ordered for printing
+
+    The lattice is built from horizontal zigzag waves of flat-topped
+    hexagons. Even waves are printed whole from left to right; between
+    them only the diagonals of the mirrored odd waves are printed (right
+    to left), so every hexagon wall is deposited exactly once. Consecutive
+    diagonals are separated by one hexagon side, which the emitter can
+    cross without raising the printhead.
+
+    Args:
+        dimensions (tuple): (width, height) of the clipping rectangle in mm
+        cell_size (float): Distance between hexagon centers in mm
+        center (tuple): (x, y) center of the rectangle in mm
+        reverse (bool): Print the layer backwards, e.g. on odd layers
+        boundary: Clipping rectangle or outline (default: the rectangle)
+
+    Returns:
+        ndarray: (n, 2, 2) ordered extrusion segments
+    """
+    side = cell_size / np.sqrt(3)
+    half_height = cell_size / 2
+    period = 3 * side
+
+    clip = rectangle_bounds(dimensions, center) if boundary is None else boundary
+
+    # The lattice stays anchored at 'center' and covers the whole boundary
+    reach = np.abs(boundary_vertices(clip) - np.asarray(center, dtype=float)).max(axis=0)
+    dimensions = 2 * reach
+
+    # Wave breakpoints: low flat, rise, high flat, fall
+    periods = int(np.ceil(dimensions[0] / 2 / period)) + 1
+    offsets = np.array([0., side, 1.5 * side, 2.5 * side])
+    x = (np.arange(-periods, periods + 1)[:, None] * period + offsets
+         - 1.25 * side).ravel() + center[0]
+    wave = np.tile([0., 0., half_height, half_height], 2 * periods + 1)
+
+    rows = int(np.ceil(dimensions[1] / 2 / cell_size)) + 1
+    base = np.arange(-rows, rows + 1) * cell_size - half_height / 2 + center[1]
+
+    # (rows, points, xy) for the even waves and their mirrored odd neighbours
+    even = np.empty((len(base), len(x), 2))
+    even[..., 0] = x
+    even[..., 1] = base[:, None] + wave
+    odd = even.copy()
+    odd[..., 1] = base[:, None] + cell_size - wave
+
+    even_segments = np.stack([even[:, :-1], even[:, 1:]], axis=2)
+    odd_segments = np.stack([odd[:, :-1], odd[:, 1:]], axis=2)
+
+    # Odd waves only add their diagonals, walked back from right to left
+    diagonals = np.arange(len(x) - 1) % 2 == 1
+    odd_segments = odd_segments[:, diagonals][:, ::-1, ::-1]
+
+    segments = np.concatenate([even_segments, odd_segments], axis=1).reshape(-1, 2, 2)
+
+    segments = clip_segments(segments, clip)
+
+    return reverse_segments(segments) if reverse else segments
+
+def gyroid_field(x, y, z, cell_size):
+    """Gyroid implicit function, zero on the surface"""
+    k = 2 * np.pi / cell_size
+    return (np.sin(k * x) * np.cos(k * y) + np.sin(k * y) * np.cos(k * z)
+            + np.sin(k * z) * np.cos(k * x))
+
+def schwarz_p_field(x, y, z, cell_size):
+    """Schwarz P (primitive) implicit function, zero on the surface"""
+    k = 2 * np.pi / cell_size
+    return np.cos(k * x) + np.cos(k * y) + np.cos(k * z)
+
+# Triply periodic minimal surfaces by name
+TPMS_FIELDS = {'gyroid': gyroid_field, 'schwarz p': schwarz_p_field}
+
+# Mean contour length per slice area times the cell size, (pi / 4) times the
+# surface area per volume of a unit cell (stereology)
+TPMS_CONTOUR_DENSITY = {'gyroid': 2.43, 'schwarz p': 1.84}
+
+def tpms_grid_step(cell_size, area, tolerance=CHORD_TOLERANCE):
+    """
+    Adaptive sampling step of a TPMS field in mm
+
+    Contours bend with radii of about cell_size / (2 pi); the step keeps the
+    chords of such a bend within 'tolerance', bounded to
+    TPMS_SAMPLES_PER_CELL and coarsened when the grid would exceed
+    TPMS_MAX_GRID_POINTS for 'area' (mm^2).
+    """
+    radius = cell_size / (2 * np.pi)
+    fewest, most = TPMS_SAMPLES_PER_CELL
+    step = np.clip(np.sqrt(8 * tolerance * radius), cell_size / most, cell_size / fewest)
+    return max(step, np.sqrt(area / TPMS_MAX_GRID_POINTS))
+
+def tpms_segments(dimensions, cell_size, z, surface='gyroid', center=(0., 0.),
+                  boundary=None, tolerance=CHORD_TOLERANCE):
+    """
+    Slice of a triply periodic minimal surface, clipped and ordered
+
+    The implicit field is sampled at height 'z' on a grid covering the
+    boundary and its zero contours are extracted with marching squares and
+    joined into polylines. The lattice stays anchored at 'center'.
+
+    Args:
+        dimensions (tuple): (width, height) of the clipping rectangle in mm
+        cell_size (float): Unit cell size of the surface in mm
+        z (float): Slice height in mm
+        surface (str): 'gyroid' or 'schwarz p'
+        center (tuple): (x, y) center of the rectangle in mm
+        boundary: Clipping rectangle or outline (default: the rectangle)
+        tolerance (float): Chord tolerance setting the grid resolution
+
+    Returns:
+        ndarray: (n, 2, 2) ordered extrusion segments
+    """
+    field = TPMS_FIELDS[surface.lower()]
+    clip = rectangle_bounds(dimensions, center) if boundary is None else boundary
+
+    vertices = boundary_vertices(clip)
+    low, high = vertices.min(axis=0), vertices.max(axis=0)
+    step = tpms_grid_step(cell_size, np.prod(high - low), tolerance)
+
+    # One extra sample around the boundary, so contours leave it cleanly
+    x = np.arange(low[0] - step, high[0] + 2 * step, step)
+    y = np.arange(low[1] - step, high[1] + 2 * step, step)
+    values = field(x[:, None] - center[0], y[None, :] - center[1], z, cell_size)
+
+    return clip_segments(contour_segments(values, x, y), clip)
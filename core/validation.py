@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Job validation for BIOX G-Code Generator
+
+A job is described by plain values: single settings or per-well arrays
+(sweeps, printhead maps). Every value is checked against the printer
+limits at once, vectorized, and all violations are returned together, so
+jobs are validated without the GUI and fast enough for every change of a
+setting.
+
+@author: Maria Teresa Alameda Felgueiras
+"""
+import numpy as np
+from ..utils.constants import (BED_TEMP_LIMITS, PH_TEMP_LIMITS, PRINTHEAD_SPEED_LIMITS,
+                               LAYER_HEIGHT_LIMITS, PRESSURE_LIMITS)
+
+# Job values: name, unit, limits and whether the lower limit is allowed;
+# printhead temperature limits depend on the printhead type
+JOB_LIMITS = {
+    'printhead': ("Printhead number", "", 0, 2, True),
+    'speed': ("Print speed", "mm/s", *PRINTHEAD_SPEED_LIMITS, False),
+    'layer_height': ("Layer height", "mm", *LAYER_HEIGHT_LIMITS, True),
+    'bed_position': ("Bed position", "mm", 0, np.inf, False),
+    'pressure': ("Pressure", "kPa", *PRESSURE_LIMITS, True),
+    'extrusion_time': ("Extrusion time", "s", 0, np.inf, False),
+    'bed_temperature': ("Bed temperature", "°C", *BED_TEMP_LIMITS, True),
+    'temperature': ("Printhead temperature", "°C", None, None, True)
+}
+
+# Wells named in a violation message
+LISTED_WELLS = 5
+
+
+def describe_wells(wells, labels = None):
+    """
+    Short list of wells, e.g. "wells A1, A2 and 3 more"
+
+    Args:
+        wells (ndarray): Well indices, row by row
+        labels (ndarray): Well labels, numbers from 1 when None
+    """
+    names = (labels[wells[:LISTED_WELLS]] if labels is not None
+             else wells[:LISTED_WELLS] + 1).tolist()
+    text = ("well " if len(wells) == 1 else "wells ") + ", ".join(str(name) for name in names)
+    if len(wells) > LISTED_WELLS:
+        text += f" and {len(wells) - LISTED_WELLS} more"
+    return text
+
+def limits_message(name, unit, low, high, closed):
+    """Requirement of a limited value, e.g. "Pressure must be between 0 and 200 kPa" """
+    unit = f" {unit}" if unit else ""
+    if np.isinf(high):
+        return f"{name} must be {'at least' if closed else 'greater than'} {low:g}{unit}"
+    return f"{name} must be between {low:g} and {high:g}{unit}"
+
+def check_values(field, values, limits, labels = None):
+    """
+    Violations of one job value
+
+    Args:
+        field (str): Job key
+        values: Number or per-well array, NaN where the text is not a number
+        limits (tuple): (name, unit, low, high, low allowed), see JOB_LIMITS
+        labels (ndarray): Well labels for the messages
+
+    Returns:
+        list: Violations (see validate_job)
+    """
+    name, unit, low, high, closed = limits
+    values = np.atleast_1d(np.asarray(values, dtype=float)).ravel()
+
+    missing = np.isnan(values)
+    outside = (values < low) | (values > high) | (~np.asarray(closed) & (values == low))
+    if field == 'printhead':
+        outside |= ~missing & (values != np.round(values))
+
+    violations = []
+    for wrong, message in ((missing, f"{name} must be a number"),
+                           (outside, limits_message(name, unit, low, high, closed))):
+        wells = np.flatnonzero(wrong)
+        if len(wells):
+            if len(values) > 1:
+                message += f" ({describe_wells(wells, labels)})"
+            violations.append({'field': field, 'message': message + ".",
+                               'wells': wells if len(values) > 1 else wells[:0]})
+    return violations
+
+def check_sweep(field, initial, final):
+    """Violations of the initial and final value of a sweep"""
+    name = JOB_LIMITS[field][0]
+    if np.isnan(initial) or np.isnan(final):
+        message = f"Both initial and final {name.lower()} must be numbers for the sweep."
+    elif initial < 0:
+        message = f"Initial {name.lower()} cannot be negative."
+    elif final <= 0:
+        message = f"Final {name.lower()} must be greater than 0."
+    elif initial >= final:
+        message = f"Initial {name.lower()} must be less than final value."
+    else:
+        return []
+    return [{'field': f'{field}_sweep', 'message': message, 'wells': np.empty(0, dtype=int)}]
+
+def validate_job(job, labels = None):
+    """
+    All violations of a job
+
+    Args:
+        job (dict): Values to check, all optional: 'printhead_type' and
+                    'printhead', 'speed', 'layer_height', 'bed_position',
+                    'pressure', 'extrusion_time', 'bed_temperature' and
+                    'temperature' (numbers or per-well arrays, NaN when not
+                    a number); 'sweeps' maps a value to its (initial, final)
+        labels (ndarray): Well labels for the messages
+
+    Returns:
+        list: Violations, dicts with the job 'field', a 'message' and the
+              'wells' out of limits (empty for single values)
+    """
+    limits = dict(JOB_LIMITS)
+    low, high = PH_TEMP_LIMITS.get(job.get('printhead_type'), (30, 65))
+    limits['temperature'] = limits['temperature'][:2] + (low, high, True)
+
+    violations = []
+    for field, (initial, final) in job.get('sweeps', {}).items():
+        violations += check_sweep(field, float(initial), float(final))
+    for field, values in job.items():
+        if field in limits:
+            violations += check_values(field, values, limits[field], labels)
+    return violations
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Workspace checking for BIOX G-Code Generator
+
+Generated programs are checked after generation: the end point of every
+move must stay within the printer travel, and the moves over a plate
+within the plate footprint (a typo in a scaffold size would otherwise
+drive the nozzle into a plate wall). The checks run on the parsed move
+arrays as vectorized bounds and polygon containment tests, fast enough to
+be always on; the offending moves are reported by line number.
+
+@author: Maria Teresa Alameda Felgueiras
+"""
+import numpy as np
+from .gcode_parser import parse_moves
+from .geometry import points_in_polygon
+from .calibration import apply_affine
+from .estimator import in_cleaning
+from ..utils.constants import PRINTER_TRAVEL_LIMITS
+
+# Offending lines named in a workspace message
+LISTED_LINES = 5
+
+
+def plate_outline(properties, transform = None):
+    """
+    Footprint of a plate in program coordinates, well A1 at the origin
+
+    Templates without the A1 offset (0, unknown) are taken as centred on
+    their wells. A plate calibration 'transform' moves the footprint with
+    the wells.
+
+    Args:
+        properties (dict): Template properties (see compile_properties)
+        transform (ndarray): (2, 3) plate calibration, None when not calibrated
+
+    Returns:
+        ndarray: (4, 2) corners, None for templates without a plate size
+    """
+    length, width = properties['plate_length'], properties['plate_width']
+    if length <= 0 or width <= 0:
+        return None
+
+    offset_x = (properties['a1_offset_x']
+                or (length - (properties['cols'] - 1) * properties['well_spacing_x']) / 2)
+    offset_y = (properties['a1_offset_y']
+                or (width - (properties['rows'] - 1) * properties['well_spacing_y']) / 2)
+    corners = np.array([[0., 0.], [length, 0.], [length, width], [0., width]]) - [offset_x, offset_y]
+    return corners if transform is None else apply_affine(transform, corners)
+
+def check_workspace(moves, limits = PRINTER_TRAVEL_LIMITS, outline = None, skip = None):
+    """
+    Moves leaving the printer travel or the plate
+
+    Only move end points are checked (a move starts where the previous one
+    ended), arcs are not followed between their ends.
+
+    Args:
+        moves (dict): Move arrays (see parse_moves) or program text
+        limits (tuple): (min, max) of X, Y and Z in mm
+        outline (ndarray): (m, 2) plate footprint, None when not over a plate
+        skip (ndarray): (k,) True for moves allowed off the plate (cleaning)
+
+    Returns:
+        dict: One-based line numbers of the moves out of the 'travel' limits
+              and 'off_plate'
+    """
+    if isinstance(moves, str):
+        moves = parse_moves(moves)
+
+    end = moves['end']
+    lines = moves['line'] + 1
+    low, high = np.asarray(limits, dtype=float).T
+
+    travel = lines[np.any((end < low) | (end > high), axis=1)]
+
+    off_plate = lines[:0]
+    if outline is not None and len(end):
+        outline = np.asarray(outline, dtype=float)
+        corner_low, corner_high = outline.min(axis=0), outline.max(axis=0)
+        if len(outline) == 4 and np.all((outline == corner_low) | (outline == corner_high)):
+            # Axis-aligned footprint (no calibration): a bounds test is enough
+            outside = np.any((end[:, :2] < corner_low) | (end[:, :2] > corner_high), axis=1)
+        else:
+            outside = ~points_in_polygon(end[:, :2], outline)
+        if skip is not None:
+            outside &= ~skip
+        off_plate = lines[outside]
+
+    return {'travel': travel, 'off_plate': off_plate}
+
+def check_program(gcode, properties = None, transform = None, moves = None):
+    """
+    Workspace check of a generated program (see check_workspace)
+
+    Moves inside cleaning blocks go to the cleaning station and are allowed
+    off the plate.
+
+    Args:
+        gcode (str): Program text
+        properties (dict): Template properties of the plate, None without plate
+        transform (ndarray): (2, 3) plate calibration, None when not calibrated
+        moves (dict): parse_moves arrays of the program, when already parsed
+    """
+    if moves is None:
+        moves = parse_moves(gcode)
+
+    outline = None if properties is None else plate_outline(properties, transform)
+    skip = None if outline is None else in_cleaning(gcode, moves['line'])
+    return check_workspace(moves, outline = outline, skip = skip)
+
+def workspace_message(violations):
+    """
+    Description of the workspace violations, empty when there are none,
+    e.g. "2 moves leave the plate (lines 310, 312)"
+    """
+    messages = []
+    for key, text in (('travel', "the printer travel"), ('off_plate', "the plate")):
+        lines = violations[key]
+        if len(lines):
+            listed = ", ".join(str(line) for line in lines[:LISTED_LINES].tolist())
+            more = f" and {len(lines) - LISTED_LINES} more" if len(lines) > LISTED_LINES else ""
+            messages.append(f"{len(lines)} move{'s' if len(lines) > 1 else ''} "
+                            f"leave{'' if len(lines) > 1 else 's'} {text} "
+                            f"(line{'s' if len(lines) > 1 else ''} {listed}{more})")
+    return "; ".join(messages)
@@ -14,7 +14,7 @@ from .event_handlers import setup_event_handlers
 from .validation import (
     validate_inputs,
     validate_input_fields,
-    validate_sweep_parameters
+    input_violations
 )
 
 __all__ = [
@@ -22,5 +22,5 @@ __all__ = [
     'setup_event_handlers',
     'validate_inputs',
     'validate_input_fields',
-    'validate_sweep_parameters'
+    'input_violations'
 ]
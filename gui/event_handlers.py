@@ -5,14 +5,30 @@ Complete event handlers for BIOX G-Code Generator
 
 @author: Maria Teresa Alameda Felgueiras
 """
+import queue
+import threading
 import numpy as np
 from tkinter import messagebox, filedialog
 import customtkinter as ctk
-from ..gui.validation import validate_inputs, validate_input_fields
+from ..gui.validation import validate_inputs, validate_input_fields, input_violations
+from ..core.simplify import simplify_gcode
+from ..core.mesh import read_stl
+from ..core.templates import compile_template
+from ..core.runs import plate_pause, stream_run
+from ..core.workspace import workspace_message
+from ..core.calibration import (calibration_wells, fit_affine, affine_parameters,
+                                save_calibration)
 from .gcode_generation_tools import (generate_droplet_gcode,
                                      generate_scaffold_gcode,
                                      calculate_geometric_parameters,
-                                     calculate_lines, calculate_honeycomb_lines)
+                                     calculate_lines, calculate_honeycomb_lines,
+                                     parse_simplify_tolerance,
+                                     parse_calibration_points,
+                                     droplet_program, scaffold_program,
+                                     parse_plate_runs)
+from .preview_tools import (PREVIEW_VIEWS, build_preview_geometry,
+                            draw_preview_geometry, draw_density_map,
+                            export_file_paths, render_preview_views)
 
 def setup_event_handlers(root, components):
     """Configure all event handlers and callbacks"""
@@ -28,9 +44,21 @@ def setup_event_handlers(root, components):
     # Export button
     components['export_button'].configure(command=lambda: export_gcode(components))
     
+    # Run of several plates, streamed to one file
+    components['run_button'].configure(command=lambda: export_plate_run(components))
+    
     # Copy button
     components['copy_button'].configure(command=lambda: copy_to_clipboard(components))
     
+    # Simplify button
+    components['simplify_button'].configure(command=lambda: simplify_gcode_text(components))
+    
+    # Plate calibration of the selected template
+    components['calibrate_button'].configure(command=lambda: calibrate_plate(components))
+    
+    # STL mesh for the scaffold outline
+    components['scaffold_stl_button'].configure(command=lambda: load_stl_mesh(components))
+    
     # Dark mode toggle
     components['dark_mode_button'].configure(command=toggle_dark_mode)
     
@@ -70,7 +98,12 @@ def setup_event_handlers(root, components):
                  components['temperature_initial_entry'],
                  components['temperature_final_entry'],
                  components['extrusion_time_initial_entry'],
-                 components['extrusion_time_final_entry']]:
+                 components['extrusion_time_final_entry'],
+                 components['well_printheads_entry'],
+                 components['well_selection_entry'],
+                 components['scaffold_speed_entry'],
+                 components['scaffold_layer_height_entry'],
+                 components['scaffold_pressure_entry']]:
         entry.bind("<KeyRelease>", lambda event: validate_input_fields(components))
 
 def generate_gcode(components):
@@ -78,13 +111,20 @@ def generate_gcode(components):
     if not validate_inputs(components):
         return
     
-    if not on_tab_change(components):
-        print('droplet')
-        generate_droplet_gcode(components)
-    else:
-        generate_scaffold_gcode(components)
-        # components['gcode_text'].delete("1.0", ctk.END)
-        print('Scafold')    
+    # Settings only read while generating (STL mesh, printhead maps, ...)
+    try:
+        if not on_tab_change(components):
+            generate_droplet_gcode(components)
+        else:
+            generate_scaffold_gcode(components)
+    except ValueError as e:
+        messagebox.showerror("Error", f"Failed to generate G-code: {e}")
+        return
+    
+    # Moves out of the printer travel or off the plate
+    message = workspace_message(components['generation_stats']['workspace'])
+    if message:
+        messagebox.showwarning("Workspace", f"Check the program before printing: {message}.")
 
 def export_gcode(components):
     """Export generated G-code to file"""
@@ -105,19 +145,126 @@ def export_gcode(components):
         except Exception as e:
             messagebox.showerror("Error", f"Failed to export G-code: {e}")
             
+def export_plate_run(components):
+    """Stream the programs of several plates to one file, plate by plate"""
+    try:
+        plates = parse_plate_runs(components)
+        plate_pause(components['plate_pause_entry'].get())
+    except ValueError as e:
+        messagebox.showerror("Error", str(e))
+        return
+    
+    # Every plate is checked before anything is written
+    problems = [f"Plate {number}: {violation['message']}"
+                for number, (_, settings) in enumerate(plates, 1)
+                for violation in input_violations(settings)]
+    if problems:
+        messagebox.showerror("Input Error", "\n".join(problems))
+        return
+    
+    file_path = filedialog.asksaveasfilename(
+        defaultextension=".gcode", 
+        filetypes=[("G-code files", "*.gcode")]
+    )
+    if not file_path:
+        return
+    
+    program = scaffold_program if on_tab_change(components) else droplet_program
+    messages = []
+    def generate(settings):
+        gcode, stats = program(settings)
+        messages.append(workspace_message(stats['workspace']))
+        return gcode
+    
+    try:
+        with open(file_path, "w") as file:
+            summary, total = stream_run(file, plates, generate,
+                                        components['plate_pause_entry'].get())
+    except (OSError, ValueError) as e:
+        messagebox.showerror("Error", f"Failed to export the run: {e}")
+        return
+    
+    # Line numbers are counted within every plate program
+    warnings = [f"Plate {number}: {message}" for number, message in enumerate(messages, 1) if message]
+    if warnings:
+        messagebox.showwarning("Workspace", "Check the run before printing:\n" + "\n".join(warnings))
+    
+    components['gcode_stats_label'].configure(
+        text=f"run of {len(summary)} plates: {total / 60:.1f} min | " + ", ".join(
+            f"plate {number}: {plate['time']['total'] / 60:.1f} min"
+            for number, plate in enumerate(summary, 1)))
+    messagebox.showinfo("Success", f"Run of {len(summary)} plates exported successfully.")
+
 def export_preview_image(components):
-    """Save the current scaffold preview as a PNG file"""
+    """
+    Save the scaffold preview as PNG, rendered off-screen in a worker thread
+    
+    The cached preview geometry is drawn on Agg figures so the Tk thread
+    only polls for progress. Choosing "All views" writes top, side and iso
+    images in a single pass.
+    """
+    geometry = components.get('scaffold_preview_geometry')
+    if geometry is None:
+        messagebox.showerror("Error", "Preview the scaffold before exporting it.")
+        return
+    
     file_path = filedialog.asksaveasfilename(
         defaultextension=".png",
         filetypes=[("PNG Image", "*.png")],
         title="Save Scaffold Preview"
     )
-    if file_path:
+    if not file_path:
+        return
+    
+    # Resolve the requested camera views on the Tk thread
+    ax = components['scaffold_ax']
+    selected_view = components['scaffold_export_view_var'].get()
+    if selected_view == "All views":
+        views = list(PREVIEW_VIEWS.items())
+    elif selected_view in PREVIEW_VIEWS:
+        views = [(selected_view, PREVIEW_VIEWS[selected_view])]
+    elif components['scaffold_view_mode_var'].get() == "Density":
+        views = [("Density", None)]
+    else:
+        views = [("Current", (ax.elev, ax.azim))]
+    
+    file_paths = export_file_paths(file_path, views)
+    show_axes = components['show_axes_var'].get()
+    progress_queue = queue.Queue()
+    
+    def worker():
         try:
-            components['scaffold_fig'].savefig(file_path, dpi=300)
-            messagebox.showinfo("Success", "Preview saved successfully.")
+            render_preview_views(
+                geometry, file_paths, views, show_axes=show_axes,
+                progress=lambda done, total: progress_queue.put(('progress', done / total))
+            )
+            progress_queue.put(('done', file_paths))
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to save preview: {e}")
+            progress_queue.put(('error', e))
+    
+    def poll():
+        finished = False
+        while not progress_queue.empty():
+            kind, value = progress_queue.get()
+            if kind == 'progress':
+                components['scaffold_export_progress'].set(value)
+            elif kind == 'done':
+                finished = True
+                messagebox.showinfo("Success", 
+                                    "Preview saved successfully:\n" + "\n".join(value))
+            else:
+                finished = True
+                messagebox.showerror("Error", f"Failed to save preview: {value}")
+        
+        if finished:
+            components['scaffold_export_button'].configure(state="normal")
+        else:
+            components['root'].after(100, poll)
+    
+    components['scaffold_export_button'].configure(state="disabled")
+    components['scaffold_export_progress'].set(0)
+    threading.Thread(target=worker, daemon=True).start()
+    components['root'].after(100, poll)
 
 
 def copy_to_clipboard(components):
@@ -130,6 +277,82 @@ def copy_to_clipboard(components):
     else:
         messagebox.showerror("Error", "No G-code to copy.")
 
+def simplify_gcode_text(components):
+    """Simplify the program in the G-code box (generated or pasted)"""
+    gcode = components['gcode_text'].get("1.0", ctk.END)
+    if not gcode.strip():
+        messagebox.showerror("Error", "No G-code to simplify.")
+        return
+    
+    try:
+        tolerance = parse_simplify_tolerance(components)
+    except ValueError:
+        tolerance = None
+    if tolerance is None:
+        messagebox.showerror("Error", "Enter a positive simplification tolerance.")
+        return
+    
+    simplified, removed = simplify_gcode(gcode, tolerance)
+    
+    components['gcode_text'].delete("1.0", ctk.END)
+    components['gcode_text'].insert(ctk.END, simplified)
+    components['gcode_stats_label'].configure(
+        text=f"{simplified.count(chr(10))} lines | simplification: {removed} moves removed")
+
+def load_stl_mesh(components):
+    """Choose an STL mesh whose slices become the scaffold outlines"""
+    file_path = filedialog.askopenfilename(
+        filetypes=[("STL files", "*.stl"), ("All files", "*.*")]
+    )
+    if not file_path:
+        return
+    
+    try:
+        triangles = read_stl(file_path)
+    except (OSError, ValueError) as e:
+        messagebox.showerror("Error", f"Failed to load STL: {e}")
+        return
+    
+    size = np.ptp(triangles.reshape(-1, 3), axis=0)
+    components['scaffold_stl_var'].set(file_path)
+    components['scaffold_shape_var'].set("STL")
+    components['scaffold_stl_label'].configure(
+        text=f"{len(triangles)} triangles, {size[0]:.1f} x {size[1]:.1f} x {size[2]:.1f} mm")
+
+def calibrate_plate(components):
+    """
+    Store the calibration of the selected plate on this printer, from the
+    probed corner wells; without positions the calibration is removed
+    """
+    plate = components['template_var'].get()
+    printer = components['printer_name_entry'].get().strip()
+    
+    if not components['calibration_points_entry'].get().strip():
+        save_calibration(printer, plate, None)
+        components['calibration_label'].configure(text=f"{plate}: not calibrated")
+        return
+    
+    try:
+        template = compile_template(plate)
+        properties = template['properties']
+        wells = calibration_wells(properties['rows'], properties['cols'])
+        transform = fit_affine(template['centers'][wells], parse_calibration_points(components))
+    except ValueError as e:
+        messagebox.showerror("Error", f"Calibration failed: {e}")
+        return
+    
+    try:
+        save_calibration(printer, plate, transform)
+    except OSError as e:
+        messagebox.showerror("Error", f"Failed to save the calibration: {e}")
+        return
+    
+    parameters = affine_parameters(transform)
+    components['calibration_label'].configure(
+        text=(f"{plate} on {printer} ({', '.join(template['labels'][wells])}): "
+              + "offset {:.3f}, {:.3f} mm".format(*parameters['offset'])
+              + f", rotation {parameters['rotation']:.3f}°, skew {parameters['skew']:.3f}°"))
+
 def toggle_dark_mode():
     """Toggle between light and dark mode"""
     if ctk.get_appearance_mode() == "Light":
@@ -348,272 +571,22 @@ def on_tab_change(components):
 
 def preview_scaffold(components):
     try:
-        pattern = components['scaffold_pattern_var'].get()
-        size_x = float(components['scaffold_size_x_entry'].get())
-        size_y = float(components['scaffold_size_y_entry'].get())
-        infill = float(components['scaffold_infill_entry'].get())
-        wall_thickness = float(components['scaffold_noozle_entry'].get())
-        layer_height = float(components['scaffold_layer_height_entry'].get())
-        size_z = float(components['layer_number_entry'].get()) * layer_height
+        geometry = build_preview_geometry(components)
     except ValueError:
         messagebox.showerror("Error", "Please enter valid numeric values")
         return
     
-    # Clear previous plot
-    ax = components['scaffold_ax']
-    ax.clear()
-    plot_origin(ax)
-    plot_perimeter(ax, size_x, size_y, size_z, layer_height)
-    if pattern.lower() == 'striped': plot_stripe_infill(ax, components)
-    elif pattern.lower() == 'grid': plot_grid_infill(ax, components)
-    elif pattern.lower() == 'honeycomb':
-        print('hi')
-        plot_honeycomb_infill(ax, components)
-    
-    if components['show_axes_var'].get():
-        ax.set_xlabel("X (mm)")
-        ax.set_ylabel("Y (mm)")
-        ax.set_zlabel("Z (mm)")
-        ax.grid(True)
-        ax.set_axis_on()
+    # Keep the geometry so exports can be rendered off-screen later
+    components['scaffold_preview_geometry'] = geometry
+    
+    # Clear previous plot, a 3D view or a top-down density map
+    fig = components['scaffold_fig']
+    fig.clear()
+    if components['scaffold_view_mode_var'].get() == "Density":
+        ax = fig.add_subplot(111)
+        draw_density_map(fig, ax, geometry)
     else:
-        ax.set_xlabel("")
-        ax.set_ylabel("")
-        ax.set_zlabel("")
-        ax.grid(False)
-        ax.set_axis_off()
+        ax = fig.add_subplot(111, projection='3d')
+        draw_preview_geometry(ax, geometry, show_axes=components['show_axes_var'].get())
+    components['scaffold_ax'] = ax
     components['scaffold_canvas'].draw()
-
-def plot_origin(ax):
-    
-    ax.scatter(0.,0.,0., color = 'black', marker='x', s=20)
-
-def plot_perimeter(ax, size_x, size_y, size_z, layer_height, cmap='plasma',
-                   steps_per_segment = 5):
-    
-    from mpl_toolkits.mplot3d.art3d import Line3DCollection
-    from matplotlib import cm
-    from matplotlib.colors import Normalize
-
-    x0 = size_x / 2
-    y0 = size_y / 2
-
-    points = [
-        [x0, y0],
-        [x0 - size_x, y0],
-        [x0 - size_x, y0 - size_y],
-        [x0, y0 - size_y],
-        [x0, y0]
-    ]
-
-    segments = []
-    colors = []
-
-    total_segments = (len(points) - 1) * int(size_z / layer_height) * steps_per_segment
-    color_norm = Normalize(0, total_segments)
-    cmap_func = cm.get_cmap(cmap)
-
-    segment_index = 0
-    for z in np.arange(0, size_z, layer_height):
-        for i in range(len(points) - 1):
-            p1 = np.array([*points[i], z])
-            p2 = np.array([*points[i + 1], z])
-
-            # Interpolate small steps along this segment
-            for t in np.linspace(0, 1, steps_per_segment + 1)[:-1]:
-                start = p1 * (1 - t) + p2 * t
-                end = p1 * (1 - (t + 1 / steps_per_segment)) + p2 * (t + 1 / steps_per_segment)
-                segments.append([start, end])
-                colors.append(cmap_func(color_norm(segment_index)))
-                segment_index += 1
-
-    collection = Line3DCollection(segments, colors=colors, linewidth=3)
-    ax.add_collection3d(collection)
-
-    # Set plot limits
-    all_x = [p[0] for p in points]
-    all_y = [p[1] for p in points]
-    ax.set_xlim(min(all_x) - 10, max(all_x) + 10)
-    ax.set_ylim(min(all_y) - 10, max(all_y) + 10)
-    ax.set_zlim(0, size_z + 5)
-
-def plot_stripe_infill(ax, components, cmap = 'plasma', steps_per_segment = 5):
-    
-    from mpl_toolkits.mplot3d.art3d import Line3DCollection
-    from matplotlib import cm
-    from matplotlib.colors import Normalize
-        
-    lines, delta = calculate_lines(components)
-    dimensions, origin, extrusion = calculate_geometric_parameters(components)
-    
-    extrusion = float(components['scaffold_extrusion_entry'].get())
-    layer_height = float(components['scaffold_layer_height_entry'].get())
-    size_z = float(components['layer_number_entry'].get()) * layer_height
-    
-    xi , yi = origin
-    
-    color_norm = Normalize(0, (lines - 1))
-    cmap_func = cm.get_cmap(cmap)
-    
-    for index in range(lines - 1):
-        
-        xi -= delta
-        segments = []
-        colors = []
-
-        for z in np.arange(0, size_z, layer_height):
-            segment_index = 0
-            # Interpolate small steps along this segment
-            for t in np.linspace(0, 1, steps_per_segment + 1)[:-1]:
-                p1 = np.array([xi, yi, z])
-                p2 = np.array([xi, -yi, z])
-                start = p1 * (1 - t) + p2 * t
-                end = p1 * (1 - (t + 1 / steps_per_segment)) + p2 * (t + 1 / steps_per_segment)
-                segments.append([start, end])
-                colors.append(cmap_func(color_norm(segment_index)))
-                segment_index += 1
-            
-        collection = Line3DCollection(segments, colors=cmap_func(color_norm(index)), linewidth=extrusion)
-        ax.add_collection3d(collection)
-        
-def plot_grid_infill(ax, components, cmap = 'plasma', steps_per_segment = 5):
-    
-    from mpl_toolkits.mplot3d.art3d import Line3DCollection
-    from matplotlib import cm
-    from matplotlib.colors import Normalize
-    
-    lines, delta = calculate_lines(components, pattern = 'grid')
-    dimensions, origin, extrusion = calculate_geometric_parameters(components)
-    
-    xi , yi = origin
-    
-    extrusion = 0.5
-    layer_height = float(components['scaffold_layer_height_entry'].get())
-    size_z = float(components['layer_number_entry'].get()) * layer_height
-    
-    color_norm = Normalize(0, (lines - 1))
-    cmap_func = cm.get_cmap(cmap)
-    
-    for index in range(lines - 1):
-        
-        xi -= delta
-        segments = []
-        colors = []
-
-        for z in np.arange(0, size_z, layer_height):
-            segment_index = 0
-            # Interpolate small steps along this segment
-            for t in np.linspace(0, 1, steps_per_segment + 1)[:-1]:
-                p1 = np.array([xi, yi, z])
-                p2 = np.array([xi, -yi, z])
-                start = p1 * (1 - t) + p2 * t
-                end = p1 * (1 - (t + 1 / steps_per_segment)) + p2 * (t + 1 / steps_per_segment)
-                segments.append([start, end])
-                segment_index += 1
-                
-        collection = Line3DCollection(segments, colors=cmap_func(color_norm(index)), linewidth=extrusion)
-        ax.add_collection3d(collection)
-        
-    xi , yi = origin
-        
-    for index in range(lines - 1):
-        
-        yi -= delta
-        segments = []
-        colors = []
-        
-        for z in np.arange(0, size_z, layer_height):
-            segment_index = 0
-            # Interpolate small steps along this segment
-            for t in np.linspace(0, 1, steps_per_segment + 1)[:-1]:
-                p1 = np.array([xi, yi, z])
-                p2 = np.array([-xi, yi, z])
-                start = p1 * (1 - t) + p2 * t
-                end = p1 * (1 - (t + 1 / steps_per_segment)) + p2 * (t + 1 / steps_per_segment)
-                segments.append([start, end])
-                colors.append(cmap_func(color_norm(segment_index)))
-                segment_index += 1
-                
-        collection = Line3DCollection(segments, colors=colors, linewidth=extrusion)
-        ax.add_collection3d(collection)
-    
-def plot_honeycomb_infill(ax, components, cmap='plasma'):
-    from mpl_toolkits.mplot3d.art3d import Line3DCollection
-    from matplotlib import cm
-    from matplotlib.colors import Normalize
-    
-    lines, delta = calculate_lines(components, pattern='honeycomb')
-    dimensions, origin, extrusion = calculate_geometric_parameters(components)
-    
-    xi, yi = origin
-    extrusion_width = float(components['scaffold_extrusion_entry'].get())
-    layer_height = float(components['scaffold_layer_height_entry'].get())
-    layers = int(float(components['layer_number_entry'].get()))
-    
-    # Honeycomb parameters
-    hex_spacing = delta
-    hex_radius = hex_spacing / np.sqrt(3)
-    hex_side = hex_spacing / np.sqrt(3)
-    
-    # Calculate bounds with extrusion margin
-    x_min = -dimensions[0]/2 + extrusion/2
-    x_max = dimensions[0]/2 - extrusion/2
-    y_min = -dimensions[1]/2 + extrusion/2
-    y_max = dimensions[1]/2 - extrusion/2
-    
-    color_norm = Normalize(0, layers-1)
-    cmap_func = cm.get_cmap(cmap)
-    
-    for layer in range(layers):
-        z = layer * layer_height
-        row_offset = layer % 2
-        segments = []
-        
-        # Calculate number of complete hexagons that fit
-        rows = int((y_max - y_min) / (1.5 * hex_side)) + 1
-        cols = int((x_max - x_min) / (hex_side * np.sqrt(3))) + 1
-        
-        for row in range(-rows, rows+1):
-            for col in range(-cols, cols+1):
-                # Calculate center position with offset for even rows
-                x_center = col * hex_side * np.sqrt(3)
-                if row % 2 == 1:
-                    x_center += hex_side * np.sqrt(3)/2
-                y_center = row * 1.5 * hex_side
-                
-                # Skip if center is outside bounds
-                if not (x_min <= x_center <= x_max and y_min <= y_center <= y_max):
-                    continue
-                
-                # Generate hexagon vertices
-                vertices = []
-                for i in range(6):
-                    angle = np.radians(60 * i + 30)
-                    x = x_center + hex_radius * np.cos(angle)
-                    y = y_center + hex_radius * np.sin(angle)
-                    vertices.append((x, y, z))
-                
-                # Only draw 3 sides per hexagon
-                sides_to_draw = [(0,1), (1,2), (2,3)] if layer % 2 == 0 else [(3,4), (4,5), (5,0)]
-                
-                for start, end in sides_to_draw:
-                    x1, y1, z1 = vertices[start]
-                    x2, y2, z2 = vertices[end]
-                    
-                    # Clip to boundaries
-                    x1_clip = max(x_min, min(x_max, x1))
-                    y1_clip = max(y_min, min(y_max, y1))
-                    x2_clip = max(x_min, min(x_max, x2))
-                    y2_clip = max(y_min, min(y_max, y2))
-                    
-                    # Skip if line segment is completely outside
-                    if (x1_clip == x2_clip and y1_clip == y2_clip):
-                        continue
-                    
-                    segments.append([(x1_clip, y1_clip, z1), (x2_clip, y2_clip, z2)])
-        
-        # Create collection
-        collection = Line3DCollection(segments, 
-                                     colors=cmap_func(color_norm(layer)),
-                                     linewidth=extrusion_width)
-        ax.add_collection3d(collection)
\ No newline at end of file
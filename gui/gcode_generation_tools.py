@@ -6,16 +6,46 @@ GCODE generation functions
 @author: Maria Teresa Alameda Felgueiras
 """
 
+import re
 import numpy as np
 import customtkinter as ctk
 from ..core.gcode import GCODE as GC
 from ..core.gcode import clean_printhead
-from ..core.templates import set_template
-from .validation import validate_inputs
+from ..core.templates import set_template, compile_template, well_mask
+from ..core.parallel import generate_layers
+from ..core.toolpaths import (layer_angles, rectangle_outline, perimeter_shells,
+                              infill_gradient, layer_gradient, perimeter_center,
+                              circle_outline, polygon_outline, infill_boundary,
+                              TPMS_CONTOUR_DENSITY)
+from ..core.mesh import read_stl, place_mesh, slice_mesh
+from ..core.plate import plate_order, relative_program, replicate_in_wells
+from ..core.scheduling import (layer_jobs, schedule_tools, well_tools, schedule_wells,
+                               schedule_setpoints, PRINTHEADS)
+from ..core.estimator import estimate_print_time, settling_time
+from ..core.gcode_parser import parse_moves
+from ..core.workspace import check_program, workspace_message
+from ..core.printheads import WELL_BLOCKS
+from ..core.calibration import load_calibration, apply_affine, affine_parameters
+from ..utils.constants import PLATE_TRAVEL_HEIGHT
 
 
 def generate_scaffold_gcode(components):
+    """Generate the scaffold program and show it"""
+    gcode, stats = scaffold_program(components)
+    show_generation_stats(components, stats)
     
+    # Display generated G-code
+    components['gcode_text'].delete("1.0", ctk.END)
+    components['gcode_text'].insert(ctk.END, gcode)
+
+def scaffold_program(components):
+    """
+    Scaffold program of the current settings
+    
+    Returns:
+        str: Program text
+        dict: Generation statistics (see show_generation_stats)
+    """
     printhead_type = components['printhead_type'].get()
     printhead_number = int(components['printhead_number'].get())
     extrusion = 1
@@ -27,48 +57,169 @@ def generate_scaffold_gcode(components):
     layers = int(components['layer_number_entry'].get())
         
     dimensions, origin, extrusion = calculate_geometric_parameters(components)
-    lines, delta = calculate_lines(components)
+    lines, delta = calculate_lines(components, pattern = pattern)
+    angles = layer_angles(parse_infill_angles(components), layers)
+    spacings = calculate_layer_spacings(components, delta, layers, pattern = pattern)
+    shells = parse_perimeter_shells(components)
+    outline = calculate_outline(components)
+    boundary = calculate_infill_boundary(components)
+    arc_tolerance = parse_arc_tolerance(components)
+    simplify_tolerance = parse_simplify_tolerance(components)
+    stats = {'replaced': 0, 'arcs': 0, 'simplified': 0}
+    
+    # Perimeter and infill printheads of every layer
+    jobs = layer_jobs(parse_printheads(components, 'scaffold_perimeter_tools_entry', printhead_number),
+                      parse_printheads(components, 'scaffold_infill_tools_entry', printhead_number),
+                      layers)
+    pressures = parse_printhead_pressures(components, pressure)
+        
+    settings = {'pattern': pattern, 'height': height, 'speed': speed,
+                'dimensions': dimensions, 'origin': origin, 'extrusion': extrusion,
+                'lines': lines, 'shells': shells, 'outline': outline,
+                'boundary': boundary, 'spacings': spacings, 'angles': angles,
+                'arc_tolerance': arc_tolerance,
+                'simplify_tolerance': simplify_tolerance}
+    
+    # STL shapes: every layer has its own sliced outline and boundary
+    outlines = calculate_layer_outlines(components, layers)
+    if outlines is not None:
+        settings['outlines'] = outlines
+        settings['boundaries'] = calculate_layer_boundaries(components, outlines)
+        jobs = [layer if outline else [] for layer, outline in zip(jobs, outlines)]
+    
+    # Work grouped per printhead; all default pressures are set once here
+    settings['schedule'], stats['tool_changes'] = schedule_tools(jobs)
+    tools = sorted({tool for layer in jobs for _, tool in layer}) or [printhead_number]
+    first = next((tool for layer in settings['schedule'] for _, tool, _ in layer), tools[0])
+    if components['scaffold_clean_var'].get():
+        settings['cleaning'] = {'speed': components['printhead_speed_entry'].get(),
+                                'bed_position': float(components['bed_zpos_entry'].get())}
     
     gcode = GC.initialize(printhead_type_value = printhead_type, pattern = pattern)
     
-    gcode = GC.set_printhead(gcode, printhead_number, z = height)
+    gcode = GC.set_printhead(gcode, first, z = height)
     
-    gcode = GC.set_default_pressure(gcode, pressure)
-        
-    for layer in range(layers):
-        
-        layer_height = (layer + 1) * height
-        gcode = GC.introduce_comment(gcode, f"Printing layer at height {layer_height} mm")
-        
-        gcode = GC.move_to_position(gcode, z = layer_height + 1, speed = 3000, precise = 1)
-        gcode = GC.move_to_position(gcode, x = origin[0], y = origin[1], speed = 3000, precise = 1)
-        gcode = GC.move_to_position(gcode, z = layer_height, speed = 3000, precise = 1)
-                
-        gcode = GC.generate_scafold_perimeter(gcode, dimensions, origin, extrusion, layer_height,
-                                              speed = speed)
-        
-        gcode = GC.move_to_position(gcode, z = layer_height + 1, speed = 3000, precise = 1)
-        
-        if pattern.lower() == 'striped':
-            gcode = GC.generate_striped_scaffold(gcode, dimensions, origin,
-                                             delta, lines, layer_height, speed = speed)
-        elif pattern.lower() == 'grid':
-             gcode = GC.generate_grid_scaffold(gcode, dimensions, origin,
-                                              delta, lines, layer_height, speed = speed)
-        else:
-            pass
-        
+    for tool in tools:
+        gcode = GC.set_default_pressure(gcode, pressures.get(tool, pressure), tool)
+    
+    plate = components['scaffold_plate_var'].get()
+    properties, transform = None, None
+    if plate == "None":
+        # Layers are independent, tall scaffolds are generated in parallel
+        gcode = generate_layers(gcode, settings, layers, stats = stats)
+    else:
+        properties = compile_template(plate)['properties']
+        transform = plate_calibration(components, plate)
+        gcode = replicate_scaffold(gcode, plate, settings, layers, stats,
+                                   transform = transform)
     
     gcode = GC.terminate(gcode, components)
     
+    stats['lines'] = gcode.count("\n")
+    moves = parse_moves(gcode)
+    stats['time'] = estimate_print_time(gcode, moves = moves)
+    stats['workspace'] = check_program(gcode, properties, transform, moves = moves)
+    return gcode, stats
+
+def replicate_scaffold(gcode, plate, settings, layers, stats, transform = None):
+    """
+    Print the scaffold into every well of a plate template
+    
+    The layers are generated once around the origin, rewritten as relative
+    moves and stamped at every well centre, visited in a travel-optimized
+    order. Multi-material wells start by loading the first printhead again
+    when the previous well ended with another one. The statistics count all
+    wells. A plate calibration 'transform' moves the well centres and
+    turns the stamped scaffold with the plate.
+    """
+    # The cleaning station is at a fixed position, stamped moves are relative
+    if 'cleaning' in settings:
+        raise ValueError("Cleaning on tool change is not available for plate scaffolds")
+    
+    properties, gcode = set_template(plate, gcode)
+    template = compile_template(plate)
+    travel_height = max(PLATE_TRAVEL_HEIGHT, (layers + 1) * settings['height'] + 1)
+    
+    body = generate_layers("", settings, layers, stats = stats)
+    
+    tools = [tool for layer in settings['schedule'] for _, tool, _ in layer]
+    reload = bool(tools) and tools[-1] != tools[0]
+    if reload:
+        body = GC.change_printhead("", tools[0]) + body
+    
+    linear = None if transform is None else transform[:, :2]
+    body, end = relative_program(body, (0., 0., travel_height), linear = linear)
+    
+    centers, index = template['centers'], template['index']
+    if transform is not None:
+        gcode = introduce_calibration(gcode, transform)
+        centers = apply_affine(transform, centers)
+    order = plate_order(centers, index, shift = end[:2])
+    for key in ('replaced', 'arcs', 'simplified', 'tool_changes'):
+        stats[key] *= len(order)
+    stats['tool_changes'] += reload * (len(order) - 1)
+    
+    gcode += f"; Scaffold replicated into {len(order)} wells\n\n"
+    return gcode + replicate_in_wells(body, centers, index, order, travel_height)
+
+def show_generation_stats(components, stats):
+    """
+    Keep the statistics of the last program and summarize them in the GUI
+    
+    Simplification removed 'simplified' points, arc fitting replaces
+    'replaced' moves by 'arcs' G2/G3 moves; the line reduction is relative
+    to the program without arcs. 'time' is the print time estimate, with
+    the overhead of the printhead and temperature changes; 'settling_saved'
+    the settling time saved by ordering a temperature sweep. Droplet
+    programs count the well blocks served from the cache ('cache_hits')
+    and formatted ('cache_misses'). 'workspace' lists the moves leaving the
+    printer travel or the plate (see check_workspace).
+    """
+    components['generation_stats'] = stats
+    
+    text = f"{stats['lines']} lines"
+    if stats.get('simplified'):
+        text += f" | simplification: {stats['simplified']} points removed"
+    if stats.get('arcs'):
+        saved = stats['replaced'] - stats['arcs']
+        text += (f" | arc fitting: {stats['replaced']} moves -> {stats['arcs']} arcs,"
+                 f" {saved} fewer lines ({100 * saved / (stats['lines'] + saved):.1f} %)")
+    if 'time' in stats:
+        text += f" | estimated time: {stats['time']['total'] / 60:.1f} min"
+        if stats['time']['tool_changes']:
+            text += (f", {stats['time']['tool_changes']} tool changes"
+                     f" (+{stats['time']['overhead'] / 60:.1f} min)")
+        if stats['time']['temperature_changes']:
+            text += (f", {stats['time']['temperature_changes']} temperature changes"
+                     f" (+{stats['time']['settling'] / 60:.1f} min)")
+    if stats.get('settling_saved'):
+        text += f" | temperature order: {stats['settling_saved'] / 60:.1f} min settling saved"
+    if 'cache_hits' in stats:
+        text += (f" | well block cache: {stats['cache_hits']} hits,"
+                 f" {stats['cache_misses']} misses")
+    if stats.get('workspace') and workspace_message(stats['workspace']):
+        text += f" | WARNING: {workspace_message(stats['workspace'])}"
+    
+    if 'gcode_stats_label' in components:
+        components['gcode_stats_label'].configure(text=text)
+
+def generate_droplet_gcode(components):
+    """Generate the droplet program and show it"""
+    gcode, stats = droplet_program(components)
+    show_generation_stats(components, stats)
+    
     # Display generated G-code
     components['gcode_text'].delete("1.0", ctk.END)
     components['gcode_text'].insert(ctk.END, gcode)
 
-def generate_droplet_gcode(components):
-    
-    """Generate G-code based on current settings"""
-        
+def droplet_program(components):
+    """
+    Droplet program of the current settings
+    
+    Returns:
+        str: Program text
+        dict: Generation statistics (see show_generation_stats)
+    """
     # Printhead-specific settings
     printhead_type_value = components['printhead_type'].get()
     printhead_number = int(components['printhead_number'].get())
@@ -84,14 +235,20 @@ def generate_droplet_gcode(components):
     
     # Get selected template
     template_properties, gcode = set_template(components['template_var'].get(), gcode)
+    template = compile_template(components['template_var'].get())
     rows = template_properties['rows']
     cols = template_properties['cols']
-    well_spacing_x = template_properties['well_spacing_x']
-    well_spacing_y = template_properties['well_spacing_y']
     
-    # Calculate starting position to center the plate
-    start_x = 0.
-    start_y = 0.
+    # Selected wells grouped per printhead, the first group is printed first
+    groups = schedule_droplet_wells(components, template, printhead_number)
+    
+    # Well centres on the bed, moved by the plate calibration
+    centers = template['centers']
+    transform = plate_calibration(components, components['template_var'].get())
+    if transform is not None:
+        gcode = introduce_calibration(gcode, transform)
+        centers = apply_affine(transform, centers)
+    printhead_number = groups[0][0]
            
     gcode = GC.set_printhead(gcode, printhead=printhead_number)
     
@@ -117,9 +274,124 @@ def generate_droplet_gcode(components):
     if not pressure_sweep: 
         gcode = GC.set_default_pressure(
             gcode,
-            float(components['pressure_entry'].get())
+            float(components['pressure_entry'].get()),
+            printhead_number
             )
     
+    # Per-well parameters of the sweeps
+    pressures, temperatures, extrusion_times = droplet_parameters(components, rows, cols)
+
+    pressures = np.asarray(pressures, dtype=float)
+    extrusion_times = np.asarray(extrusion_times, dtype=float)
+    layer_height = float(components['layer_height_entry'].get())
+    
+    # Temperature sweeps: every printhead visits its setpoints monotonically
+    stats = {}
+    if temperature_sweep:
+        groups, stats['settling_saved'] = schedule_temperature_sweep(template, groups, temperatures)
+
+    # Generate G-code for printing over the wells
+    hits, misses = WELL_BLOCKS.counts()
+    gcode = GC.set_printhead_speed(gcode, components['printhead_speed_entry'].get())
+    
+    if clean_printhead_bool:
+        gcode = clean_printhead(
+            gcode, 
+            printhead_number,
+            components['printhead_speed_entry'].get(),
+            bed_movement_position
+        )
+           
+    for group, (printhead_number, wells) in enumerate(groups):
+        
+        # Printhead changes only between groups
+        if group > 0:
+            gcode = GC.introduce_comment(gcode, f"Changing to printhead {printhead_number}")
+            gcode = GC.set_printhead(gcode, printhead=printhead_number)
+            
+            if not any_sweep_active and components['control_phtemperature_var'].get():
+                gcode = GC.set_printhead_temperature(
+                    gcode, 
+                    float(components['phtemp_entry'].get()),
+                    printhead_number
+                )
+            
+            if not pressure_sweep:
+                gcode = GC.set_default_pressure(
+                    gcode,
+                    float(components['pressure_entry'].get()),
+                    printhead_number
+                    )
+            
+            if clean_printhead_bool:
+                gcode = clean_printhead(
+                    gcode, 
+                    printhead_number,
+                    components['printhead_speed_entry'].get(),
+                    bed_movement_position
+                )
+        
+        # Extrusion blocks of the whole group, repeated parameters from the cache
+        blocks = GC.extrusion_blocks(
+            printhead_type_value,
+            printhead_number,
+            pressures[wells],
+            extrusion_times[wells],
+            layer_height,
+            bed_movement_position,
+            components['printhead_speed_entry'].get(),
+            cache=WELL_BLOCKS
+        )
+        
+        # Moves to the wells from the template arrays, joined once per group
+        moves = GC.well_moves(
+            centers[wells],
+            template['index'][wells],
+            components['printhead_speed_entry'].get()
+        )
+        
+        setpoint = None
+        parts = []
+        for counter, move, block in zip(wells.tolist(), moves, blocks):
+            parts.append(move)
+            
+            # Update temperature if doing temperature sweep and the setpoint changes
+            if (temperature_sweep and temperatures[counter] is not None
+                    and temperatures[counter] != setpoint):
+                setpoint = temperatures[counter]
+                parts.append(GC.set_printhead_temperature("", setpoint, printhead_number))
+                parts.append("M400 ; wait for temperature change\n")
+            
+            # Extrude material in the well
+            parts.append(block)
+        gcode += "".join(parts)
+
+    # Introduce termination commands
+    gcode = GC.terminate(gcode, components, any_sweep_active=any_sweep_active)
+    
+    stats['cache_hits'] = WELL_BLOCKS.hits - hits
+    stats['cache_misses'] = WELL_BLOCKS.misses - misses
+    stats['lines'] = gcode.count("\n")
+    moves = parse_moves(gcode)
+    stats['time'] = estimate_print_time(gcode, moves = moves)
+    stats['workspace'] = check_program(gcode, template_properties, transform, moves = moves)
+    return gcode, stats
+    
+def droplet_parameters(components, rows, cols):
+    """
+    Pressure, printhead temperature and extrusion time of every well
+    
+    Sweeps run from their initial to their final value along the rows,
+    columns or wells; the other parameters are constant. Temperatures are
+    None when the printhead temperature is not controlled.
+    
+    Returns:
+        tuple: (pressures, temperatures, extrusion_times), row by row
+    """
+    pressure_sweep = components['pressure_sweep_var'].get()
+    temperature_sweep = components['temperature_sweep_var'].get()
+    extrusion_time_sweep = components['extrusion_time_sweep_var'].get()
+    
     # Generate sweep arrays based on direction
     if pressure_sweep:
         initial_pressure = float(components['pressure_initial_entry'].get())
@@ -176,111 +448,61 @@ def generate_droplet_gcode(components):
         pressures = [float(components['pressure_entry'].get())] * (rows*cols)
         temperatures = [float(components['phtemp_entry'].get())] * (rows*cols) if components['control_phtemperature_var'].get() else [None] * (rows*cols)
         extrusion_times = [float(components['extrusion_time_entry'].get())] * (rows*cols)
-
-    # Generate G-code for printing over the wells
-    gcode = GC.set_printhead_speed(gcode, components['printhead_speed_entry'].get())
     
-    if clean_printhead_bool:
-        gcode = clean_printhead(
-            gcode, 
-            printhead_number,
-            components['printhead_speed_entry'].get(),
-            bed_movement_position
-        )
-           
-    counter = 0
-    for row in range(rows):
-        for col in range(cols):
-            x = start_x + col * well_spacing_x
-            y = start_y + row * well_spacing_y
-            z = float(components['layer_height_entry'].get())
-
-            gcode = GC.move_to_position(
-                gcode, 
-                x, 
-                y,
-                speed=components['printhead_speed_entry'].get(), 
-                row=row, 
-                col=col
-            )
-            
-            # Update temperature if doing temperature sweep and temperature is specified
-            if temperature_sweep and temperatures[counter] is not None:
-                gcode = GC.set_printhead_temperature(
-                    gcode, 
-                    temperatures[counter], 
-                    printhead_number
-                )
-                gcode += "M400 ; wait for temperature change\n"
-            
-            # Extrude material in the well
-            if printhead_type_value == "EMD":
-                gcode = GC.move_bed(
-                    gcode, 
-                    z=0, 
-                    speed=components['printhead_speed_entry'].get()
-                )
-                gcode = GC.emd_extrusion(
-                    gcode,
-                    printhead_number,
-                    float(pressures[counter]),
-                    float(extrusion_times[counter])
-                )
-                gcode = GC.move_bed(
-                    gcode, 
-                    z=bed_movement_position, 
-                    speed=components['printhead_speed_entry'].get()
-                )
-                
-            elif printhead_type_value == "Pneumatic":
-                gcode = GC.move_bed(
-                    gcode, 
-                    z, 
-                    speed=components['printhead_speed_entry'].get()
-                )
-                gcode = GC.pneumatic_extrusion(
-                    gcode,
-                    printhead_number,
-                    float(pressures[counter]),
-                    float(extrusion_times[counter])
-                )
-                gcode = GC.move_bed(
-                    gcode, 
-                    z=bed_movement_position, 
-                    speed=components['printhead_speed_entry'].get()
-                )
-            
-            elif printhead_type_value == "Thermo-controlled":
-                gcode = GC.move_bed(
-                    gcode, 
-                    z, 
-                    speed=components['printhead_speed_entry'].get()
-                )
-                gcode = GC.thermo_extrusion(
-                    gcode,
-                    printhead_number,
-                    float(pressures[counter]),
-                    float(extrusion_times[counter])
-                )
-                gcode = GC.move_bed(
-                    gcode, 
-                    z=bed_movement_position, 
-                    speed=components['printhead_speed_entry'].get()
-                )
-                
-            elif printhead_type_value == "Syringe Pump":
-                gcode += f"G1 E{10 * float(extrusion_times[counter])} F100 ; Extrude material\n"
-            
-            counter += 1
+    return pressures, temperatures, extrusion_times
 
-    # Introduce termination commands
-    gcode = GC.terminate(gcode, components, any_sweep_active=any_sweep_active)
+def schedule_droplet_wells(components, template, printhead_number):
+    """
+    Printhead groups of the selected wells of a droplet plate
+    
+    'Wells' (e.g. "A1:H12, P24", empty for all) selects the wells to print.
+    'Well printheads' (e.g. "0, 1") are cycled along the rows, columns or
+    wells of the plate; every printhead prints all its wells in a short
+    travel order before the next one is loaded. Without them the selected
+    printhead prints every selected well, row by row.
+    
+    Returns:
+        list: (printhead, wells) groups in printing order, 'wells' the
+              row-major well indices in visiting order
+    """
+    properties = template['properties']
+    selected = np.flatnonzero(well_mask(template, components['well_selection_entry'].get()))
+    if not len(selected):
+        raise ValueError("No wells selected")
+    
+    if not components['well_printheads_entry'].get().strip():
+        return [(printhead_number, selected)]
+    
+    tools = parse_printheads(components, 'well_printheads_entry', printhead_number)
+    tools = well_tools(tools, properties['rows'], properties['cols'],
+                       components['well_printheads_dir'].get())
+    
+    groups = schedule_wells(template['centers'][selected], template['index'][selected],
+                            tools[selected], tool = printhead_number)
+    return [(printhead, selected[wells]) for printhead, wells in groups]
+
+def schedule_temperature_sweep(template, groups, temperatures):
+    """
+    Reorder the wells of every printhead group to visit the sweep setpoints
+    monotonically, warming up (sweeps always rise, see check_sweep)
+    
+    Returns:
+        list: (printhead, wells) groups in printing order
+        float: Settling time saved in seconds against the previous order
+    """
+    centers, index = template['centers'], template['index']
+    temperatures = np.asarray(temperatures, dtype=float)
+    
+    scheduled, saved = [], 0.
+    start = (0., 0.)
+    for printhead, wells in groups:
+        ordered = schedule_setpoints(centers, index, wells, temperatures, start = start)
+        saved += settling_time(temperatures[wells]) - settling_time(temperatures[ordered])
+        scheduled.append((printhead, ordered))
+        start = centers[ordered[-1]]
+    
+    return scheduled, saved
 
-    # Display generated G-code
-    components['gcode_text'].delete("1.0", ctk.END)
-    components['gcode_text'].insert(ctk.END, gcode)
-    
-    
 def calculate_geometric_parameters(components):
     
     deltax = float(components['scaffold_size_x_entry'].get())
@@ -295,6 +517,236 @@ def calculate_geometric_parameters(components):
     
     return dimensions, origin, extrusion
 
+def parse_infill_angles(components):
+    """
+    Infill angles (degrees from X) cycled over the layers, e.g. "0, 45, 90, 135"
+    
+    Returns:
+        list: Angles as floats, [90.] (lines parallel to Y) when empty
+    """
+    text = components['scaffold_angles_entry'].get().replace(';', ',')
+    angles = [float(value) for value in text.split(',') if value.strip()]
+    
+    return angles if angles else [90.]
+
+def parse_arc_tolerance(components):
+    """Arc fitting tolerance in mm, None (straight moves only) when empty or 0"""
+    text = components['scaffold_arc_tolerance_entry'].get().strip()
+    
+    return float(text) if text and float(text) > 0 else None
+
+def parse_simplify_tolerance(components):
+    """Path simplification tolerance in mm, None (off) when empty or 0"""
+    text = components['scaffold_simplify_tolerance_entry'].get().strip()
+    
+    return float(text) if text and float(text) > 0 else None
+
+def parse_printheads(components, key, default):
+    """
+    Printheads (0-2) cycled over the layers, e.g. "0, 1"
+    
+    Returns:
+        list: Printhead numbers, [default] when empty
+    """
+    text = components[key].get().replace(';', ',')
+    tools = [int(value) for value in text.split(',') if value.strip()]
+    
+    if any(tool not in PRINTHEADS for tool in tools):
+        raise ValueError("Printhead numbers must be between 0 and 2")
+    
+    return tools if tools else [default]
+
+class PlateSetting:
+    """Fixed value standing in for a widget in the settings of one plate"""
+    def __init__(self, value):
+        self.value = value
+    
+    def get(self):
+        return self.value
+
+def parse_plate_runs(components):
+    """
+    Settings of the plates of a run, e.g. "pressure=100; pressure=120, well_selection=A1:H6"
+    
+    Plates are separated by ';', every plate lists the settings it changes
+    by widget name, with or without the '_entry'/'_var' ending. A number
+    alone is that many plates with the current settings. All plates but the
+    last keep the motors on.
+    
+    Returns:
+        list: (label, components) of every plate
+    """
+    text = components['plate_runs_entry'].get().strip()
+    if text.isdigit():
+        plates = [""] * int(text)
+    else:
+        plates = [plate.strip() for plate in text.split(';')]
+    if not plates:
+        raise ValueError("A run needs at least one plate")
+    
+    runs = []
+    for number, plate in enumerate(plates, 1):
+        settings = dict(components)
+        if number < len(plates):
+            settings['terminate_operation_checkbox'] = PlateSetting(False)
+        
+        # Settings are split before every "name=", so values may contain commas
+        for setting in re.split(r',\s*(?=\w+\s*=)', plate) if plate else []:
+            name, _, value = (part.strip() for part in setting.partition('='))
+            key = next((key for key in (name, name + '_entry', name + '_var')
+                        if key in components), None)
+            if key is None or not _:
+                raise ValueError(f"Unknown plate setting: {setting}")
+            if isinstance(components[key].get(), bool):
+                value = value.lower() in ('1', 'true', 'yes', 'on')
+            settings[key] = PlateSetting(value)
+        runs.append((plate or "current settings", settings))
+    
+    return runs
+
+def parse_calibration_points(components):
+    """
+    Probed centres of the calibration wells, e.g. "0.2,0.1; 99.3,0.5; -0.1,63.2"
+    
+    Returns:
+        ndarray: (3, 2) positions in mm
+    """
+    text = components['calibration_points_entry'].get()
+    points = [[float(value) for value in point.split(',')]
+              for point in text.split(';') if point.strip()]
+    if len(points) != 3 or any(len(point) != 2 for point in points):
+        raise ValueError("Enter the X,Y positions of three wells, separated by ';'")
+    return np.array(points)
+
+def plate_calibration(components, plate):
+    """Stored calibration transform of the printer and plate, None when not calibrated"""
+    return load_calibration(components['printer_name_entry'].get().strip(), plate)
+
+def introduce_calibration(gcode, transform):
+    """Comment the plate calibration applied to the wells"""
+    parameters = affine_parameters(transform)
+    return GC.introduce_comment(
+        gcode,
+        "Plate calibration: offset X{:.3f} Y{:.3f}, ".format(*parameters['offset'])
+        + f"rotation {parameters['rotation']:.3f} deg, skew {parameters['skew']:.3f} deg, "
+        + "scale {:.4f} {:.4f}\n".format(*parameters['scale']))
+
+def parse_printhead_pressures(components, default):
+    """
+    Default pressure (kPa) of printheads T0, T1 and T2, e.g. "200, 150"
+    
+    Returns:
+        dict: Pressure per printhead, 'default' for empty and missing values
+    """
+    text = components['scaffold_tool_pressures_entry'].get().replace(';', ',')
+    values = [value.strip() for value in text.split(',')]
+    
+    return {tool: float(value) if value else default
+            for tool, value in zip(PRINTHEADS, values)}
+
+def parse_perimeter_shells(components):
+    """Number of perimeter shells, at least one"""
+    return max(int(components['scaffold_shells_entry'].get()), 1)
+
+def calculate_outline(components):
+    """
+    Perimeter outline of the scaffold, walked counterclockwise
+    
+    Rectangles start at the 'origin' corner. Circles and regular polygons
+    use the X size as diameter; circles are discretized with the chord
+    tolerance, so small circles get few points.
+    
+    Returns:
+        ndarray: (m, 2) outline vertices in mm
+    """
+    dimensions, origin, extrusion = calculate_geometric_parameters(components)
+    shape = components['scaffold_shape_var'].get().lower()
+    center = perimeter_center(dimensions, origin)
+    
+    if shape == 'circle':
+        tolerance = float(components['scaffold_chord_tolerance_entry'].get())
+        return circle_outline(center, dimensions[0] / 2, tolerance)
+    
+    elif shape == 'polygon':
+        sides = max(int(components['scaffold_sides_entry'].get()), 3)
+        return polygon_outline(center, dimensions[0] / 2, sides)
+    
+    return rectangle_outline(dimensions, origin)
+
+def calculate_infill_boundary(components):
+    """
+    Outline left for the infill inside the perimeter shells
+    
+    Returns:
+        None when a single shell of a rectangle is printed (the infill fills
+        the perimeter rectangle), otherwise the innermost shell outline(s)
+    """
+    dimensions, origin, extrusion = calculate_geometric_parameters(components)
+    shells = parse_perimeter_shells(components)
+    rectangle = components['scaffold_shape_var'].get().lower() == 'rectangle'
+    
+    if shells == 1 and rectangle:
+        return None
+    
+    return infill_boundary(calculate_outline(components), shells, extrusion)
+
+def calculate_layer_outlines(components, layers):
+    """
+    Outlines of every layer sliced from the loaded STL mesh
+    
+    The mesh is centered on the perimeter center, put on the bed and sliced
+    at the middle of every layer; layers above the mesh stay empty.
+    
+    Returns:
+        None for the other shapes (one outline for all layers), otherwise a
+        list of (m, 2) rings per layer
+    """
+    if components['scaffold_shape_var'].get().lower() != 'stl':
+        return None
+    
+    path = components['scaffold_stl_var'].get()
+    if not path:
+        raise ValueError("Load an STL file to use the STL shape")
+    
+    dimensions, origin, extrusion = calculate_geometric_parameters(components)
+    height = float(components['scaffold_layer_height_entry'].get())
+    
+    triangles = place_mesh(read_stl(path), perimeter_center(dimensions, origin))
+    return slice_mesh(triangles, (np.arange(layers) + 0.5) * height)
+
+def calculate_layer_boundaries(components, outlines):
+    """Infill boundary inside the perimeter shells of every sliced layer"""
+    dimensions, origin, extrusion = calculate_geometric_parameters(components)
+    shells = parse_perimeter_shells(components)
+    
+    return [infill_boundary(outline, shells, extrusion) if outline else []
+            for outline in outlines]
+
+def calculate_layer_spacings(components, delta, layers, pattern = 'striped'):
+    """
+    Line spacing (honeycomb, TPMS: cell size) of every layer for graded porosity
+    
+    The infill grades from 'Infill (%)' to 'End infill (%)' depending on the
+    gradient profile: 'Linear' (side to side) and 'Radial' (center line to
+    sides) grade across the lines of striped and grid infills, 'Layers'
+    grades from the first to the last layer for every pattern.
+    
+    Returns:
+        list: Spacing in mm or spacing function (see line_offsets) per layer
+    """
+    profile = components['scaffold_gradient_var'].get().lower()
+    infill = float(components['scaffold_infill_entry'].get())
+    infill_end = components['scaffold_infill_end_entry'].get().strip()
+    infill_end = float(infill_end) if infill_end else infill
+    
+    if profile == 'layers':
+        return layer_gradient(delta, infill, infill_end, layers).tolist()
+    
+    if profile in ('linear', 'radial') and pattern.lower() in ('striped', 'grid'):
+        return [infill_gradient(delta, infill, infill_end, profile)] * layers
+    
+    return [delta] * layers
+
 def calculate_lines(components, pattern='striped'):
     infill = float(components['scaffold_infill_entry'].get())
     deltax = float(components['scaffold_size_x_entry'].get())
@@ -317,24 +769,24 @@ def calculate_lines(components, pattern='striped'):
         return number_of_lines, delta
     
     elif pattern.lower() == 'honeycomb':
-        # Honeycomb-specific calculations
-        # Relationship between infill and wall length: infill = (wall_length * extrusion)/area
-        # For honeycomb, wall_length per unit area = (4 + 2√3)/(3√3 * s) where s is spacing
+        # Hexagons with center distance d have sqrt(3) * d of (shared) wall
+        # per (sqrt(3) / 2) * d**2 of area, so infill = 2 * extrusion / d
+        cell_size = 2 * extrusion / (infill/100)
         
-        # Calculate required spacing to achieve desired infill
-        spacing = (4 + 2*np.sqrt(3)) / (3*np.sqrt(3)) * extrusion / (infill/100)
+        # Number of zigzag rows needed to cover the scaffold
+        number_of_rows = int(np.ceil(dimensions[1] / cell_size)) + 1
         
-        # Calculate number of complete hexagons that fit
-        hex_width = spacing * np.sqrt(3)  # width between opposite sides
-        hex_height = spacing * 2          # height between opposite vertices
-        
-        # Number of horizontal lines
-        n_horizontal = int((effective_size - extrusion) / (hex_height * 0.75)) + 1
+        return number_of_rows, cell_size
+    
+    elif pattern.lower() in TPMS_CONTOUR_DENSITY:
+        # Slices hold TPMS_CONTOUR_DENSITY / cell_size of wall per area, so
+        # infill = density * extrusion / cell_size
+        cell_size = TPMS_CONTOUR_DENSITY[pattern.lower()] * extrusion / (infill/100)
         
-        # Number of vertical lines (diagonals)
-        n_vertical = int((effective_size - extrusion) / (hex_width * 0.5)) + 1
+        # Number of unit cells across the scaffold
+        number_of_cells = int(np.ceil(dimensions[1] / cell_size))
         
-        return (n_horizontal + n_vertical), spacing
+        return number_of_cells, cell_size
     
 
 def calculate_cells(infill, extrusion, infill_area):
@@ -351,33 +803,6 @@ def calculate_cells(infill, extrusion, infill_area):
     
 def calculate_honeycomb_lines(components):
     
-    """Calculate number of lines and spacing for honeycomb pattern"""
-    
-    infill = float(components['scaffold_infill_entry'].get()) / 100
-    size = float(components['scaffold_x_size_entry'].get())
-    extrusion = float(components['scaffold_noozle_entry'].get())
-    
-    # Honeycomb specific calculations
-    # The relationship between infill and line spacing is different for honeycomb
-    # This is an approximation - you may need to adjust based on your exact requirements
-    effective_spacing = (extrusion * (1 - infill)) / infill
-    
-    # Number of lines is approximately the size divided by the effective spacing
-    number_of_lines = round(size / effective_spacing)
-    
-    # Ensure we have at least 1 line
-    number_of_lines = max(1, number_of_lines)
-    
-    # Calculate actual spacing
-    delta = size / number_of_lines
-    
-    return number_of_lines, delta
-    
-    
-    
-    
-    
-    
-    
+    """Calculate number of rows and cell size for honeycomb pattern"""
     
-    
\ No newline at end of file
+    return calculate_lines(components, pattern='honeycomb')
@@ -10,8 +10,9 @@ import customtkinter as ctk
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 from utils.constants import (PRINTHEAD_DEFAULT, PRINTHEAD_TYPES, 
-                             TEMPLATE_PROPERTIES, SCAFFOLD_FRAME_COLOR,
-                             SCAFFOLD_BORDER_COLOR, SCAFFOLD_BORDER_LINE)
+                             SCAFFOLD_FRAME_COLOR, SCAFFOLD_BORDER_COLOR,
+                             SCAFFOLD_BORDER_LINE)
+from ..core.templates import get_available_templates
 
 
 def create_main_window(root):
@@ -76,6 +77,10 @@ def create_shared_elements(parent, components):
     ctk.CTkLabel(gcode_frame, text="Generated G-code:").pack(
         padx=5, pady=(10, 0), anchor="w"
     )
+    
+    # Summary of the last generated program (line counts, savings)
+    components['gcode_stats_label'] = ctk.CTkLabel(gcode_frame, text="")
+    components['gcode_stats_label'].pack(padx=5, anchor="w")
 
     components.update(create_gcode_display(gcode_frame))
 
@@ -135,7 +140,7 @@ def create_scaffold_tab(parent, components):
     pattern_menu = ctk.CTkOptionMenu(
         pattern_frame,
         variable=pattern_var,
-        values=["Grid", "Striped", "Honeycomb"],
+        values=["Grid", "Striped", "Honeycomb", "Gyroid", "Schwarz P"],
         width=120
     )
     pattern_menu.grid(row=0, column=1, pady=5)
@@ -151,6 +156,47 @@ def create_scaffold_tab(parent, components):
     size_y_entry = ctk.CTkEntry(pattern_frame, width=60)
     size_y_entry.insert(0, "20")
     size_y_entry.grid(row=1, column=3, padx=5)
+    
+    # Outline shape, circles and polygons take X as their diameter
+    ctk.CTkLabel(pattern_frame, text="Shape:").grid(row=2, column=0, padx=5)
+    shape_var = ctk.StringVar(value="Rectangle")
+    shape_menu = ctk.CTkOptionMenu(
+        pattern_frame,
+        variable=shape_var,
+        values=["Rectangle", "Circle", "Polygon", "STL"],
+        width=120
+    )
+    shape_menu.grid(row=2, column=1, pady=5)
+    
+    ctk.CTkLabel(pattern_frame, text="Sides:").grid(row=2, column=2, padx=5)
+    sides_entry = ctk.CTkEntry(pattern_frame, width=60)
+    sides_entry.insert(0, "6")
+    sides_entry.grid(row=2, column=3, padx=5)
+    
+    # Largest deviation of the printed chords from a circular outline
+    ctk.CTkLabel(pattern_frame, text="Chord tol. (mm):").grid(row=3, column=0, padx=5)
+    chord_tolerance_entry = ctk.CTkEntry(pattern_frame, width=60)
+    chord_tolerance_entry.insert(0, "0.01")
+    chord_tolerance_entry.grid(row=3, column=1, padx=5, pady=5)
+    
+    # Curved moves are merged into G2/G3 arcs within this tolerance (0: off)
+    ctk.CTkLabel(pattern_frame, text="Arc tol. (mm):").grid(row=3, column=2, padx=5)
+    arc_tolerance_entry = ctk.CTkEntry(pattern_frame, width=60)
+    arc_tolerance_entry.insert(0, "0.02")
+    arc_tolerance_entry.grid(row=3, column=3, padx=5, pady=5)
+    
+    # Redundant path points closer than this to the simplified path are dropped
+    ctk.CTkLabel(pattern_frame, text="Simplify tol. (mm):").grid(row=4, column=0, padx=5)
+    simplify_tolerance_entry = ctk.CTkEntry(pattern_frame, width=60)
+    simplify_tolerance_entry.insert(0, "0.001")
+    simplify_tolerance_entry.grid(row=4, column=1, padx=5, pady=5)
+    
+    # Mesh sliced into per-layer outlines for the "STL" shape
+    stl_var = ctk.StringVar(value="")
+    stl_button = ctk.CTkButton(pattern_frame, text="Load STL", width=80)
+    stl_button.grid(row=4, column=2, padx=5, pady=5)
+    stl_label = ctk.CTkLabel(pattern_frame, text="No mesh")
+    stl_label.grid(row=4, column=3, padx=5)
         
     # Cell Parameters
     ctk.CTkLabel(params_frame, text="General Parameters:").pack(pady=(10,0))
@@ -201,6 +247,67 @@ def create_scaffold_tab(parent, components):
     speed_entry.insert(0, "1200")
     speed_entry.grid(row=2, column=3, padx=5)
     
+    # Infill angles cycled layer by layer (degrees from X, 90 = parallel to Y)
+    ctk.CTkLabel(cell_frame, text="Infill angles (°):").grid(row=3, column=0, padx=5)
+    angles_entry = ctk.CTkEntry(cell_frame, width=120)
+    angles_entry.insert(0, "90")
+    angles_entry.grid(row=3, column=1, columnspan=3, padx=5, pady=5, sticky="w")
+    
+    # Concentric perimeter loops, printed from the outside in
+    ctk.CTkLabel(cell_frame, text="Perimeter shells:").grid(row=4, column=0, padx=5)
+    shells_entry = ctk.CTkEntry(cell_frame, width=60)
+    shells_entry.insert(0, "1")
+    shells_entry.grid(row=4, column=1, padx=5, pady=5)
+    
+    # Graded porosity: infill varies from "Infill (%)" to "End infill (%)"
+    ctk.CTkLabel(cell_frame, text="Gradient:").grid(row=4, column=2, padx=5)
+    gradient_var = ctk.StringVar(value="None")
+    gradient_menu = ctk.CTkOptionMenu(
+        cell_frame,
+        values=["None", "Linear", "Radial", "Layers"],
+        variable=gradient_var,
+        width=90
+    )
+    gradient_menu.grid(row=4, column=3, padx=5, pady=5)
+    
+    ctk.CTkLabel(cell_frame, text="End infill (%):").grid(row=5, column=0, padx=5)
+    infill_end_entry = ctk.CTkEntry(cell_frame, width=60)
+    infill_end_entry.insert(0, "50")
+    infill_end_entry.grid(row=5, column=1, padx=5, pady=5)
+    
+    # Replicate the scaffold into every well of a plate template
+    ctk.CTkLabel(cell_frame, text="Plate:").grid(row=5, column=2, padx=5)
+    plate_var = ctk.StringVar(value="None")
+    plate_menu = ctk.CTkOptionMenu(
+        cell_frame,
+        values=["None"] + [name for name in get_available_templates() if name != "One drop"],
+        variable=plate_var,
+        width=90
+    )
+    plate_menu.grid(row=5, column=3, padx=5, pady=5)
+    
+    # Multi-material: printheads cycled layer by layer, empty for the selected one
+    ctk.CTkLabel(cell_frame, text="Perimeter T:").grid(row=6, column=0, padx=5)
+    perimeter_tools_entry = ctk.CTkEntry(cell_frame, width=60)
+    perimeter_tools_entry.grid(row=6, column=1, padx=5, pady=5)
+    
+    ctk.CTkLabel(cell_frame, text="Infill T:").grid(row=6, column=2, padx=5)
+    infill_tools_entry = ctk.CTkEntry(cell_frame, width=60)
+    infill_tools_entry.grid(row=6, column=3, padx=5, pady=5)
+    
+    # Default pressure of T0, T1, T2, empty for "Pressure (kPa)"
+    ctk.CTkLabel(cell_frame, text="T0-T2 pressures:").grid(row=7, column=0, padx=5)
+    tool_pressures_entry = ctk.CTkEntry(cell_frame, width=120)
+    tool_pressures_entry.grid(row=7, column=1, padx=5, pady=5)
+    
+    clean_var = ctk.BooleanVar(value=False)
+    clean_checkbox = ctk.CTkCheckBox(
+        cell_frame,
+        text="Clean on tool change",
+        variable=clean_var
+    )
+    clean_checkbox.grid(row=7, column=2, columnspan=2, padx=5, pady=5)
+    
     # Plot options    
     plot_options_frame = ctk.CTkFrame(params_frame)
     plot_options_frame.pack(pady=5)
@@ -217,7 +324,33 @@ def create_scaffold_tab(parent, components):
         text="Export as PNG"
     )
     export_preview_button.grid(pady=5, padx=20, row = 0, column = 1)
-    
+
+    # Preview mode: 3D lines or top-down density map for very large toolpaths
+    ctk.CTkLabel(plot_options_frame, text="Preview mode:").grid(row=1, column=0, padx=5)
+    view_mode_var = ctk.StringVar(value="3D")
+    view_mode_menu = ctk.CTkOptionMenu(
+        plot_options_frame,
+        variable=view_mode_var,
+        values=["3D", "Density"],
+        width=120
+    )
+    view_mode_menu.grid(row=1, column=1, pady=5)
+
+    # View exported as PNG (rendered off-screen, "All views" exports one file per view)
+    ctk.CTkLabel(plot_options_frame, text="Export view:").grid(row=2, column=0, padx=5)
+    export_view_var = ctk.StringVar(value="Current")
+    export_view_menu = ctk.CTkOptionMenu(
+        plot_options_frame,
+        variable=export_view_var,
+        values=["Current", "Top", "Side", "Iso", "All views"],
+        width=120
+    )
+    export_view_menu.grid(row=2, column=1, pady=5)
+
+    export_progress = ctk.CTkProgressBar(plot_options_frame, width=200)
+    export_progress.set(0)
+    export_progress.grid(row=3, column=0, columnspan=2, padx=20, pady=5)
+
     show_axes_var = ctk.BooleanVar(value=True)
     show_axes_checkbox = ctk.CTkCheckBox(
         params_frame,
@@ -256,6 +389,14 @@ def create_scaffold_tab(parent, components):
         'scaffold_pattern_var': pattern_var,
         'scaffold_size_x_entry': size_x_entry,
         'scaffold_size_y_entry': size_y_entry,
+        'scaffold_shape_var': shape_var,
+        'scaffold_sides_entry': sides_entry,
+        'scaffold_chord_tolerance_entry': chord_tolerance_entry,
+        'scaffold_arc_tolerance_entry': arc_tolerance_entry,
+        'scaffold_simplify_tolerance_entry': simplify_tolerance_entry,
+        'scaffold_stl_var': stl_var,
+        'scaffold_stl_button': stl_button,
+        'scaffold_stl_label': stl_label,
         'scaffold_infill_entry': infill_entry,
         'scaffold_noozle_entry': noozle_entry,
         # 'scaffold_extrusion_entry': extrusion_entry,
@@ -263,8 +404,20 @@ def create_scaffold_tab(parent, components):
         'scaffold_layer_height_entry': layer_height_entry,
         'layer_number_entry': layer_number_entry,
         'scaffold_speed_entry': speed_entry,
+        'scaffold_angles_entry': angles_entry,
+        'scaffold_shells_entry': shells_entry,
+        'scaffold_gradient_var': gradient_var,
+        'scaffold_infill_end_entry': infill_end_entry,
+        'scaffold_plate_var': plate_var,
+        'scaffold_perimeter_tools_entry': perimeter_tools_entry,
+        'scaffold_infill_tools_entry': infill_tools_entry,
+        'scaffold_tool_pressures_entry': tool_pressures_entry,
+        'scaffold_clean_var': clean_var,
         'scaffold_preview_button': preview_button,
         'scaffold_export_button': export_preview_button,
+        'scaffold_view_mode_var': view_mode_var,
+        'scaffold_export_view_var': export_view_var,
+        'scaffold_export_progress': export_progress,
         'show_axes_var': show_axes_var,
         'scaffold_fig': fig,
         'scaffold_ax': ax,
@@ -300,11 +453,27 @@ def create_printhead_section(parent, row):
     )
     printhead_number_menu.grid(row=0, column=3, padx=5, pady=5)
     
+    # Several bioinks on one plate: printheads cycled along rows, columns or wells
+    ctk.CTkLabel(frame, text="Well printheads:").grid(row=1, column=0, padx=5, pady=5)
+    well_printheads_entry = ctk.CTkEntry(frame, width=100)
+    well_printheads_entry.grid(row=1, column=1, padx=5, pady=5)
+    
+    well_printheads_dir = ctk.StringVar(value="row")
+    well_printheads_menu = ctk.CTkOptionMenu(
+        frame,
+        variable=well_printheads_dir,
+        values=["row", "column", "well"],
+        width=80
+    )
+    well_printheads_menu.grid(row=1, column=2, padx=5, pady=5)
+    
     return {
         'printhead_type': printhead_type,
         'printhead_menu': printhead_menu,
         'printhead_number': printhead_number,
-        'printhead_number_menu': printhead_number_menu
+        'printhead_number_menu': printhead_number_menu,
+        'well_printheads_entry': well_printheads_entry,
+        'well_printheads_dir': well_printheads_dir
     }
 
 def create_template_section(parent, row, column):
@@ -317,15 +486,42 @@ def create_template_section(parent, row, column):
     template_menu = ctk.CTkOptionMenu(
         frame,
         variable=template_var,
-        values=list(TEMPLATE_PROPERTIES.keys()),
+        values=get_available_templates(),
         width=200,
         dynamic_resizing=False
     )
     template_menu.grid(row=0, column=1, padx=5, pady=5)
     
+    # Sparse subsets of a plate, e.g. "A1:H12, P24"; empty prints every well
+    ctk.CTkLabel(frame, text="Wells:").grid(row=0, column=2, padx=5, pady=5)
+    well_selection_entry = ctk.CTkEntry(frame, width=120)
+    well_selection_entry.grid(row=0, column=3, padx=5, pady=5)
+    
+    # Plate calibration per printer: probed centres of A1, the last well of
+    # row A and the first well of the last row
+    ctk.CTkLabel(frame, text="Printer:").grid(row=1, column=0, padx=5, pady=5)
+    printer_name_entry = ctk.CTkEntry(frame, width=100)
+    printer_name_entry.insert(0, "BIOX")
+    printer_name_entry.grid(row=1, column=1, padx=5, pady=5, sticky="w")
+    
+    ctk.CTkLabel(frame, text="Probed corners (X,Y;...):").grid(row=1, column=2, padx=5, pady=5)
+    calibration_points_entry = ctk.CTkEntry(frame, width=120)
+    calibration_points_entry.grid(row=1, column=3, padx=5, pady=5)
+    
+    calibrate_button = ctk.CTkButton(frame, text="Calibrate", width=80)
+    calibrate_button.grid(row=1, column=4, padx=5, pady=5)
+    
+    calibration_label = ctk.CTkLabel(frame, text="")
+    calibration_label.grid(row=2, column=0, columnspan=5, padx=5, pady=(0, 5), sticky="w")
+    
     return {
         'template_var': template_var,
-        'template_menu': template_menu
+        'template_menu': template_menu,
+        'well_selection_entry': well_selection_entry,
+        'printer_name_entry': printer_name_entry,
+        'calibration_points_entry': calibration_points_entry,
+        'calibrate_button': calibrate_button,
+        'calibration_label': calibration_label
     }
 
 def create_general_settings(parent, row):
@@ -634,6 +830,24 @@ def create_action_buttons(parent, row=None):
     copy_button = ctk.CTkButton(frame, text="Copy to Clipboard")
     copy_button.pack(side=ctk.RIGHT, padx=5)
     
+    # Simplifies the program in the text box, generated or pasted
+    simplify_button = ctk.CTkButton(frame, text="Simplify G-code")
+    simplify_button.pack(side=ctk.RIGHT, padx=5)
+    
+    # Several plates in one file: per plate settings (e.g. "pressure=100;
+    # pressure=120" or "3" identical plates) and the pause between plates
+    run_button = ctk.CTkButton(frame, text="Export Run")
+    run_button.pack(side=ctk.RIGHT, padx=5)
+    
+    plate_pause_entry = ctk.CTkEntry(frame, width=50)
+    plate_pause_entry.insert(0, "M0")
+    plate_pause_entry.pack(side=ctk.RIGHT, padx=5)
+    ctk.CTkLabel(frame, text="Between plates:").pack(side=ctk.RIGHT, padx=5)
+    
+    plate_runs_entry = ctk.CTkEntry(frame, width=160)
+    plate_runs_entry.pack(side=ctk.RIGHT, padx=5)
+    ctk.CTkLabel(frame, text="Plates:").pack(side=ctk.RIGHT, padx=5)
+    
     # frame.configure(fg_color="white")
 
     return {
@@ -641,7 +855,11 @@ def create_action_buttons(parent, row=None):
         'reset_layout_button': reset_layout_button,
         'generate_button': generate_button,
         'export_button': export_button,
-        'copy_button': copy_button
+        'copy_button': copy_button,
+        'simplify_button': simplify_button,
+        'run_button': run_button,
+        'plate_pause_entry': plate_pause_entry,
+        'plate_runs_entry': plate_runs_entry
     }
 
 
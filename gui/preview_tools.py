@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scaffold preview geometry, drawing and off-screen export functions
+
+@author: Maria Teresa Alameda Felgueiras
+"""
+
+import os
+import numpy as np
+from ..core.density import rasterize_segments, deposition_hotspots
+from ..core.simplify import simplify_segments, simplify_ring
+from ..core.toolpaths import (perimeter_center, striped_segments,
+                              grid_segments, honeycomb_segments, layer_angles,
+                              perimeter_shells, shell_segments, tpms_segments,
+                              TPMS_FIELDS)
+from .gcode_generation_tools import (calculate_geometric_parameters,
+                                     calculate_lines, parse_infill_angles,
+                                     parse_perimeter_shells,
+                                     calculate_infill_boundary,
+                                     calculate_layer_spacings,
+                                     calculate_outline,
+                                     calculate_layer_outlines,
+                                     calculate_layer_boundaries,
+                                     parse_simplify_tolerance)
+
+# Camera (elevation, azimuth) used for each exportable preview view
+PREVIEW_VIEWS = {
+    'Top': (90, -90),
+    'Side': (0, -90),
+    'Iso': (35.26, -45)
+}
+
+
+def build_preview_geometry(components, cmap='plasma'):
+    """
+    Build the scaffold preview as plain NumPy line batches
+
+    The returned geometry is cached by the GUI and drawn either on the
+    interactive canvas or on an off-screen Agg figure when exporting.
+
+    Returns:
+        dict: 'batches' (list of dicts with 'segments' (n, 2, 3) arrays,
+              'colors' and 'linewidth'), line 'width', number of 'layers'
+              and 'xlim', 'ylim', 'zlim' limits
+    """
+    pattern = components['scaffold_pattern_var'].get()
+    width = float(components['scaffold_noozle_entry'].get())
+    layer_height = float(components['scaffold_layer_height_entry'].get())
+    size_z = float(components['layer_number_entry'].get()) * layer_height
+
+    # Same shells as the G-code perimeter
+    dimensions, origin, extrusion = calculate_geometric_parameters(components)
+    layers = int(float(components['layer_number_entry'].get()))
+    outlines = calculate_layer_outlines(components, layers)
+
+    if outlines is None:
+        shells = _simplified_shells(calculate_outline(components), components)
+        batches, limits = perimeter_geometry(shells, size_z, layer_height, cmap=cmap)
+        boundaries = None
+    else:
+        layer_shells = [_simplified_shells(outline, components) if outline else []
+                        for outline in outlines]
+        batches, limits = layer_perimeter_geometry(layer_shells, layer_height, cmap=cmap)
+        boundaries = calculate_layer_boundaries(components, outlines)
+
+    if pattern.lower() == 'striped':
+        batches += stripe_infill_geometry(components, cmap=cmap, boundaries=boundaries)
+    elif pattern.lower() == 'grid':
+        batches += grid_infill_geometry(components, cmap=cmap, boundaries=boundaries)
+    elif pattern.lower() == 'honeycomb':
+        batches += honeycomb_infill_geometry(components, cmap=cmap, boundaries=boundaries)
+    elif pattern.lower() in TPMS_FIELDS:
+        batches += tpms_infill_geometry(components, cmap=cmap, boundaries=boundaries)
+
+    geometry = {
+        'batches': batches,
+        'width': width,
+        'layers': int(float(components['layer_number_entry'].get()))
+    }
+    geometry.update(limits)
+
+    return geometry
+
+def draw_preview_geometry(ax, geometry, show_axes=True):
+    """Draw cached preview geometry on a 3D axes"""
+    from mpl_toolkits.mplot3d.art3d import Line3DCollection
+
+    ax.scatter(0., 0., 0., color='black', marker='x', s=20)
+
+    for batch in geometry['batches']:
+        collection = Line3DCollection(batch['segments'],
+                                      colors=batch['colors'],
+                                      linewidth=batch['linewidth'])
+        ax.add_collection3d(collection)
+
+    ax.set_xlim(*geometry['xlim'])
+    ax.set_ylim(*geometry['ylim'])
+    ax.set_zlim(*geometry['zlim'])
+
+    if show_axes:
+        ax.set_xlabel("X (mm)")
+        ax.set_ylabel("Y (mm)")
+        ax.set_zlabel("Z (mm)")
+        ax.grid(True)
+        ax.set_axis_on()
+    else:
+        ax.set_xlabel("")
+        ax.set_ylabel("")
+        ax.set_zlabel("")
+        ax.grid(False)
+        ax.set_axis_off()
+
+def draw_density_map(fig, ax, geometry, cmap='magma', hotspot_color='cyan'):
+    """
+    Draw a top-down deposited-material density image of the cached geometry
+    
+    Scales to toolpaths far too large for 3D line rendering. Over-deposited
+    pixels (more than one pass per layer, e.g. grid crossings) are outlined.
+    """
+    segments = np.concatenate([batch['segments'] for batch in geometry['batches']])
+    density, extent = rasterize_segments(segments, geometry['width'])
+    hotspots = deposition_hotspots(density, geometry['layers'])
+
+    image = ax.imshow(density, origin='lower', extent=extent, cmap=cmap,
+                      interpolation='nearest')
+    fig.colorbar(image, ax=ax, label="Deposited passes")
+
+    if hotspots.any():
+        ax.contour(hotspots.astype(float), levels=[0.5], colors=hotspot_color,
+                   linewidths=0.5, origin='lower', extent=extent)
+
+    ax.set_xlabel("X (mm)")
+    ax.set_ylabel("Y (mm)")
+    ax.set_aspect('equal')
+    ax.set_title(f"{int(hotspots.sum())} over-deposition hotspot pixels")
+
+def perimeter_geometry(shells, size_z, layer_height, cmap='plasma',
+                       steps_per_segment=5):
+    """Perimeter shells line batch, split in small steps to draw a color gradient"""
+    from matplotlib import colormaps
+
+    outlines = shell_segments(shells)
+
+    # Interpolate small steps along every side: (sides, steps + 1, xy)
+    t = np.linspace(0, 1, steps_per_segment + 1)
+    points = (outlines[:, 0, None, :]
+              + (outlines[:, 1] - outlines[:, 0])[:, None, :] * t[None, :, None])
+    steps = np.stack([points[:, :-1], points[:, 1:]], axis=2).reshape(-1, 2, 2)
+
+    heights = np.arange(0, size_z, layer_height)
+    segments = np.empty((len(heights), len(steps), 2, 3))
+    segments[..., :2] = steps
+    segments[..., 2] = heights[:, None, None]
+    segments = segments.reshape(-1, 2, 3)
+
+    colors = colormaps[cmap](np.arange(len(segments)) / max(len(segments), 1))
+
+    corners = outlines.reshape(-1, 2)
+    limits = {
+        'xlim': (corners[:, 0].min() - 10, corners[:, 0].max() + 10),
+        'ylim': (corners[:, 1].min() - 10, corners[:, 1].max() + 10),
+        'zlim': (0, size_z + 5)
+    }
+
+    return [{'segments': segments, 'colors': colors, 'linewidth': 3}], limits
+
+def layer_perimeter_geometry(layer_shells, layer_height, cmap='plasma'):
+    """Perimeter line batch of layers with their own shells (sliced meshes)"""
+    from matplotlib import colormaps
+
+    segments = [_stack_layers(shell_segments(shells), np.array([layer * layer_height]))
+                for layer, shells in enumerate(layer_shells) if shells]
+    segments = np.concatenate(segments) if segments else np.empty((0, 2, 3))
+
+    colors = colormaps[cmap](np.arange(len(segments)) / max(len(segments), 1))
+
+    corners = segments.reshape(-1, 3) if len(segments) else np.zeros((1, 3))
+    limits = {
+        'xlim': (corners[:, 0].min() - 10, corners[:, 0].max() + 10),
+        'ylim': (corners[:, 1].min() - 10, corners[:, 1].max() + 10),
+        'zlim': (0, len(layer_shells) * layer_height + 5)
+    }
+
+    return [{'segments': segments, 'colors': colors, 'linewidth': 3}], limits
+
+def _stack_layers(paths, heights):
+    """Repeat (n, 2, 2) toolpath segments at every layer height"""
+    segments = np.empty((len(heights), len(paths), 2, 3))
+    segments[..., :2] = paths
+    segments[..., 2] = heights[:, None, None]
+
+    return segments.reshape(-1, 2, 3)
+
+def _simplified(segments, components):
+    """Toolpath simplified as in the G-code"""
+    tolerance = parse_simplify_tolerance(components)
+    return simplify_segments(segments, tolerance)[0] if tolerance else segments
+
+def _simplified_shells(outline, components):
+    """Perimeter shells of an outline, simplified as in the G-code"""
+    dimensions, origin, extrusion = calculate_geometric_parameters(components)
+    shells = perimeter_shells(outline, parse_perimeter_shells(components), extrusion)
+    tolerance = parse_simplify_tolerance(components)
+    return [simplify_ring(shell, tolerance)[0] for shell in shells] if tolerance else shells
+
+def _layer_boundaries(components, layers, boundaries):
+    """
+    Infill boundary of every layer and its cache key
+
+    All layers share the boundary of a fixed outline (key 0); sliced
+    meshes have one per layer.
+    """
+    if boundaries is None:
+        return [calculate_infill_boundary(components)] * layers, [0] * layers
+    return boundaries, list(range(layers))
+
+def _bounded(generator, boundary, *args, **kwargs):
+    """Toolpath of one layer, empty when the layer has no boundary"""
+    if isinstance(boundary, list) and not boundary:
+        return np.empty((0, 2, 2))
+    return generator(*args, boundary=boundary, **kwargs)
+
+def _infill_batch(layer_paths, components, cmap):
+    """Infill batch from the toolpath of every layer, colored along the path"""
+    from matplotlib import colormaps
+
+    dimensions, origin, extrusion = calculate_geometric_parameters(components)
+    layer_height = float(components['scaffold_layer_height_entry'].get())
+
+    segments = np.concatenate([
+        _stack_layers(paths, np.array([layer * layer_height]))
+        for layer, paths in enumerate(layer_paths)
+    ])
+    colors = np.concatenate([
+        colormaps[cmap](np.arange(len(paths)) / max(len(paths) - 1, 1))
+        for paths in layer_paths
+    ])
+
+    return {'segments': segments, 'colors': colors, 'linewidth': extrusion}
+
+def _line_infill_geometry(components, generator, pattern, cmap, boundaries=None):
+    """Line infill toolpaths per layer, one array per distinct angle, spacing and boundary"""
+    lines, delta = calculate_lines(components, pattern=pattern)
+    dimensions, origin, extrusion = calculate_geometric_parameters(components)
+    layers = int(float(components['layer_number_entry'].get()))
+    angles = layer_angles(parse_infill_angles(components), layers)
+
+    spacings = calculate_layer_spacings(components, delta, layers, pattern=pattern)
+
+    center = perimeter_center(dimensions, origin)
+    boundaries, regions = _layer_boundaries(components, layers, boundaries)
+    keys = list(zip(angles.tolist(), spacings, regions))
+    paths = {key: _simplified(_bounded(generator, boundaries[key[2]], dimensions,
+                                       key[1], center=center, angle=key[0]),
+                              components)
+             for key in dict.fromkeys(keys)}
+
+    return [_infill_batch([paths[key] for key in keys], components, cmap)]
+
+def stripe_infill_geometry(components, cmap='plasma', boundaries=None):
+    """Striped infill line batch, the same segments as the G-code"""
+    return _line_infill_geometry(components, striped_segments, 'striped', cmap,
+                                 boundaries)
+
+def grid_infill_geometry(components, cmap='plasma', boundaries=None):
+    """Grid infill line batch, the same segments as the G-code"""
+    return _line_infill_geometry(components, grid_segments, 'grid', cmap,
+                                 boundaries)
+
+def honeycomb_infill_geometry(components, cmap='plasma', boundaries=None):
+    """Honeycomb infill line batches, one color per layer"""
+    from matplotlib import colormaps
+
+    lines, delta = calculate_lines(components, pattern='honeycomb')
+    dimensions, origin, extrusion = calculate_geometric_parameters(components)
+
+    layer_height = float(components['scaffold_layer_height_entry'].get())
+    layers = int(float(components['layer_number_entry'].get()))
+
+    # Same toolpath arrays as the G-code, odd layers are printed backwards
+    spacings = calculate_layer_spacings(components, delta, layers,
+                                        pattern='honeycomb')
+
+    center = perimeter_center(dimensions, origin)
+    boundaries, regions = _layer_boundaries(components, layers, boundaries)
+    keys = [(spacing, layer % 2 == 1, region)
+            for layer, (spacing, region) in enumerate(zip(spacings, regions))]
+    layer_paths = {key: _simplified(_bounded(honeycomb_segments, boundaries[key[2]],
+                                             dimensions, key[0], center=center,
+                                             reverse=key[1]),
+                                    components)
+                   for key in dict.fromkeys(keys)}
+
+    cmap_func = colormaps[cmap]
+    batches = []
+
+    for layer in range(layers):
+        segments = _stack_layers(layer_paths[keys[layer]],
+                                 np.array([layer * layer_height]))
+
+        batches.append({'segments': segments,
+                        'colors': cmap_func(layer / max(layers - 1, 1)),
+                        'linewidth': extrusion})
+
+    return batches
+
+def tpms_infill_geometry(components, cmap='plasma', boundaries=None):
+    """TPMS infill line batch, every layer sliced at its own height"""
+    pattern = components['scaffold_pattern_var'].get()
+    lines, delta = calculate_lines(components, pattern=pattern)
+    dimensions, origin, extrusion = calculate_geometric_parameters(components)
+
+    layer_height = float(components['scaffold_layer_height_entry'].get())
+    layers = int(float(components['layer_number_entry'].get()))
+    spacings = calculate_layer_spacings(components, delta, layers, pattern=pattern)
+
+    center = perimeter_center(dimensions, origin)
+    boundaries, regions = _layer_boundaries(components, layers, boundaries)
+    layer_paths = [_simplified(_bounded(tpms_segments, boundaries[layer],
+                                        dimensions, spacing,
+                                        (layer + 1) * layer_height,
+                                        surface=pattern, center=center),
+                               components)
+                   for layer, spacing in enumerate(spacings)]
+
+    return [_infill_batch(layer_paths, components, cmap)]
+
+def export_file_paths(file_path, views):
+    """Output path per view: the chosen path, or one suffixed file per view"""
+    if len(views) == 1:
+        return [file_path]
+
+    root, extension = os.path.splitext(file_path)
+    return [f"{root}_{name.lower()}{extension or '.png'}" for name, _ in views]
+
+def render_preview_views(geometry, file_paths, views, show_axes=True,
+                         dpi=300, figsize=(6, 6), progress=None):
+    """
+    Render cached preview geometry to PNG files with the Agg backend
+
+    Safe to call from a worker thread: every view is drawn on its own
+    off-screen figure, never touching the Tk canvas.
+
+    Args:
+        geometry (dict): Geometry returned by build_preview_geometry
+        file_paths (list): Output file per view
+        views (list): (name, (elevation, azimuth)) tuples, angles set to
+                      None draw the top-down density map
+        progress (callable): Called as progress(done, total) after each view
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    for index, ((name, angles), file_path) in enumerate(zip(views, file_paths)):
+        elevation, azimuth = angles if angles is not None else (None, None)
+        fig = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(fig)
+        if elevation is None:
+            ax = fig.add_subplot(111)
+            draw_density_map(fig, ax, geometry)
+        else:
+            ax = fig.add_subplot(111, projection='3d')
+            draw_preview_geometry(ax, geometry, show_axes=show_axes)
+            ax.view_init(elev=elevation, azim=azimuth)
+        fig.tight_layout()
+        fig.savefig(file_path, dpi=dpi)
+
+        if progress is not None:
+            progress(index + 1, len(views))
+
+    return file_paths
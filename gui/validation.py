@@ -5,286 +5,199 @@ Complete input validation for BIOX G-Code Generator
 
 @author: Maria Teresa Alameda Felgueiras
 """
+import numpy as np
 import customtkinter as ctk
 from tkinter import messagebox  # Add this import
-from ..utils.constants import (BED_TEMP_LIMITS, PH_TEMP_LIMITS)
+from ..core.validation import validate_job
+from ..core.templates import compile_template, well_mask
+from ..core.scheduling import well_tools
+from .gcode_generation_tools import droplet_parameters
+
+# Job values read from single entries (see validate_job)
+JOB_ENTRIES = {
+    'printhead': 'printhead_number',
+    'speed': 'printhead_speed_entry',
+    'layer_height': 'layer_height_entry',
+    'bed_position': 'bed_zpos_entry',
+    'pressure': 'pressure_entry',
+    'extrusion_time': 'extrusion_time_entry'
+}
+
+# Job values of the scaffold program (the bed position only for cleaning)
+SCAFFOLD_JOB_ENTRIES = {
+    'printhead': 'printhead_number',
+    'speed': 'scaffold_speed_entry',
+    'layer_height': 'scaffold_layer_height_entry',
+    'pressure': 'scaffold_pressure_entry'
+}
+
+# Initial and final entries of the sweeps
+SWEEP_ENTRIES = {
+    'pressure': ('pressure_initial_entry', 'pressure_final_entry'),
+    'temperature': ('temperature_initial_entry', 'temperature_final_entry'),
+    'extrusion_time': ('extrusion_time_initial_entry', 'extrusion_time_final_entry')
+}
 
 def validate_inputs(components):
     """
     Validate all mandatory inputs before generating G-code
     
+    Every problem is listed at once (see input_violations).
+    
     Returns:
         bool: True if all inputs are valid, False otherwise
     """
-    try:
-        # Check if any sweep is active
-        any_sweep_active = (components['pressure_sweep_var'].get() or 
-                          components['temperature_sweep_var'].get() or
-                          components['extrusion_time_sweep_var'].get())
-
-        # Validate printhead number
-        printhead_number = components['printhead_number'].get()
-        if not printhead_number.isdigit() or not (0 <= int(printhead_number) <= 2):
-            raise ValueError("Printhead number must be between 0 and 2.")
-
-        # Validate print speed
-        printhead_speed = components['printhead_speed_entry'].get()
-        if not is_float(printhead_speed) or not (0 < float(printhead_speed) <= 1500):
-            raise ValueError("Print speed must be between 0 and 1500 mm/s.")
-
-        # Validate layer height
-        layer_height = components['layer_height_entry'].get()
-        if not is_float(layer_height) or not (0.1 <= float(layer_height) <= 1.0):
-            raise ValueError("Layer height must be between 0.1 and 1.0 mm.")
-
-        # Validate bed movement position
-        bed_position = components['bed_zpos_entry'].get()
-        if not is_float(bed_position) or float(bed_position) <= 0:
-            raise ValueError("Bed position must be greater than 0.")
-
-        # Validate pressure
-        pressure = components['pressure_entry'].get()
-        if not is_float(pressure) or not (0 <= float(pressure) <= 200):
-            raise ValueError("Pressure must be between 0 and 200 kPa.")
-
-        # Validate extrusion time
-        extrusion_time = components['extrusion_time_entry'].get()
-        if not is_float(extrusion_time) or float(extrusion_time) <= 0:
-            raise ValueError("Extrusion time must be greater than 0 seconds.")
-
-        # Only validate temperature controls if no sweep is active
-        if not any_sweep_active:
-            # Validate bed temperature if enabled
-            if components['control_bedtemperature_var'].get():
-                bed_temp = components['bed_temp_entry'].get()
-                if not is_float(bed_temp) or not (BED_TEMP_LIMITS[0] <= float(bed_temp) <= BED_TEMP_LIMITS[1]):
-                    raise ValueError(f"Bed temperature must be between {BED_TEMP_LIMITS[0]} and {BED_TEMP_LIMITS[1]} °C.")
-
-            # Validate printhead temperature if enabled
-            if components['control_phtemperature_var'].get():
-                ph_temp = components['phtemp_entry'].get()
-                ph_limits = PH_TEMP_LIMITS.get(components['printhead_type'].get(), (30, 65))
-                if not is_float(ph_temp) or not (ph_limits[0] <= float(ph_temp) <= ph_limits[1]):
-                    raise ValueError(f"Printhead temperature must be between {ph_limits[0]} and {ph_limits[1]} °C.")
-
-        # Validate sweep parameters if enabled
-        if components['pressure_sweep_var'].get():
-            validate_sweep_parameters(
-                components['pressure_initial_entry'].get(),
-                components['pressure_final_entry'].get(),
-                "Pressure"
-            )
-            
-        if components['temperature_sweep_var'].get():
-            validate_sweep_parameters(
-                components['temperature_initial_entry'].get(),
-                components['temperature_final_entry'].get(),
-                "Temperature"
-            )
-            
-        if components['extrusion_time_sweep_var'].get():
-            validate_sweep_parameters(
-                components['extrusion_time_initial_entry'].get(),
-                components['extrusion_time_final_entry'].get(),
-                "Extrusion time"
-            )
-
-        return True
-    except ValueError as e:
-        messagebox.showerror("Input Error", str(e))
+    violations = input_violations(components)
+    if violations:
+        messagebox.showerror("Input Error", "\n".join(violation['message']
+                                                      for violation in violations))
         return False
+    return True
 
-def validate_input_fields(components):
-    """
-    Validate individual input fields and highlight invalid values in red
+def input_violations(components):
     """
-    # Printhead number validation
-    printhead_number = components['printhead_number'].get()
-    if printhead_number.isdigit():
-        printhead_number = int(printhead_number)
-        if not (0 <= printhead_number <= 2):
-            set_invalid(components['printhead_number_menu'])
-        else:
-            set_valid(components['printhead_number_menu'])
-    else:
-        set_invalid(components['printhead_number_menu'])
-
-    # Print speed validation
-    printhead_speed = components['printhead_speed_entry'].get()
-    if is_float(printhead_speed):
-        printhead_speed = float(printhead_speed)
-        if not (0 < printhead_speed <= 1500):
-            set_invalid(components['printhead_speed_entry'])
-        else:
-            set_valid(components['printhead_speed_entry'])
-    elif printhead_speed == "":
-        set_valid(components['printhead_speed_entry'])
-    else:
-        set_invalid(components['printhead_speed_entry'])
-
-    # Layer height validation
-    layer_height = components['layer_height_entry'].get()
-    if is_float(layer_height):
-        layer_height = float(layer_height)
-        if not (0.1 <= layer_height <= 1.0):
-            set_invalid(components['layer_height_entry'])
-        else:
-            set_valid(components['layer_height_entry'])
-    elif layer_height == "":
-        set_valid(components['layer_height_entry'])
-    else:
-        set_invalid(components['layer_height_entry'])
-
-    # Pressure validation
-    pressure = components['pressure_entry'].get()
-    if is_float(pressure):
-        pressure = float(pressure)
-        if not (0 <= pressure <= 200):
-            set_invalid(components['pressure_entry'])
-        else:
-            set_valid(components['pressure_entry'])
-    elif pressure == "":
-        set_valid(components['pressure_entry'])
-    else:
-        set_invalid(components['pressure_entry'])
-
-    # Extrusion time validation
-    extrusion_time = components['extrusion_time_entry'].get()
-    if is_float(extrusion_time):
-        if float(extrusion_time) <= 0:
-            set_invalid(components['extrusion_time_entry'])
-        else:
-            set_valid(components['extrusion_time_entry'])
-    elif extrusion_time == "":
-        set_valid(components['extrusion_time_entry'])
-    else:
-        set_invalid(components['extrusion_time_entry'])
-
-    # Bed position validation
-    bed_position = components['bed_zpos_entry'].get()
-    if is_float(bed_position):
-        if float(bed_position) <= 0:
-            set_invalid(components['bed_zpos_entry'])
-        else:
-            set_valid(components['bed_zpos_entry'])
-    elif bed_position == "":
-        set_valid(components['bed_zpos_entry'])
-    else:
-        set_invalid(components['bed_zpos_entry'])
-
-    # Printhead-specific validation
-    printhead_type_value = components['printhead_type'].get()
+    All violations of the current settings, without the GUI
     
-    # Bed temperature validation
-    bed_temp = components['bed_temp_entry'].get()
-    if is_float(bed_temp):
-        bed_temp = float(bed_temp)
-        if not (BED_TEMP_LIMITS[0] <= bed_temp <= BED_TEMP_LIMITS[1]):
-            set_invalid(components['bed_temp_entry'])
-        else:
-            set_valid(components['bed_temp_entry'])
-    elif bed_temp == "":
-        set_valid(components['bed_temp_entry'])
-    else:
-        set_invalid(components['bed_temp_entry'])
-
-    # Printhead temperature validation
-    ph_temp = components['phtemp_entry'].get()
-    if is_float(ph_temp):
-        ph_temp = float(ph_temp)
-        ph_limits = PH_TEMP_LIMITS.get(printhead_type_value, (30, 65))
-        if not (ph_limits[0] <= ph_temp <= ph_limits[1]):
-            set_invalid(components['phtemp_entry'])
-        else:
-            set_valid(components['phtemp_entry'])
-    elif ph_temp == "":
-        set_valid(components['phtemp_entry'])
-    else:
-        set_invalid(components['phtemp_entry'])
-
-    # Sweep parameters validation
-    if components['pressure_sweep_var'].get():
-        validate_sweep_fields(
-            components['pressure_initial_entry'],
-            components['pressure_final_entry'],
-            components['pressure_initial_entry'],
-            components['pressure_final_entry']
-        )
-        
-    if components['temperature_sweep_var'].get():
-        validate_sweep_fields(
-            components['temperature_initial_entry'],
-            components['temperature_final_entry'],
-            components['temperature_initial_entry'],
-            components['temperature_final_entry']
-        )
-        
-    if components['extrusion_time_sweep_var'].get():
-        validate_sweep_fields(
-            components['extrusion_time_initial_entry'],
-            components['extrusion_time_final_entry'],
-            components['extrusion_time_initial_entry'],
-            components['extrusion_time_final_entry']
-        )
+    'components' only needs widgets (or stand-ins) with get(). See
+    validate_job for the violations.
+    """
+    job, labels, violations = job_description(components)
+    return violations + validate_job(job, labels)
 
-def validate_sweep_parameters(initial, final, param_name):
+def job_description(components):
     """
-    Validate sweep parameters (initial and final values)
+    Job values of the current settings for validate_job
     
-    Args:
-        initial (str): Initial value
-        final (str): Final value
-        param_name (str): Name of the parameter being validated
+    Droplet plates are checked well by well, sweeps included; printhead and
+    bed temperatures only when they are set (controlled and no sweep, or
+    swept); the printheads too when they are given per well. On the
+    Scaffold tab the scaffold entries are checked instead. Templates and
+    well selections that cannot be read, and plate scaffolds cleaning the
+    printhead, are violations of their own.
+    
+    Returns:
+        dict: Job values
+        ndarray: Well labels of the template, None when unknown
+        list: Violations found while reading the settings
     """
-    if not initial or not final:
-        raise ValueError(f"Both initial and final {param_name.lower()} must be specified for sweep.")
+    job = {'printhead_type': components['printhead_type'].get()}
+    labels, violations = None, []
     
-    if not is_float(initial) or not is_float(final):
-        raise ValueError(f"{param_name} values must be numbers.")
+    if scaffold_tab(components):
+        for field, key in SCAFFOLD_JOB_ENTRIES.items():
+            job[field] = number(components[key].get())
+        if components['scaffold_clean_var'].get():
+            job['bed_position'] = number(components['bed_zpos_entry'].get())
+            # The cleaning station is not stamped into the wells of a plate
+            if components['scaffold_plate_var'].get() != "None":
+                violations.append({'field': 'scaffold_clean',
+                                   'message': "Cleaning on tool change is not available for plate scaffolds.",
+                                   'wells': np.empty(0, dtype=int)})
+        return job, labels, violations
     
-    initial_val = float(initial)
-    final_val = float(final)
+    sweeps = {field: components[f'{field}_sweep_var'].get() for field in SWEEP_ENTRIES}
+    any_sweep_active = any(sweeps.values())
     
-    if initial_val < 0:
-        raise ValueError(f"Initial {param_name.lower()} cannot be negative.")
+    for field, key in JOB_ENTRIES.items():
+        job[field] = number(components[key].get())
     
-    if final_val <= 0:
-        raise ValueError(f"Final {param_name.lower()} must be greater than 0.")
+    if not any_sweep_active and components['control_bedtemperature_var'].get():
+        job['bed_temperature'] = number(components['bed_temp_entry'].get())
+    if not any_sweep_active and components['control_phtemperature_var'].get():
+        job['temperature'] = number(components['phtemp_entry'].get())
     
-    if initial_val >= final_val:
-        raise ValueError(f"Initial {param_name.lower()} must be less than final value.")
+    job['sweeps'] = {field: tuple(number(components[key].get()) for key in SWEEP_ENTRIES[field])
+                     for field, active in sweeps.items() if active}
+    
+    try:
+        template = compile_template(components['template_var'].get())
+        well_mask(template, components['well_selection_entry'].get())
+    except ValueError as e:
+        return job, labels, [{'field': 'template', 'message': f"{e}.",
+                              'wells': np.empty(0, dtype=int)}]
+    labels = template['labels']
+    properties = template['properties']
+    
+    # Printhead of every well, the well printheads cycled like when printing
+    text = components['well_printheads_entry'].get().replace(';', ',')
+    tools = np.array([number(value) for value in text.split(',') if value.strip()])
+    if len(tools):
+        job['printhead'] = tools[well_tools(np.arange(len(tools)), properties['rows'],
+                                            properties['cols'],
+                                            components['well_printheads_dir'].get())]
+    
+    # Parameters of every well, when the sweeps can be computed
+    if any_sweep_active and not validate_job({'sweeps': job['sweeps']}):
+        try:
+            pressures, temperatures, extrusion_times = droplet_parameters(
+                components, properties['rows'], properties['cols'])
+        except ValueError:
+            return job, labels, violations
+        job['pressure'] = np.asarray(pressures, dtype=float)
+        job['extrusion_time'] = np.asarray(extrusion_times, dtype=float)
+        if sweeps['temperature']:
+            job['temperature'] = np.asarray(temperatures, dtype=float)
+    
+    return job, labels, violations
+
+def scaffold_tab(components):
+    """True when the Scaffold tab is selected"""
+    return 'tabview' in components and components['tabview'].get() == 'Scaffold settings'
 
-def validate_sweep_fields(initial_entry, final_entry, initial_component, final_component):
+def number(text):
+    """Value of a number field, NaN when it is not a number"""
+    return float(text) if is_float(text) else np.nan
+
+def field_widgets(components):
+    """
+    Widgets of every job field in the current settings (see job_description)
+    
+    Per-well values come from the sweep entries when they are swept, and the
+    printheads from the well printheads when they are given per well.
+    
+    Returns:
+        dict: Widget keys by job field, sweeps as 'FIELD_sweep'
+    """
+    if scaffold_tab(components):
+        widgets = {field: [key] for field, key in SCAFFOLD_JOB_ENTRIES.items()}
+        widgets['bed_position'] = ['bed_zpos_entry']
+        widgets['printhead'] = ['printhead_number_menu']
+        return widgets
+    
+    widgets = {field: [key] for field, key in JOB_ENTRIES.items()}
+    widgets['printhead'] = (['well_printheads_entry']
+                            if components['well_printheads_entry'].get().strip()
+                            else ['printhead_number_menu'])
+    widgets['bed_temperature'] = ['bed_temp_entry']
+    widgets['temperature'] = ['phtemp_entry']
+    widgets['template'] = ['well_selection_entry']
+    for field, keys in SWEEP_ENTRIES.items():
+        widgets[f'{field}_sweep'] = list(keys)
+        if components[f'{field}_sweep_var'].get():
+            widgets[field] = list(keys)
+    return widgets
+
+def validate_input_fields(components):
     """
-    Validate sweep fields and highlight appropriately
+    Highlight the fields with violations in red (see input_violations),
+    the same checks validate_inputs reports
     """
-    initial = initial_entry.get()
-    final = final_entry.get()
+    widgets = field_widgets(components)
+    invalid = {key for violation in input_violations(components)
+               for key in widgets.get(violation['field'], [])}
     
-    if initial and final:
-        if is_float(initial) and is_float(final):
-            initial_val = float(initial)
-            final_val = float(final)
-            
-            if initial_val < 0 or final_val <= 0 or initial_val >= final_val:
-                set_invalid(initial_component)
-                set_invalid(final_component)
-            else:
-                set_valid(initial_component)
-                set_valid(final_component)
+    for key in sorted({key for keys in widgets.values() for key in keys}):
+        if key in invalid:
+            set_invalid(components[key])
         else:
-            set_invalid(initial_component)
-            set_invalid(final_component)
-    else:
-        set_valid(initial_component)
-        set_valid(final_component)
+            set_valid(components[key])
 
 def is_float(value):
     """Check if a string can be converted to float"""
     try:
         float(value)
         return True
-    except ValueError:
+    except (TypeError, ValueError):
         return False
 
 def set_valid(component):
@@ -11,19 +11,29 @@ from .constants import (
     APP_TITLE,
     PRINTHEAD_TYPES,
     PRINTHEAD_DEFAULT,
+    PRINTHEAD_COMMANDS,
+    DWELL_COMMANDS,
     TEMPLATE_PROPERTIES,
-    TEMPLATE_NAMES,
     BED_TEMP_LIMITS,
-    PH_TEMP_LIMITS
+    PH_TEMP_LIMITS,
+    PRINTHEAD_SPEED_LIMITS,
+    LAYER_HEIGHT_LIMITS,
+    PRESSURE_LIMITS,
+    PRINTER_TRAVEL_LIMITS
 )
 
 __all__ = [
     'APP_TITLE',
     'PRINTHEAD_TYPES',
     'PRINTHEAD_DEFAULT',
+    'PRINTHEAD_COMMANDS',
+    'DWELL_COMMANDS',
     'TEMPLATE_PROPERTIES',
-    'TEMPLATE_NAMES',
     'BED_TEMP_LIMITS',
-    'PH_TEMP_LIMITS'
+    'PH_TEMP_LIMITS',
+    'PRINTHEAD_SPEED_LIMITS',
+    'LAYER_HEIGHT_LIMITS',
+    'PRESSURE_LIMITS',
+    'PRINTER_TRAVEL_LIMITS'
 ]
 
@@ -14,12 +14,50 @@ SCAFFOLD_FRAME_COLOR = "#F0F0F0"
 SCAFFOLD_BORDER_COLOR = 'black' #'#b5e2ff'
 SCAFFOLD_BORDER_LINE = 2
 
-PRINTHEAD_TYPES = [
-    "EMD",
-    "Pneumatic",
-    "Thermo-controlled",
-    "Syringe Pump"
-]
+# Extrusion commands of every printhead type, compiled into bulk emitters by
+# core/printheads.py. 'bed' is where the bed moves to extrude ('contact': Z0,
+# 'layer': the layer height, None: it stays), 'extrusion' the commands of one
+# well and 'cycle' the timed M750 form. Template fields: printhead, pressure,
+# time (s), volume (10 * time) and wait (the DWELL_COMMANDS line of the time).
+PRINTHEAD_COMMANDS = {
+    "EMD": {
+        'bed': 'contact',
+        'extrusion': ("M750 T{printhead} P{pressure}; Start EMD extrusion"
+                      " with pressure {pressure} kPa\n"
+                      "{wait}"
+                      "M751 T{printhead} ; Stop EMD extrusion\n\n"),
+        'cycle': ("M750 T{printhead} P{pressure} D{time};"
+                  " EMD extrusion for {time} seconds\n\n")
+    },
+    "Pneumatic": {
+        'bed': 'layer',
+        'extrusion': ("M750 T{printhead} P{pressure}; Start pneumatic extrusion"
+                      " with pressure {pressure} kPa\n"
+                      "{wait}"
+                      "M751 T{printhead} ; Stop pneumatic extrusion\n\n")
+    },
+    "Thermo-controlled": {
+        'bed': 'layer',
+        'extrusion': ("M750 T{printhead} P{pressure}; Start EMD extrusion\n"
+                      "G4 S{time} ; Pause for {time} seconds\n"
+                      "M751 T{printhead} ; Stop EMD extrusion\n\n"),
+        'cycle': ("M750 T{printhead} P{pressure} D{time};"
+                  " EMD extrusion for {time} seconds\n\n")
+    },
+    "Syringe Pump": {
+        'bed': None,
+        'extrusion': "G1 E{volume} F100 ; Extrude material\n"
+    }
+}
+
+# Dwell of whole seconds and milliseconds: both, seconds only, milliseconds only
+DWELL_COMMANDS = (
+    "G4 S{seconds} P{milliseconds}; Wait for {seconds} seconds and {milliseconds} miliseconds\n",
+    "G4 S{seconds}; Wait for {seconds} seconds\n",
+    "G4 P{milliseconds}; Wait for {milliseconds} miliseconds\n"
+)
+
+PRINTHEAD_TYPES = list(PRINTHEAD_COMMANDS)
 PRINTHEAD_DEFAULT = "EMD"
 
 TEMPLATE_PROPERTIES = {
@@ -32,20 +70,20 @@ TEMPLATE_PROPERTIES = {
         'plate_width': 0,
         'description': "Single drop deposition"
     },
-    "96-well plate": {
-        'rows': 8,
-        'cols': 12,
-        'well_spacing_x': 9,       # mm (center-to-center spacing)
-        'well_spacing_y': 9,       # mm (center-to-center spacing)
+    "24-well plate": {
+        'rows': 4,
+        'cols': 6,
+        'well_spacing_x': 19.3,    # mm (center-to-center spacing)
+        'well_spacing_y': 19.3,    # mm (center-to-center spacing)
         'plate_length': 127.76,    # mm (full plate length)
         'plate_width': 85.48,      # mm (full plate width)
-        'description': "Standard 96-well plate (8x12 configuration)"
+        'description': "Standard 24-well plate (4x6 configuration)"
     },
     "48-well plate": {
         'rows': 6,
         'cols': 8,
-        'well_spacing_x': 18.16,   # mm (center-to-center spacing)
-        'well_spacing_y': 18.16,   # mm (center-to-center spacing)
+        'well_spacing_x': 13.08,   # mm (center-to-center spacing)
+        'well_spacing_y': 13.08,   # mm (center-to-center spacing)
         'plate_length': 127.76,    # mm (full plate length)
         'plate_width': 85.48,      # mm (full plate width)
         'description': "Standard 48-well plate (6x8 configuration)"
@@ -89,6 +127,15 @@ TEMPLATE_PROPERTIES = {
 }
 
 
+# Z (mm) for moves between wells when a scaffold is replicated on a plate,
+# clears the walls of standard well plates
+PLATE_TRAVEL_HEIGHT = 20.
+
+# Printer travel (mm) around the program origin, ((min, max) of X, Y and Z):
+# the BIO X moves 130 x 90 x 70 mm, so no origin on the bed reaches a point
+# farther away than that in any axis
+PRINTER_TRAVEL_LIMITS = ((-130., 130.), (-90., 90.), (-70., 70.))
+
 # Temperature limits
 BED_TEMP_LIMITS = (4, 65)
 PH_TEMP_LIMITS = {
@@ -98,5 +145,7 @@ PH_TEMP_LIMITS = {
     "Thermo-controlled": (4, 65)
 }
 
-# Add this line to create TEMPLATE_NAMES
-TEMPLATE_NAMES = sorted(TEMPLATE_PROPERTIES.keys())
\ No newline at end of file
+# Print setting limits
+PRINTHEAD_SPEED_LIMITS = (0, 1500)  # mm/s
+LAYER_HEIGHT_LIMITS = (0.1, 1.0)    # mm
+PRESSURE_LIMITS = (0, 200)          # kPa
\ No newline at end of file